@@ -2,15 +2,28 @@
 # SEPOL - V1.1 Cadastros Estáveis
 # ======================================================
 import streamlit as st
-import pandas as pd
 import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
 from psycopg2.extras import RealDictCursor
+from collections import OrderedDict
+from contextlib import contextmanager
 from datetime import date, timedelta
 from io import BytesIO
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
+from formatos import brl
+from linhas import linhas_do_cursor
+import json
+import logging
 import os
+import re
+import select
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+
+_T0 = time.perf_counter()  # início desta execução (perfil)
 
 # ======================================================
 # CONFIG
@@ -18,6 +31,62 @@ import os
 # st.set_page_config("SEPOL - Controle de Obras", layout="wide")
 st.set_page_config(page_title="SEPOL - Pinturas", layout="wide")
 
+def _cfg(key, default):
+    # lê um ajuste opcional do secrets.toml (mantém o default se faltar/for inválido)
+    try:
+        v = st.secrets.get(key, default)
+        if isinstance(default, bool):
+            # bool("false") é True: texto/número vira booleano pelo valor
+            return v if isinstance(v, bool) else str(v).strip().lower() in ("1", "true", "yes", "sim", "on")
+        return type(default)(v)
+    except Exception:
+        return default
+
+# ======================================================
+# PERFIL (opcional: secret PROFILE=true ou ?perf=1 na URL)
+# ======================================================
+_PERF = {
+    "ativo": _cfg("PROFILE", False) or st.query_params.get("perf") == "1",
+    "marcas": [],     # [{nome, nivel, ini_ms, fim_ms, ms}]
+    "aberta": None,   # seção de topo em andamento (perf_lap)
+    "nivel": 0,
+}
+
+def _perf_ms():
+    return (time.perf_counter() - _T0) * 1000
+
+def _perf_add(nome, nivel, ini_ms):
+    fim_ms = _perf_ms()
+    _PERF["marcas"].append({
+        "nome": nome, "nivel": nivel,
+        "ini_ms": round(ini_ms, 2), "fim_ms": round(fim_ms, 2), "ms": round(fim_ms - ini_ms, 2),
+    })
+
+def perf_lap(nome):
+    # fecha a seção de topo anterior e abre a próxima (header, login, menu, ...)
+    if not _PERF["ativo"]:
+        return
+    aberta = _PERF["aberta"]
+    if aberta is not None:
+        _perf_add(aberta[0], 0, aberta[1])
+    _PERF["aberta"] = (nome, _perf_ms()) if nome else None
+
+@contextmanager
+def perf(nome):
+    # trecho aninhado (lote de widgets, PDF, ...) dentro da seção atual
+    if not _PERF["ativo"]:
+        yield
+        return
+    ini = _perf_ms()
+    _PERF["nivel"] += 1
+    try:
+        yield
+    finally:
+        _perf_add(nome, _PERF["nivel"], ini)
+        _PERF["nivel"] -= 1
+
+perf_lap("HEADER")
+
 col_title, col_logo = st.columns([6,1])
 
 with col_title:
@@ -29,91 +98,541 @@ with col_logo:
 # ======================================================
 # DB
 # ======================================================
+# ------------------------------------------------------
+# Instrumentação: cada comando desta execução (rerun) fica em _SQL_RUN
+# ------------------------------------------------------
+SLOW_QUERY_MS = _cfg("SLOW_QUERY_MS", 500.0)
+_slow_log = logging.getLogger("sepol.sql")
+
+# o script roda de novo a cada rerun → isto recomeça vazio a cada execução
+_SQL_RUN = {"secao": "INÍCIO", "stmts": [], "cache_hits": 0,
+            "pool": {"checkouts": 0, "espera_ms": 0.0, "espera_max_ms": 0.0, "timeouts": 0}}
+st.session_state["_sql_run"] = _SQL_RUN
+
+def secao(nome):
+    # marca a seção atual da tela (consultas são atribuídas a ela; no perfil vira uma faixa)
+    _SQL_RUN["secao"] = nome
+    perf_lap(nome)
+
+def _rows_bytes(rows):
+    # aproximação do volume trazido (texto dos valores)
+    return sum(len(str(v)) for r in rows for v in r.values() if v is not None)
+
+def _sql_record(sql, dur_s, rows, linhas=None, nbytes=None):
+    # linhas/nbytes: já contados por quem consumiu as linhas aos poucos (iter_rows)
+    ms = dur_s * 1000
+    item = {
+        "menu": st.session_state.get("menu"),
+        "secao": _SQL_RUN["secao"],
+        "ms": round(ms, 1),
+        "linhas": len(rows) if linhas is None else linhas,
+        "bytes": _rows_bytes(rows) if nbytes is None else nbytes,
+        "sql": " ".join(str(sql).split())[:300],
+    }
+    _SQL_RUN["stmts"].append(item)
+    if ms >= SLOW_QUERY_MS:
+        _slow_log.warning(json.dumps(
+            {"evento": "slow_query", "limite_ms": SLOW_QUERY_MS, "usuario": st.session_state.get("usuario"), **item},
+            ensure_ascii=False, default=str,
+        ))
+
+def sql_totals():
+    stmts = _SQL_RUN["stmts"]
+    return {
+        "comandos": len(stmts),
+        "ms": round(sum(x["ms"] for x in stmts), 1),
+        "linhas": sum(x["linhas"] for x in stmts),
+        "bytes": sum(x["bytes"] for x in stmts),
+        "lentos": sum(1 for x in stmts if x["ms"] >= SLOW_QUERY_MS),
+        "cache_hits": _SQL_RUN["cache_hits"],
+    }
+
+def is_admin():
+    try:
+        admins = st.secrets.get("ADMIN_USERS", [])
+    except Exception:
+        admins = []
+    if isinstance(admins, str):
+        admins = [a.strip() for a in admins.split(",")]
+    return st.session_state.get("usuario") in set(admins or [])
+
+_CONN_KW = dict(
+    cursor_factory=RealDictCursor,
+    connect_timeout=10,
+    sslmode=_cfg("DB_SSLMODE", "require"),  # Postgres local (seed/benchmark) costuma ser "disable"
+    keepalives=1,
+    keepalives_idle=30,
+    keepalives_interval=10,
+    keepalives_count=5,
+)
+
 @st.cache_resource
-def _conn_holder():
-    # guarda uma conexão (pode morrer; a gente valida antes de usar)
-    return {"conn": None}
+def _pool_holder():
+    # pool compartilhado entre sessões: cada chamada pega uma conexão só pra ela
+    # e devolve no fim (nada de duas sessões no mesmo socket/transação)
+    pool_max = max(1, _cfg("DB_POOL_MAX", 10))
+    return {
+        "min": min(max(0, _cfg("DB_POOL_MIN", 1)), pool_max),  # fica aberta mesmo ociosa
+        "max": pool_max,                                          # teto de conexões abertas
+        "espera_max_s": _cfg("DB_POOL_TIMEOUT", 15.0),            # espera por vaga antes de erro
+        "checar_apos_s": _cfg("DB_POOL_CHECK_IDLE", 30.0),        # ociosa há mais que isso → select 1
+        "ociosa_max_s": _cfg("DB_POOL_IDLE_MAX", 300.0),          # acima do mínimo, fecha depois disso
+        "vagas": threading.BoundedSemaphore(pool_max),
+        "lock": threading.Lock(),
+        "livres": [],  # [(conn, geracao, devolvida_em)] — mais antiga primeiro
+        "geracao": 0,  # "Recarregar conexão" incrementa → conexões antigas são descartadas
+        "stats": {
+            "checkouts": 0, "em_uso": 0, "criadas": 0, "descartadas": 0,
+            "esperas": 0, "espera_total_s": 0.0, "espera_max_s": 0.0, "timeouts": 0,
+        },
+    }
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+def _conn_ok(conn, ociosa_s, holder):
+    if conn.closed != 0:
+        return False
+    if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+        return False
+    if ociosa_s < holder["checar_apos_s"]:
+        return True
+    # ficou parada um tempo: confirma que o servidor ainda responde
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("select 1;")
+        return True
+    except psycopg2.Error:
+        return False
+    finally:
+        if conn.closed == 0:
+            conn.autocommit = False
+
+def _pool_checkout(holder):
+    t0 = time.perf_counter()
+    if not holder["vagas"].acquire(timeout=holder["espera_max_s"]):
+        with holder["lock"]:
+            holder["stats"]["timeouts"] += 1
+        _SQL_RUN["pool"]["timeouts"] += 1
+        raise psycopg2.pool.PoolError("Todas as conexões estão em uso (tempo de espera esgotado).")
+    espera = time.perf_counter() - t0
+    # espera por vaga nesta execução (teste de carga / painel de admin)
+    run_pool = _SQL_RUN["pool"]
+    run_pool["checkouts"] += 1
+    run_pool["espera_ms"] += espera * 1000
+    run_pool["espera_max_ms"] = max(run_pool["espera_max_ms"], espera * 1000)
 
-def get_conn():
-    holder = _conn_holder()
-    conn = holder.get("conn")
-
-    # se não existe ou está fechada → cria nova
-    if conn is None or getattr(conn, "closed", 1) != 0:
-        holder["conn"] = psycopg2.connect(
-            st.secrets["DATABASE_URL"],
-            cursor_factory=RealDictCursor,
-            connect_timeout=10,
-            sslmode="require",
-            keepalives=1,
-            keepalives_idle=30,
-            keepalives_interval=10,
-            keepalives_count=5,
-        )
-        conn = holder["conn"]
+    try:
+        with holder["lock"]:
+            s = holder["stats"]
+            s["checkouts"] += 1
+            s["em_uso"] += 1
+            s["espera_total_s"] += espera
+            s["espera_max_s"] = max(s["espera_max_s"], espera)
+            if espera >= 0.001:
+                s["esperas"] += 1
+
+        while True:
+            with holder["lock"]:
+                geracao = holder["geracao"]
+                item = holder["livres"].pop() if holder["livres"] else None
+            if item is None:
+                conn = psycopg2.connect(st.secrets["DATABASE_URL"], **_CONN_KW)
+                with holder["lock"]:
+                    holder["stats"]["criadas"] += 1
+                return conn, geracao
+
+            conn, ger, devolvida_em = item
+            if ger == geracao and _conn_ok(conn, time.monotonic() - devolvida_em, holder):
+                return conn, ger
+
+            _close_quietly(conn)
+            with holder["lock"]:
+                holder["stats"]["descartadas"] += 1
+    except Exception:
+        with holder["lock"]:
+            holder["stats"]["em_uso"] -= 1
+        holder["vagas"].release()
+        raise
 
-    return conn
+def _pool_checkin(holder, conn, geracao):
+    try:
+        reaproveitar = conn.closed == 0
+        if reaproveitar and conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+            # transação aberta/abortada não volta pro pool
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                reaproveitar = False
+
+        fechar = []
+        agora = time.monotonic()
+        with holder["lock"]:
+            holder["stats"]["em_uso"] -= 1
+            if reaproveitar and geracao == holder["geracao"]:
+                holder["livres"].append((conn, geracao, agora))
+            else:
+                fechar.append(conn)
+                holder["stats"]["descartadas"] += 1
+
+            # acima do mínimo, fecha as que estão paradas há muito tempo
+            livres = holder["livres"]
+            while len(livres) > holder["min"] and agora - livres[0][2] > holder["ociosa_max_s"]:
+                fechar.append(livres.pop(0)[0])
+
+        for c in fechar:
+            _close_quietly(c)
+    finally:
+        holder["vagas"].release()
+
+def reset_pool():
+    holder = _pool_holder()
+    with holder["lock"]:
+        holder["geracao"] += 1
+        livres, holder["livres"] = holder["livres"], []
+    for conn, _, _ in livres:
+        _close_quietly(conn)
+
+def pool_stats():
+    holder = _pool_holder()
+    with holder["lock"]:
+        s = dict(holder["stats"])
+        s["livres"] = len(holder["livres"])
+    s["min"], s["max"] = holder["min"], holder["max"]
+    return s
+
+@contextmanager
+def get_conn():
+    # empresta uma conexão do pool só para este bloco (por sessão/thread)
+    holder = _pool_holder()
+    conn, geracao = _pool_checkout(holder)
+    try:
+        yield conn
+    finally:
+        _pool_checkin(holder, conn, geracao)
 
 def query_df(sql, params=None):
-    conn = get_conn()
-    try:
-        with conn.cursor() as cur:
-            cur.execute(sql, params or ())
-            rows = cur.fetchall()
-        return pd.DataFrame(rows)
-    except psycopg2.InterfaceError:
-        # conexão morreu → recria e tenta 1x
-        holder = _conn_holder()
-        holder["conn"] = None
-        conn = get_conn()
-        with conn.cursor() as cur:
-            cur.execute(sql, params or ())
-            rows = cur.fetchall()
-        return pd.DataFrame(rows)
-    except Exception:
-        # rollback só se conexão estiver viva
+    for tentativa in (1, 2):
+        try:
+            with get_conn() as conn:
+                # leitura em autocommit: sem BEGIN/ROLLBACK extras na rede
+                conn.autocommit = True
+                try:
+                    t0 = time.perf_counter()
+                    with conn.cursor() as cur:
+                        cur.execute(sql, params or ())
+                        rows = cur.fetchall()
+                    _sql_record(sql, time.perf_counter() - t0, rows)
+                finally:
+                    if conn.closed == 0:
+                        conn.autocommit = False
+            return pd.DataFrame(rows)
+        except psycopg2.InterfaceError:
+            # conexão morreu (o pool já descartou) → tenta 1x com outra
+            if tentativa == 2:
+                raise
+
+def query_rows(sql, params=None):
+    # consultas pequenas (busca por id, exists, valor único): tuplas nomeadas em vez de
+    # DataFrame — r["col"], r.col e r.get("col") funcionam como antes
+    for tentativa in (1, 2):
         try:
-            if getattr(conn, "closed", 1) == 0:
+            with get_conn() as conn:
+                conn.autocommit = True
+                try:
+                    t0 = time.perf_counter()
+                    with conn.cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
+                        cur.execute(sql, params or ())
+                        rows = linhas_do_cursor(cur, cur.fetchall()) if cur.description else []
+                    _sql_record(sql, time.perf_counter() - t0, (), linhas=len(rows),
+                                nbytes=sum(len(str(v)) for r in rows for v in r if v is not None))
+                finally:
+                    if conn.closed == 0:
+                        conn.autocommit = False
+            return rows
+        except psycopg2.InterfaceError:
+            if tentativa == 2:
+                raise
+
+def query_one(sql, params=None):
+    rows = query_rows(sql, params)
+    return rows[0] if rows else None
+
+def query_scalar(sql, params=None):
+    r = query_one(sql, params)
+    return r[0] if r is not None else None
+
+def iter_rows(sql, params=None, lote=500):
+    # cursor do lado do servidor: as linhas chegam de `lote` em `lote`, sem lista/DataFrame.
+    # A conexão fica presa até o gerador terminar — consumir por inteiro e logo.
+    with get_conn() as conn:
+        t0 = time.perf_counter()
+        n = nbytes = 0
+        try:
+            with conn.cursor(name=f"iter_{threading.get_ident()}_{time.monotonic_ns()}") as cur:
+                cur.itersize = lote
+                cur.execute(sql, params or ())
+                for row in cur:
+                    n += 1
+                    nbytes += _rows_bytes((row,))
+                    yield row
+        finally:
+            if conn.closed == 0:
                 conn.rollback()
-        except Exception:
-            pass
-        raise
+            _sql_record(sql, time.perf_counter() - t0, (), linhas=n, nbytes=nbytes)
+
+class _Tx:
+    # comandos acumulados dentro de um "with transaction()"
+    __slots__ = ("stmts", "rows")
+
+    def __init__(self):
+        self.stmts = []
+        self.rows = []  # linhas devolvidas pelo último comando (ex.: "returning")
+
+    def exec(self, sql, params=None):
+        self.stmts.append((sql, params))
+
+def _run_batch(stmts):
+    for tentativa in (1, 2):
+        try:
+            with get_conn() as conn:
+                # vários comandos num único envio em autocommit: o Postgres roda a
+                # mensagem inteira como UMA transação (1 ida ao banco, 1 commit;
+                # se um falhar, nenhum é aplicado)
+                conn.autocommit = True
+                try:
+                    with conn.cursor() as cur:
+                        script = b";\n".join(
+                            cur.mogrify(sql.strip().rstrip(";"), params or ()) for sql, params in stmts
+                        )
+                        t0 = time.perf_counter()
+                        cur.execute(script)
+                        rows = cur.fetchall() if cur.description else []
+                    _sql_record(" ; ".join(sql for sql, _ in stmts), time.perf_counter() - t0, rows)
+                finally:
+                    if conn.closed == 0:
+                        conn.autocommit = False
+            break
+        except psycopg2.InterfaceError:
+            if tentativa == 2:
+                raise
+
+    tabelas = set()
+    for sql, _ in stmts:
+        tabelas |= tables_written(sql)
+    invalidate_tables(tabelas)
+    return rows
+
+@contextmanager
+def transaction():
+    # uso: with transaction() as tx: tx.exec(...); tx.exec(...)
+    # tudo é enviado junto na saída do bloco; exceção dentro do bloco = nada enviado
+    tx = _Tx()
+    yield tx
+    if tx.stmts:
+        tx.rows = _run_batch(tx.stmts)
 
 def exec_sql(sql, params=None):
-    conn = get_conn()
-    try:
-        with conn.cursor() as cur:
-            cur.execute(sql, params or ())
-        conn.commit()
-    except psycopg2.InterfaceError:
-        # conexão morreu → recria e tenta 1x
-        holder = _conn_holder()
-        holder["conn"] = None
-        conn = get_conn()
-        with conn.cursor() as cur:
-            cur.execute(sql, params or ())
-        conn.commit()
-    except Exception:
+    with transaction() as tx:
+        tx.exec(sql, params)
+    return tx.rows
+
+# ======================================================
+# CACHE DE LEITURA (catálogos: pessoas, clientes, indicações, obras, serviços)
+# ======================================================
+CATALOGO_TTL = _cfg("CACHE_TTL", 300.0)  # segundos; escrita pelo app invalida antes disso
+_CACHE_MAX_ITENS = 256
+
+_RE_TAB_LIDA = re.compile(r"\b(?:from|join)\s+public\.(\w+)", re.I)
+_RE_TAB_ESCRITA = re.compile(r"\b(?:insert\s+into|update|delete\s+from)\s+public\.(\w+)", re.I)
+_RE_FN = re.compile(r"\bpublic\.(fn_\w+)\s*\(", re.I)
+
+# funções do banco que escrevem em tabelas (não aparecem no texto do SQL)
+_FN_TABELAS = {
+    "fn_recalcular_orcamento": {"orcamentos", "obra_fases", "orcamento_fase_servicos"},
+    # "apontamentos": a coluna pago muda junto, pelos triggers de sql/003
+    "fn_gerar_pagamentos_semana": {"pagamentos", "pagamento_itens", "apontamentos"},
+    "fn_marcar_pagamento_pago": {"pagamentos", "apontamentos"},
+    "fn_estornar_pagamento": {"pagamentos", "apontamentos"},
+    "fn_home_hoje_kpis_refresh": {"home_hoje_kpis_cache"},
+}
+
+def tables_read(sql):
+    return {t.lower() for t in _RE_TAB_LIDA.findall(sql)}
+
+def tables_written(sql):
+    tabs = {t.lower() for t in _RE_TAB_ESCRITA.findall(sql)}
+    for fn in _RE_FN.findall(sql):
+        tabs |= _FN_TABELAS.get(fn.lower(), set())
+    return tabs
+
+@st.cache_resource
+def _read_cache():
+    # compartilhado entre sessões; "versoes" muda a cada escrita na tabela
+    return {"lock": threading.Lock(), "itens": {}, "versoes": {}, "hits": 0, "misses": 0}
+
+def invalidate_tables(tabelas, cache=None):
+    # cache: passado pelo ouvinte (thread sem contexto do Streamlit)
+    if not tabelas:
+        return
+    cache = cache or _read_cache()
+    with cache["lock"]:
+        for t in tabelas:
+            cache["versoes"][t] = cache["versoes"].get(t, 0) + 1
+        for chave in [k for k, v in cache["itens"].items() if v[1] & tabelas]:
+            del cache["itens"][chave]
+
+def table_versions(tabelas):
+    # versões atuais (mudam a cada escrita local ou aviso do banco)
+    cache = _read_cache()
+    with cache["lock"]:
+        return tuple(cache["versoes"].get(t, 0) for t in sorted(tabelas))
+
+# ---------- avisos do banco (LISTEN/NOTIFY, sql/002) ----------
+# escrita feita em outra sessão/processo ou dentro de uma função SQL chega aqui e
+# descarta só as consultas em cache que leem da tabela avisada
+CANAL_MUDANCAS = "sepol_mudancas"
+
+def _ouvir_mudancas(dsn, cache, estado):
+    espera = 1.0
+    while True:
+        conn = None
         try:
-            if getattr(conn, "closed", 1) == 0:
-                conn.rollback()
-        except Exception:
-            pass
-        raise
+            conn = psycopg2.connect(dsn, **{k: v for k, v in _CONN_KW.items() if k != "cursor_factory"})
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute(f"listen {CANAL_MUDANCAS};")
+            # avisos perdidos enquanto estava desconectado: começa do zero
+            with cache["lock"]:
+                tabs = set(cache["versoes"]) | {t for v in cache["itens"].values() for t in v[1]}
+            invalidate_tables(tabs, cache)
+            estado.update(conectado=True, desde=time.time())
+            espera = 1.0
+            while True:
+                if select.select([conn], [], [], 60)[0]:
+                    conn.poll()
+                    tabs = {n.payload.lower() for n in conn.notifies}
+                    conn.notifies.clear()
+                    if tabs:
+                        invalidate_tables(tabs, cache)
+                        estado["avisos"] += len(tabs)
+                        estado["ultimo"] = time.time()
+                else:
+                    conn.poll()  # ocioso: confirma que a conexão segue viva
+        except Exception as e:
+            estado.update(conectado=False, erro=str(e).splitlines()[0] if str(e) else repr(e))
+            _slow_log.warning("ouvinte de mudanças caiu: %s (nova tentativa em %.0fs)", e, espera)
+            time.sleep(espera)
+            espera = min(espera * 2, 60.0)
+        finally:
+            _close_quietly(conn)
 
-def safe_df(sql, params=None):
+@st.cache_resource
+def _ouvinte():
+    # uma thread por processo; desligável com o secret LISTEN_NOTIFY=false
+    estado = {"ativo": False, "conectado": False, "avisos": 0, "ultimo": None, "desde": None, "erro": None}
+    if not _cfg("LISTEN_NOTIFY", True):
+        return estado
+    estado["ativo"] = True
+    threading.Thread(
+        target=_ouvir_mudancas,
+        args=(st.secrets["DATABASE_URL"], _read_cache(), estado),
+        name="sepol-listen",
+        daemon=True,
+    ).start()
+    return estado
+
+def cached_df(sql, params=None, ttl=CATALOGO_TTL):
+    # o DataFrame devolvido é compartilhado: não alterar no lugar
+    cache = _read_cache()
+    chave = (sql, tuple(params or ()))
+    tabelas = tables_read(sql)
+    agora = time.monotonic()
+
+    with cache["lock"]:
+        item = cache["itens"].get(chave)
+        if item is not None and item[0] > agora:
+            cache["hits"] += 1
+            _SQL_RUN["cache_hits"] += 1
+            return item[2]
+        cache["misses"] += 1
+        versoes = {t: cache["versoes"].get(t, 0) for t in tabelas}
+
+    df = query_df(sql, params)
+
+    with cache["lock"]:
+        # se alguém escreveu nessas tabelas durante a consulta, não guarda
+        if all(cache["versoes"].get(t, 0) == v for t, v in versoes.items()):
+            itens = cache["itens"]
+            if len(itens) >= _CACHE_MAX_ITENS:
+                for k in [k for k, v in itens.items() if v[0] <= agora] or list(itens)[:len(itens) // 4]:
+                    del itens[k]
+            itens[chave] = (agora + ttl, tabelas, df)
+    return df
+
+def safe_df(sql, params=None, ttl=None):
     try:
+        if ttl:
+            return cached_df(sql, params, ttl)
         return query_df(sql, params)
     except Exception as e:
         st.error("Falha ao consultar o banco. (Conexão pode ter expirado; tente novamente.)")
         st.exception(e)
         st.stop()
 
-def brl(v):
+def safe_one(sql, params=None):
+    # uma linha (ou None), com o mesmo tratamento de erro de safe_df
     try:
-        return f"R$ {float(v):,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-    except Exception:
-        return "R$ 0,00"
+        return query_one(sql, params)
+    except Exception as e:
+        st.error("Falha ao consultar o banco. (Conexão pode ter expirado; tente novamente.)")
+        st.exception(e)
+        st.stop()
+
+def safe_scalar(sql, params=None):
+    r = safe_one(sql, params)
+    return r[0] if r is not None else None
+
+KPI_IDADE_MAX_S = _cfg("KPI_IDADE_MAX_S", 300.0)
+KPI_POLL_S = _cfg("KPI_POLL_S", 10.0)
+KPI_TABELAS = {"recebimentos", "pagamentos", "pagamento_itens", "obra_fases", "apontamentos"}
+
+def hoje_kpis():
+    # (linha de KPIs, idade em segundos): leitura pela PK do resumo; só chama o
+    # recálculo quando o resumo está sujo, é de outro dia ou passou da idade máxima
+    try:
+        k = query_one("""
+            select dados, sujo, dia = current_date as do_dia,
+                   extract(epoch from now() - atualizado_em) as idade_s
+            from public.home_hoje_kpis_cache
+            where id = 1;
+        """)
+    except psycopg2.errors.UndefinedTable:
+        # migração sql/001 ainda não aplicada: agrega direto da view
+        return safe_one("select * from public.home_hoje_kpis;"), None
+    except Exception as e:
+        st.error("Falha ao consultar o banco. (Conexão pode ter expirado; tente novamente.)")
+        st.exception(e)
+        st.stop()
+
+    if k is None or k["sujo"] or not k["do_dia"] or float(k["idade_s"]) > KPI_IDADE_MAX_S:
+        rows = exec_sql(
+            """
+            select dados, extract(epoch from now() - atualizado_em) as idade_s
+            from public.fn_home_hoje_kpis_refresh(make_interval(secs => %s));
+            """,
+            (KPI_IDADE_MAX_S,),
+        )
+        k = rows[0] if rows else None
+    if k is None or not k["dados"]:
+        return None, None
+    return k["dados"], float(k["idade_s"])
+
+DIAS_SEMANA = ["Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom"]
 
 def monday(d: date) -> date:
     return d - timedelta(days=d.weekday())
@@ -132,6 +651,169 @@ def to_int(x):
     except Exception:
         return None
 
+# ======================================================
+# LISTAS (grade única + paginação por chave no SQL)
+# ======================================================
+PAGE_SIZE = 50
+
+def _py(v):
+    # valor da linha → tipo python (psycopg2 não adapta numpy)
+    if isinstance(v, pd.Timestamp):
+        return v.to_pydatetime()
+    return v.item() if hasattr(v, "item") else v
+
+def _keyset_move(key, cursor):
+    cursores = st.session_state[f"{key}_cursores"]
+    if cursor is None:
+        if len(cursores) > 1:
+            cursores.pop()
+    else:
+        cursores.append(cursor)
+
+def keyset_page(key, sql, order_cols, params=None, desc=False, page_size=PAGE_SIZE, soma=None):
+    # sql: consulta SEM order by/limit; a página vem de "(cols) > (última linha)"
+    # (índice em order_cols → custo igual em qualquer página).
+    # soma: coluna de valor → total da página e acumulado das páginas até aqui
+    sig = (sql, tuple(params or ()))
+    if st.session_state.get(f"{key}_sig") != sig:
+        st.session_state[f"{key}_sig"] = sig
+        st.session_state[f"{key}_cursores"] = [None]
+        st.session_state[f"{key}_somas"] = {}
+    cursores = st.session_state[f"{key}_cursores"]
+    cursor = cursores[-1]
+
+    op, direcao = ("<", "desc") if desc else (">", "asc")
+    cols = ", ".join(order_cols)
+    filtro = f"where ({cols}) {op} ({', '.join(['%s'] * len(order_cols))})" if cursor else ""
+    ordem = ", ".join(f"{c} {direcao}" for c in order_cols)
+    with perf(f"página {key}"):
+        df = safe_df(
+            f"select * from ({sql.strip().rstrip(';')}) q {filtro} order by {ordem} limit {int(page_size) + 1};",
+            tuple(params or ()) + tuple(cursor or ()),
+        )
+    tem_mais = len(df) > page_size
+    df = df.iloc[:page_size]
+
+    if soma:
+        somas = st.session_state[f"{key}_somas"]
+        somas[len(cursores)] = float(df[soma].sum()) if not df.empty else 0.0
+        acumulado = sum(somas.get(i, 0.0) for i in range(1, len(cursores) + 1))
+        st.caption(f"{len(df)} registro(s) nesta página • Total da página: {brl(somas[len(cursores)])} • "
+                   f"Acumulado até aqui: {brl(acumulado)}")
+
+    if tem_mais or len(cursores) > 1:
+        proximo = [_py(v) for v in df.iloc[-1][order_cols].tolist()] if not df.empty else None
+        c1, c2, c3 = st.columns([2, 6, 2])
+        with c1:
+            st.button("◀ Anterior", key=f"{key}_prev", disabled=(len(cursores) == 1),
+                      on_click=_keyset_move, args=(key, None), use_container_width=True)
+        with c2:
+            st.caption(f"Página {len(cursores)}")
+        with c3:
+            st.button("Próxima ▶", key=f"{key}_next", disabled=(not tem_mais),
+                      on_click=_keyset_move, args=(key, proximo), use_container_width=True)
+    return df
+
+def filtro_periodo(rotulo, key):
+    # intervalo opcional (vazio = sem filtro) → (início, fim); só uma data = aquele dia em diante
+    v = st.date_input(rotulo, value=(), key=key, format="DD/MM/YYYY")
+    v = tuple(v) if isinstance(v, (list, tuple)) else (v,)
+    return (v[0] if v else None), (v[1] if len(v) > 1 else None)
+
+def filtros_where(conds, prefixo=" where "):
+    # conds: [(trecho com %s, valor)]; valor None = filtro desligado → (" where ...", params)
+    # prefixo=" and " quando a consulta já tem where fixo
+    ativos = [(c, v) for c, v in conds if v is not None]
+    if not ativos:
+        return "", ()
+    return prefixo + " and ".join(c for c, _ in ativos), tuple(v for _, v in ativos)
+
+def grid_select(key, df, columns, column_config=None):
+    # uma grade (virtualizada) no lugar de colunas+botões por linha;
+    # devolve a linha selecionada (ou None)
+    pagina = len(st.session_state.get(f"{key}_cursores", [None]))
+    with perf(f"grade {key}"):
+        ev = st.dataframe(
+            df,
+            key=f"{key}_grid_{pagina}",  # trocou de página → seleção zera
+            on_select="rerun",
+            selection_mode="single-row",
+            hide_index=True,
+            use_container_width=True,
+            column_order=columns,
+            column_config=column_config,
+        )
+    rows = ev.selection.rows
+    if not rows or rows[0] >= len(df):
+        return None
+    return df.iloc[rows[0]]
+
+def grid_multi(key, df, columns, column_config=None):
+    # grade com seleção de várias linhas; devolve as linhas selecionadas
+    with perf(f"grade {key}"):
+        ev = st.dataframe(
+            df,
+            key=key,
+            on_select="rerun",
+            selection_mode="multi-row",
+            hide_index=True,
+            use_container_width=True,
+            column_order=columns,
+            column_config=column_config,
+        )
+    rows = [i for i in ev.selection.rows if i < len(df)]
+    return df.iloc[rows]
+
+def row_actions(prefix, tabela, rr, edit_key, titulo, recarrega_tela=False):
+    # ações da linha selecionada nos cadastros (editar + ativar/inativar);
+    # editar abre o form no topo (tela toda), ativar/inativar só reroda a lista
+    rid = int(rr["id"])
+    colA, colB, colC = st.columns([6, 2, 2])
+    with colA:
+        st.write(titulo)
+    with colB:
+        if st.button("EDITAR ✏️", key=f"{prefix}_edit_sel", use_container_width=True):
+            st.session_state[edit_key] = rid
+            st.rerun()
+    with colC:
+        ativo = bool(rr["ativo"])
+        if st.button("INATIVAR ⛔" if ativo else "ATIVAR ✅", key=f"{prefix}_ativo_sel", use_container_width=True):
+            exec_sql(f"update public.{tabela} set ativo=%s where id=%s;", (not ativo, rid))
+            if recarrega_tela:
+                st.rerun()
+            st.rerun(scope="fragment")
+
+@st.fragment
+def cadastro_lista(key, sql, order_cols, columns, column_config, tabela, edit_key, titulo,
+                   vazio, dica=None, desc=False, recarrega_tela=False):
+    # lista + ações num fragmento: paginar/selecionar/ativar não reroda a página
+    # (recarrega_tela=True quando ativar/inativar muda outras listas da mesma tela)
+    df = keyset_page(key, sql, order_cols, desc=desc)
+    if df.empty:
+        st.info(vazio)
+        return
+    rr = grid_select(key, df, columns, column_config)
+    if rr is None:
+        if dica:
+            st.caption(dica)
+        return
+    row_actions(key, tabela, rr, edit_key, titulo(rr), recarrega_tela)
+
+COL_ATIVO = st.column_config.CheckboxColumn("Ativo")
+
+def option_labels(df, label, key="id"):
+    # id -> rótulo, montado UMA vez por resultado de consulta;
+    # label: nome da coluna ou função(linha: dict) -> str
+    if df is None or df.empty:
+        return {}
+    if callable(label):
+        return {int(r[key]): label(r) for r in df.to_dict("records")}
+    return dict(zip((int(x) for x in df[key].tolist()), df[label].tolist()))
+
+def fmt_option(labels, vazio="—"):
+    # format_func de selectbox: consulta O(1) no dicionário
+    return lambda x: vazio if x is None else labels.get(int(x), f"ID {x}")
+
 def go(dest):
     st.session_state["menu"] = dest
     st.session_state["menu_widget"] = dest  # mantém o selectbox sincronizado
@@ -162,128 +844,286 @@ def msg_status_orc(stt: str):
 # ======================================================
 # PDF
 # ======================================================
-def gerar_pdf_orcamento(df_head, df_itens) -> bytes:
+PDF_CACHE_MAX_BYTES = int(_cfg("PDF_CACHE_MB", 64.0) * 2**20)
+
+# conteúdo do PDF resumido no próprio banco (cabeçalho + todas as linhas): muda o
+# conteúdo → muda a chave do cache, sem trazer os itens só para comparar
+# (arrays jsonb: cada campo tem posição fixa e NULL vira null — concat_ws pularia os NULLs
+# e conteúdos diferentes poderiam dar o mesmo texto)
+_PDF_DIGEST_SQL = """
+    md5(jsonb_build_array(
+      o.titulo, o.status, o.valor_total, o.desconto_valor, o.valor_total_final,
+      ob.titulo, ob.endereco_obra, c.nome, c.telefone,
+      (select jsonb_agg(
+                jsonb_build_array(f.id, f.ordem, f.nome_fase, f.valor_fase,
+                                  s.nome, s.unidade, ofs.quantidade, ofs.valor_unit, ofs.valor_total)
+                order by f.ordem, f.id, s.nome, ofs.id)
+       from public.obra_fases f
+       left join public.orcamento_fase_servicos ofs
+         on ofs.obra_fase_id=f.id and ofs.orcamento_id=f.orcamento_id
+       left join public.servicos s on s.id=ofs.servico_id
+       where f.orcamento_id=o.id)
+    )::text)
+"""
+
+_PDF_HEAD_SQL = f"""
+    select
+      o.id as orcamento_id, o.titulo, o.status,
+      o.valor_total, o.desconto_valor, o.valor_total_final,
+      ob.titulo as obra_titulo, ob.endereco_obra,
+      c.nome as cliente_nome, c.telefone as cliente_tel,
+      {_PDF_DIGEST_SQL} as conteudo_md5
+    from public.orcamentos o
+    join public.obras ob on ob.id=o.obra_id
+    join public.clientes c on c.id=ob.cliente_id
+"""
+
+# linhas na ordem do desenho (fase → serviço)
+_PDF_ITENS_SQL = """
+    select
+      f.orcamento_id, f.id as fase_id, f.ordem, f.nome_fase, f.valor_fase,
+      s.nome as servico, s.unidade,
+      ofs.quantidade, ofs.valor_unit, ofs.valor_total
+    from public.obra_fases f
+    left join public.orcamento_fase_servicos ofs
+      on ofs.obra_fase_id=f.id and ofs.orcamento_id=f.orcamento_id
+    left join public.servicos s on s.id=ofs.servico_id
+"""
+
+@st.cache_resource
+def _pdf_cache():
+    # PDFs prontos por (orçamento, md5 do conteúdo); LRU limitado em bytes
+    return {"lock": threading.Lock(), "itens": OrderedDict(), "bytes": 0, "hits": 0, "misses": 0}
+
+def _pdf_buscar(chave):
+    cache = _pdf_cache()
+    with cache["lock"]:
+        pdf = cache["itens"].get(chave)
+        if pdf is not None:
+            cache["itens"].move_to_end(chave)
+            cache["hits"] += 1
+        else:
+            cache["misses"] += 1
+        return pdf
+
+def _pdf_guardar(chave, pdf):
+    cache = _pdf_cache()
+    with cache["lock"]:
+        itens = cache["itens"]
+        if chave not in itens and len(pdf) <= PDF_CACHE_MAX_BYTES:
+            itens[chave] = pdf
+            cache["bytes"] += len(pdf)
+            while cache["bytes"] > PDF_CACHE_MAX_BYTES:
+                _, velho = itens.popitem(last=False)
+                cache["bytes"] -= len(velho)
+
+def pdf_orcamento(orc_id) -> bytes:
+    # mesmo conteúdo → mesmos bytes: só gera de novo se cabeçalho/itens mudarem
+    # cabeçalho + md5 sem cache: busca de 1 linha pela PK, e o md5 tem que ser o de agora
+    head = safe_one(_PDF_HEAD_SQL + " where o.id=%s;", (int(orc_id),))
+    if head is None:
+        raise ValueError(f"Orçamento {orc_id} não encontrado.")
+    head = dict(head)
+    chave = (int(orc_id), head["conteudo_md5"])
+    pdf = _pdf_buscar(chave)
+    if pdf is None:
+        # itens vêm do cursor direto para o desenho (memória não cresce com o nº de serviços)
+        from relatorios_pdf import desenhar_orcamento  # reportlab só quando sai o 1º PDF
+        with perf("PDF orçamento"), tempfile.SpooledTemporaryFile(max_size=8 * 2**20) as arq:
+            desenhar_orcamento(
+                arq, head,
+                iter_rows(_PDF_ITENS_SQL + " where f.orcamento_id=%s order by f.ordem, f.id, s.nome, ofs.id;",
+                          (int(orc_id),)),
+            )
+            arq.seek(0)
+            pdf = arq.read()
+        _pdf_guardar(chave, pdf)
+    return pdf
+
+def botao_pdf_orcamento(orc_id, key):
+    # PDF só sob pedido: "Gerar PDF" marca o orçamento na sessão e daí em diante aparece o
+    # download (pdf_orcamento vem do cache; se o conteúdo mudou, gera de novo)
+    if st.session_state.get("orc_pdf_pedido") != orc_id:
+        if not st.button("📄 Gerar PDF", key=f"{key}_gerar", use_container_width=True):
+            return
+        st.session_state["orc_pdf_pedido"] = orc_id
+    with st.spinner("Gerando PDF..."):
+        pdf = pdf_orcamento(orc_id)
+    st.download_button(
+        "⬇️ Baixar PDF do Orçamento",
+        data=pdf,
+        file_name=f"SEPOL_Orcamento_{orc_id}.pdf",
+        mime="application/pdf",
+        use_container_width=True,
+        key=key,
+    )
+
+# ---------- lote: vários orçamentos num ZIP ----------
+EXPORT_MAX = _cfg("EXPORT_MAX", 500)
+PDF_WORKERS = max(1, _cfg("PDF_WORKERS", os.cpu_count() or 2))
+
+@st.cache_resource
+def _pdf_pool():
+    # processos "spawn" (não herdam o estado do Streamlit). O spawn re-executa o __main__
+    # em cada worker — aqui o __main__ é o app.py (Streamlit, consultas da HOJE, LISTEN...).
+    # Enquanto os workers sobem, o __main__ vira um módulo vazio (sem __file__): eles só
+    # importam relatorios_pdf quando chega a 1ª tarefa.
+    import multiprocessing
+    import types
+    from concurrent.futures import ProcessPoolExecutor
+    from relatorios_pdf import modulos_do_app
+    pool = ProcessPoolExecutor(
+        max_workers=PDF_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+    principal = sys.modules["__main__"]
+    sys.modules["__main__"] = types.ModuleType("__mp_main__")
+    try:
+        # os workers sobem sob demanda: 1 tarefa por worker sobe todos agora, com o stub
+        aquecer = [pool.submit(modulos_do_app) for _ in range(PDF_WORKERS)]
+    finally:
+        sys.modules["__main__"] = principal
+    try:
+        carregados = sorted({m for f in aquecer for m in f.result(timeout=60)})
+    except Exception:
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    if carregados:
+        logging.getLogger("sepol.pdf").warning(
+            "workers de PDF carregaram módulos do app: %s", ", ".join(carregados))
+    return pool
+
+def _pdf_pool_descartar():
+    # pool quebrado: encerra o que sobrou (processos + thread de gestão) antes de esquecer;
+    # o próximo _pdf_pool() cria outro
+    try:
+        _pdf_pool().shutdown(wait=False, cancel_futures=True)
+    except Exception:
+        pass
+    _pdf_pool.clear()
+
+def exportar_zip(ids) -> bytes:
+    # cabeçalhos (com md5) numa consulta; itens só dos que não estão no cache, noutra.
+    # Os que faltam são gerados em paralelo e entram no ZIP assim que ficam prontos.
+    from concurrent.futures import as_completed
+    from concurrent.futures.process import BrokenProcessPool
+    from relatorios_pdf import gerar_pdf_lote
+    heads = query_rows(_PDF_HEAD_SQL + " where o.id = any(%s) order by o.id;", (list(ids),))
     buf = BytesIO()
-    c = canvas.Canvas(buf, pagesize=A4)
-    w, h = A4
-    
-    # --- LOGO (topo direito) ---
-    logo_path = "assets/sepol_logo.png"
-    if os.path.exists(logo_path):
-        try:
-            logo = ImageReader(logo_path)
-            logo_w = 110  # largura em pontos (ajuste fino)
-            logo_h = 40   # altura em pontos (ajuste fino)
-            x = w - 50 - logo_w
-            y = h - 50 - logo_h + 10
-            c.drawImage(logo, x, y, width=logo_w, height=logo_h, mask="auto")
-        except Exception:
-            pass
-    
-    r = df_head.iloc[0]
-    y = h - 50
-    
-    c.setFont("Helvetica-Bold", 14)
-    c.drawString(50, y, f"SEPOL - Orçamento #{r['orcamento_id']}")    
-    y -= 16
-    
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(50, y, f"{r['titulo']}  - Status: {r['status']}")
-    y -= 16
-
-    c.setFont("Helvetica", 10)
-    c.drawString(50, y, f"Cliente: {r['cliente_nome']}  Tel: {r.get('cliente_tel') or ''}")
-    y -= 14
-    c.drawString(50, y, f"Obra: {r['obra_titulo']}")
-    y -= 14
-    c.drawString(50, y, f"Endereço: {r.get('endereco_obra') or ''}")
-    y -= 14
-    
-    y -= 24
-
-    # Agrupa por fase
-    if df_itens.empty:
-        c.setFont("Helvetica", 10)
-        c.drawString(50, y, "Sem fases/serviços cadastrados.")
-        c.showPage()
-        c.save()
-        return buf.getvalue()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf, perf(f"ZIP {len(heads)} PDF(s)"):
+        pendentes = {}
+        for head in heads:
+            oid = int(head["orcamento_id"])
+            chave = (oid, head["conteudo_md5"])
+            pdf = _pdf_buscar(chave)
+            if pdf is not None:
+                zf.writestr(f"SEPOL_Orcamento_{oid}.pdf", pdf)
+            else:
+                pendentes[oid] = (chave, dict(head), [])
+        if pendentes:
+            for row in iter_rows(
+                _PDF_ITENS_SQL + " where f.orcamento_id = any(%s) order by f.orcamento_id, f.ordem, f.id, s.nome, ofs.id;",
+                (list(pendentes),),
+            ):
+                pendentes[int(row["orcamento_id"])][2].append(dict(row))
 
-    fases = df_itens.groupby(["fase_id","ordem","nome_fase","valor_fase"], dropna=False)
-    for (fase_id, ordem, nome_fase, valor_fase), g in fases:
-        if y < 120:
-            c.showPage()
-            y = h - 50
-
-        c.setFont("Helvetica-Bold", 12)
-        # c.drawString(50, y, f"Fase {int(ordem)} - {nome_fase}  |  Total fase: {brl(valor_fase)}")
-        c.drawString(50, y, f"Fase {int(ordem)} - {nome_fase}")
-        y -= 16
-
-        # Cabeçalho da tabela
-        c.setFont("Helvetica-Bold", 9)
-        c.drawString(50, y, "Serviço")
-        c.drawString(270, y, "Qtd")
-        c.drawString(310, y, "Un")
-        # c.drawString(340, y, "V.Unit")
-        # c.drawString(430, y, "Total")
-        y -= 12
-        c.setFont("Helvetica", 9)
-
-        # Linhas
-        for _, row in g.iterrows():
-            serv = row.get("servico") or "-"
-            qtd = row.get("quantidade")
-            un = row.get("unidade") or ""
-            # vunit = row.get("valor_unit")
-            # vtot = row.get("valor_total")
-
-            if y < 90:
-                c.showPage()
-                y = h - 50
-
-            c.drawString(50, y, str(serv)[:40])
-            c.drawRightString(300, y, "" if pd.isna(qtd) else f"{float(qtd):.2f}")
-            c.drawString(310, y, str(un))
-            # c.drawRightString(410, y, "" if pd.isna(vunit) else brl(vunit))
-            # c.drawRightString(520, y, "" if pd.isna(vtot) else brl(vtot))
-            y -= 12
-
-        y -= 14
-
-    y -= 14
-    c.setFont("Helvetica-Bold", 11)
-    c.drawString(50, y, f"VALOR BRUTO: {brl(r['valor_total'])}")
-    c.drawString(225, y, f"DESCONTO: {brl(r['desconto_valor'])}")
-    c.drawString(375, y, f"VALOR FINAL: {brl(r['valor_total_final'])}")
-    y -= 20
-
-    c.showPage()
-    c.save()
+        try:
+            futuros = [_pdf_pool().submit(gerar_pdf_lote, (oid, head, itens))
+                       for oid, (_, head, itens) in pendentes.items()]
+            for f in as_completed(futuros):
+                oid, pdf = f.result()
+                _pdf_guardar(pendentes.pop(oid)[0], pdf)
+                zf.writestr(f"SEPOL_Orcamento_{oid}.pdf", pdf)
+        except BrokenProcessPool:
+            # pool caiu (ex.: processo morto): recria na próxima e termina aqui mesmo
+            _pdf_pool_descartar()
+            for oid, (chave, head, itens) in list(pendentes.items()):
+                _, pdf = gerar_pdf_lote((oid, head, itens))
+                _pdf_guardar(chave, pdf)
+                zf.writestr(f"SEPOL_Orcamento_{oid}.pdf", pdf)
     return buf.getvalue()
 
+# ---------- recibos da semana ----------
+def recibos_semana(segunda):
+    # pagamentos PAGOS na semana + itens (apontamentos), numa consulta só → [(pagamento, itens)];
+    # leitura pelo cursor do servidor, agrupada enquanto chega (sem lista intermediária)
+    rows = iter_rows(
+        """
+        select
+          p.id as pagamento_id, p.tipo, p.valor_total, p.referencia_inicio, p.referencia_fim, p.pago_em,
+          pe.nome as pessoa_nome,
+          a.id as apontamento_id, a.data, a.tipo_dia, a.valor_final, ob.titulo as obra
+        from public.pagamentos p
+        join public.pessoas pe on pe.id=p.pessoa_id
+        left join public.pagamento_itens pi on pi.pagamento_id=p.id
+        left join public.apontamentos a on a.id=pi.apontamento_id
+        left join public.obras ob on ob.id=a.obra_id
+        where p.status='PAGO' and p.pago_em >= %s and p.pago_em < %s
+        order by pe.nome, p.id, a.data, a.id;
+        """,
+        (segunda, segunda + timedelta(days=7)),
+    )
+    recibos = []
+    for r in rows:
+        if not recibos or recibos[-1][0]["pagamento_id"] != r["pagamento_id"]:
+            recibos.append(({k: r[k] for k in ("pagamento_id", "tipo", "valor_total", "referencia_inicio",
+                                               "referencia_fim", "pago_em", "pessoa_nome")}, []))
+        if r["apontamento_id"] is not None:
+            recibos[-1][1].append({k: r[k] for k in ("data", "tipo_dia", "valor_final", "obra")})
+    return recibos
+
+def pdf_recibos(recibos) -> bytes:
+    # pedaços contíguos (mantém a ordem) desenhados em paralelo e juntados num PDF só
+    from concurrent.futures.process import BrokenProcessPool
+    from pypdf import PdfWriter
+    from relatorios_pdf import gerar_recibos_lote
+    n = max(1, min(len(recibos), PDF_WORKERS))
+    tam = -(-len(recibos) // n)
+    pedacos = [(i, recibos[i * tam:(i + 1) * tam]) for i in range(n) if recibos[i * tam:(i + 1) * tam]]
+    with perf(f"recibos {len(recibos)}"):
+        try:
+            prontos = dict(_pdf_pool().map(gerar_recibos_lote, pedacos))
+        except BrokenProcessPool:
+            _pdf_pool_descartar()
+            prontos = dict(map(gerar_recibos_lote, pedacos))
+        if len(prontos) == 1:
+            return prontos[0]
+        writer = PdfWriter()
+        for i in sorted(prontos):
+            writer.append(BytesIO(prontos[i]))
+        buf = BytesIO()
+        writer.write(buf)
+        return buf.getvalue()
+
 # ======================================================
 # LOGIN
 # ======================================================
 if "usuario" not in st.session_state:
     st.session_state["usuario"] = None
 
+secao("LOGIN")
 if not st.session_state["usuario"]:
     st.title("🔐 Login")
     u = st.text_input("Usuário")
     s = st.text_input("Senha", type="password")
     if st.button("Entrar", type="primary"):
-        df = safe_df("select * from public.usuarios_app where usuario=%s and ativo=true;", (u,))
-        if df.empty or s != df.iloc[0]["senha_hash"]:
+        senha_hash = safe_scalar("select senha_hash from public.usuarios_app where usuario=%s and ativo=true;", (u,))
+        if senha_hash is None or s != senha_hash:
             st.error("Usuário ou senha inválidos.")
         else:
             st.session_state["usuario"] = u
             st.rerun()
     st.stop()
 
+# pandas só a partir daqui: a tela de login (1ª coisa após um cold start) não depende dele;
+# as funções acima que usam `pd` só rodam depois deste ponto
+import pandas as pd  # noqa: E402
+
 # ======================================================
 # MENU
 # ======================================================
+secao("SIDEBAR")
+ouvinte = _ouvinte()
 with st.sidebar:
     st.markdown(f"👤 {st.session_state['usuario']}")
     
@@ -303,8 +1143,24 @@ with st.sidebar:
         st.rerun()
 
     if st.button("🔄 Recarregar conexão"):
-        _conn_holder()["conn"] = None
-        st.success("Conexão será recriada no próximo acesso.")
+        reset_pool()
+        st.success("Conexões serão recriadas no próximo acesso.")
+
+    with st.expander("Conexões"):
+        ps = pool_stats()
+        espera_media = ps["espera_total_s"] / ps["checkouts"] if ps["checkouts"] else 0.0
+        st.caption(
+            f"Em uso: {ps['em_uso']}/{ps['max']} • Livres: {ps['livres']} (mín. {ps['min']})  \n"
+            f"Empréstimos: {ps['checkouts']} • Tiveram que esperar: {ps['esperas']}  \n"
+            f"Espera média: {espera_media*1000:.1f} ms • Máx: {ps['espera_max_s']*1000:.0f} ms • Timeouts: {ps['timeouts']}  \n"
+            f"Criadas: {ps['criadas']} • Descartadas: {ps['descartadas']}"
+        )
+        if ouvinte["ativo"]:
+            st.caption(
+                f"Avisos do banco: {'conectado' if ouvinte['conectado'] else 'desconectado'} • "
+                f"{ouvinte['avisos']} recebido(s)"
+                + (f"  \nÚltimo erro: {ouvinte['erro']}" if ouvinte["erro"] and not ouvinte["conectado"] else "")
+            )
         
     if st.button("Sair"):
         st.session_state["usuario"] = None
@@ -317,6 +1173,7 @@ menu = st.session_state["menu"]
 # PROFISSIONAIS (estável: form + modo edição)
 # ======================================================
 if menu == "PROFISSIONAIS":
+    secao("PROFISSIONAIS")
     st.subheader("👷 Profissionais")
 
     if "edit_prof" not in st.session_state:
@@ -355,11 +1212,10 @@ if menu == "PROFISSIONAIS":
     else:
         st.markdown("### ✏️ Editar profissional")
 
-        df_one = safe_df("select * from public.pessoas where id=%s;", (int(edit_id),))
-        if df_one.empty:
+        r = safe_one("select * from public.pessoas where id=%s;", (int(edit_id),))
+        if r is None:
             st.session_state["edit_prof"] = None
             st.rerun()
-        r = df_one.iloc[0]
 
         with st.form("form_prof_edit", clear_on_submit=False):
             nome = st.text_input("Nome", value=r["nome"], key="p_nome_edit")
@@ -399,42 +1255,24 @@ if menu == "PROFISSIONAIS":
 
     # ---------- LISTA ----------
     st.markdown("### 📋 Lista")
-    df = safe_df("select id, nome, tipo, telefone, ativo from public.pessoas order by nome;")
-
-    if df.empty:
-        st.info("Nenhum profissional cadastrado.")
-    else:
-        for _, rr in df.iterrows():
-            colA, colB, colC = st.columns([6, 2, 2])
-
-            with colA:
-                st.write(f"**{rr['nome']}** — {rr['tipo']}")
-                if rr["telefone"]:
-                    st.caption(rr["telefone"])
-
-            with colB:
-                st.write("ATIVO ✅" if rr["ativo"] else "INATIVO ⛔")
-
-            with colC:
-                b1, b2 = st.columns(2)  # lado a lado
-                with b1:
-                    if st.button("EDITAR ✏️", key=f"p_edit_{int(rr['id'])}", use_container_width=True):
-                        st.session_state["edit_prof"] = int(rr["id"])
-                        st.rerun()
-                with b2:
-                    if rr["ativo"]:
-                        if st.button("INATIVAR ⛔", key=f"p_inat_{int(rr['id'])}", use_container_width=True):
-                            exec_sql("update public.pessoas set ativo=false where id=%s;", (int(rr["id"]),))
-                            st.rerun()
-                    else:
-                        if st.button("ATIVAR ✅", key=f"p_at_{int(rr['id'])}", use_container_width=True):
-                            exec_sql("update public.pessoas set ativo=true where id=%s;", (int(rr["id"]),))
-                            st.rerun()
+    cadastro_lista(
+        "lst_prof",
+        "select id, nome, tipo, telefone, ativo from public.pessoas",
+        ["nome", "id"],
+        ["nome", "tipo", "telefone", "ativo"],
+        {"nome": "Nome", "tipo": "Tipo", "telefone": "Telefone", "ativo": COL_ATIVO},
+        tabela="pessoas",
+        edit_key="edit_prof",
+        titulo=lambda rr: f"**{rr['nome']}** — {rr['tipo']}",
+        vazio="Nenhum profissional cadastrado.",
+        dica="Selecione um profissional na lista para editar ou ativar/inativar.",
+    )
 
 # ======================================================
 # CLIENTES + INDICAÇÕES (estável: form + modo edição)
 # ======================================================
 if menu == "CLIENTES":
+    secao("CLIENTES")
     st.subheader("👥 Clientes & Indicações")
 
     if "edit_cliente" not in st.session_state:
@@ -471,11 +1309,10 @@ if menu == "CLIENTES":
                 st.success("Indicação cadastrada.")
                 st.rerun()
     else:
-        df_one = safe_df("select * from public.indicacoes where id=%s;", (int(edit_ind_id),))
-        if df_one.empty:
+        r = safe_one("select * from public.indicacoes where id=%s;", (int(edit_ind_id),))
+        if r is None:
             st.session_state["edit_ind"] = None
             st.rerun()
-        r = df_one.iloc[0]
 
         with st.form("form_ind_edit", clear_on_submit=False):
             c1, c2, c3 = st.columns([4, 2, 2])
@@ -513,33 +1350,18 @@ if menu == "CLIENTES":
                 st.session_state["edit_ind"] = None
                 st.rerun()
 
-    df_ind = safe_df("select id, nome, tipo, telefone, ativo from public.indicacoes order by nome;")
-    if df_ind.empty:
-        st.info("Nenhuma indicação cadastrada.")
-    else:
-        for _, rr in df_ind.iterrows():
-            colA, colB, colC = st.columns([6, 2, 2])
-            with colA:
-                st.write(f"**{rr['nome']}** — {rr['tipo']}")
-                if rr["telefone"]:
-                    st.caption(rr["telefone"])
-            with colB:
-                st.write("ATIVO ✅" if rr["ativo"] else "INATIVO ⛔")
-            with colC:
-                b1, b2 = st.columns(2)
-                with b1:
-                    if st.button("EDITAR ✏️", key=f"ind_edit_{int(rr['id'])}", use_container_width=True):
-                        st.session_state["edit_ind"] = int(rr["id"])
-                        st.rerun()
-                with b2:
-                    if rr["ativo"]:
-                        if st.button("INATIVAR ⛔", key=f"ind_inat_{int(rr['id'])}", use_container_width=True):
-                            exec_sql("update public.indicacoes set ativo=false where id=%s;", (int(rr["id"]),))
-                            st.rerun()
-                    else:
-                        if st.button("ATIVAR ✅", key=f"ind_at_{int(rr['id'])}", use_container_width=True):
-                            exec_sql("update public.indicacoes set ativo=true where id=%s;", (int(rr["id"]),))
-                            st.rerun()
+    cadastro_lista(
+        "lst_ind",
+        "select id, nome, tipo, telefone, ativo from public.indicacoes",
+        ["nome", "id"],
+        ["nome", "tipo", "telefone", "ativo"],
+        {"nome": "Nome", "tipo": "Tipo", "telefone": "Telefone", "ativo": COL_ATIVO},
+        tabela="indicacoes",
+        edit_key="edit_ind",
+        titulo=lambda rr: f"**{rr['nome']}** — {rr['tipo']}",
+        vazio="Nenhuma indicação cadastrada.",
+        recarrega_tela=True,  # "Quem indicou?" dos clientes, mais abaixo
+    )
 
     st.divider()
 
@@ -551,7 +1373,7 @@ if menu == "CLIENTES":
     edit_cli_id = st.session_state["edit_cliente"]
 
     # opções de indicação ativas para cliente indicado
-    df_ind_ativos = safe_df("select id, nome from public.indicacoes where ativo=true order by nome;")
+    df_ind_ativos = safe_df("select id, nome from public.indicacoes where ativo=true order by nome;", ttl=CATALOGO_TTL)
 
     if edit_cli_id is None:
         with st.form("form_cli_novo", clear_on_submit=True):
@@ -574,15 +1396,15 @@ if menu == "CLIENTES":
                     st.error(f"Erro: coluna 'id' não veio na consulta. Colunas disponíveis: {list(df_ind_ativos.columns)}")
                     st.stop()
                 # Mostra sempre (porque em form não re-renderiza condicional)
-                ids = [int(x) for x in df_ind_ativos["id"].tolist()]
-                map_ind_cli = dict(zip(df_ind_ativos["id"], df_ind_ativos["nome"]))
+                lbl_ind = option_labels(df_ind_ativos, "nome")
+                ids = list(lbl_ind)
                 
             if ids:
                 indicacao_id = st.selectbox(
                     "Quem indicou? (Clientes - Apenas se Origem = INDICADO)",
                     options=[None] + ids,  # sempre lista python
                     index=0,
-                    format_func=lambda x: "—" if x is None else map_ind_cli.get(int(x), f"ID {x}"),
+                    format_func=fmt_option(lbl_ind),
                     key="edit_cli_indicacao_id",
                     disabled=(len(ids)==0),
                 )
@@ -612,11 +1434,10 @@ if menu == "CLIENTES":
                 st.success("Cliente cadastrado.")
                 st.rerun()
     else:
-        df_one = safe_df("select * from public.clientes where id=%s;", (int(edit_cli_id),))
-        if df_one.empty:
+        r = safe_one("select * from public.clientes where id=%s;", (int(edit_cli_id),))
+        if r is None:
             st.session_state["edit_cliente"] = None
             st.rerun()
-        r = df_one.iloc[0]
 
         with st.form("form_cli_edit", clear_on_submit=False):
             c1, c2, c3 = st.columns([4, 2, 2])
@@ -634,19 +1455,21 @@ if menu == "CLIENTES":
 
             end = st.text_input("Endereço (opcional)", value=r["endereco"] or "", key="cli_end_edit")
             
-            ids = df_ind_ativos["id"].tolist()
+            lbl_ind = option_labels(df_ind_ativos, "nome")
+            ids = list(lbl_ind)
             default_sel = None
             if pd.notna(r["indicacao_id"]):
                 default_sel = int(r["indicacao_id"])
             
             # tenta manter a seleção atual
-            idx = opcoes.index(default_sel) if default_sel in opcoes else 0
+            opcoes_ind = [None] + ids
+            idx = opcoes_ind.index(default_sel) if default_sel in opcoes_ind else 0
             
             indicacao_id = st.selectbox(
                 "Quem indicou? (Obras - Apenas se Origem = INDICADO)",
-                options=[None] + ids,
+                options=opcoes_ind,
                 index=idx,
-                format_func=lambda x: df_ind_ativos.loc[df_ind_ativos["id"] == x, "nome"].iloc[0],
+                format_func=fmt_option(lbl_ind),
                 key="cli_ind_edit_any",
                 disabled=(len(ids)==0),
             )
@@ -686,47 +1509,30 @@ if menu == "CLIENTES":
                 st.rerun()
 
     st.markdown("### 📋 Lista de clientes")
-    df_cli = safe_df("""
+    cadastro_lista(
+        "lst_cli",
+        """
         select c.id, c.nome, c.telefone, c.endereco, c.origem, c.ativo,
                i.nome as indicacao_nome
         from public.clientes c
         left join public.indicacoes i on i.id=c.indicacao_id
-        order by c.nome;
-    """)
-
-    if df_cli.empty:
-        st.info("Nenhum cliente cadastrado.")
-    else:
-        for _, rr in df_cli.iterrows():
-            colA, colB, colC = st.columns([6, 2, 2])
-            with colA:
-                st.write(f"**{rr['nome']}** — {rr['origem']} — {rr['indicacao_nome'] or ''}")
-                if rr["telefone"]:
-                    st.caption(rr["telefone"])
-                if rr["endereco"]:
-                    st.caption(rr["endereco"])
-            with colB:
-                st.write("ATIVO ✅" if rr["ativo"] else "INATIVO ⛔")
-            with colC:
-                b1, b2 = st.columns(2)
-                with b1:
-                    if st.button("EDITAR ✏️", key=f"cli_edit_{int(rr['id'])}", use_container_width=True):
-                        st.session_state["edit_cliente"] = int(rr["id"])
-                        st.rerun()
-                with b2:
-                    if rr["ativo"]:
-                        if st.button("INATIVAR ⛔", key=f"cli_inat_{int(rr['id'])}", use_container_width=True):
-                            exec_sql("update public.clientes set ativo=false where id=%s;", (int(rr["id"]),))
-                            st.rerun()
-                    else:
-                        if st.button("ATIVAR ✅", key=f"cli_at_{int(rr['id'])}", use_container_width=True):
-                            exec_sql("update public.clientes set ativo=true where id=%s;", (int(rr["id"]),))
-                            st.rerun()
+        """,
+        ["nome", "id"],
+        ["nome", "origem", "indicacao_nome", "telefone", "endereco", "ativo"],
+        {"nome": "Nome", "origem": "Origem", "indicacao_nome": "Indicação",
+         "telefone": "Telefone", "endereco": "Endereço", "ativo": COL_ATIVO},
+        tabela="clientes",
+        edit_key="edit_cliente",
+        titulo=lambda rr: f"**{rr['nome']}** — {rr['origem']} — {rr['indicacao_nome'] or ''}",
+        vazio="Nenhum cliente cadastrado.",
+        dica="Selecione um cliente na lista para editar ou ativar/inativar.",
+    )
 
 # ======================================================
 # SERVIÇOS + CATÁLOGO (V1.5: form + modo edição)
 # ======================================================
 if menu == "SERVIÇOS":
+    secao("SERVIÇOS")
     st.subheader("🏗️ Serviços (catálogo)")
 
     if "edit_servico_id" not in st.session_state:
@@ -737,10 +1543,8 @@ if menu == "SERVIÇOS":
     # carregar registro para edição
     row = None
     if edit_id:
-        df_one = safe_df("select * from public.servicos where id=%s;", (int(edit_id),))
-        if not df_one.empty:
-            row = df_one.iloc[0]
-        else:
+        row = safe_one("select * from public.servicos where id=%s;", (int(edit_id),))
+        if row is None:
             st.session_state["edit_servico_id"] = None
             edit_id = None
 
@@ -807,49 +1611,31 @@ if menu == "SERVIÇOS":
     st.divider()
     st.markdown("#### Lista")
 
-    df = safe_df("select id, nome, unidade, ativo, criado_em from public.servicos order by nome;")
-    if df.empty:
-        st.info("Nenhum serviço cadastrado.")
-    else:
-        for _, rr in df.iterrows():
-            sid = int(rr["id"])
-            colA, colB, colC, colD, colE = st.columns([5,2,2,2,2])
-            with colA:
-                st.write(f"**{rr['nome']}**")
-            with colB:
-                st.write(rr["unidade"])
-            with colC:
-                st.write("ATIVO" if rr["ativo"] else "INATIVO")
-            with colD:
-                if st.button("Editar", key=f"serv_edit_{sid}", use_container_width=True):
-                    st.session_state["edit_servico_id"] = sid
-                    st.rerun()
-            with colE:
-                bE1, bE2 = st.columns(2)
-                with bE1:
-                    if rr["ativo"]:
-                        if st.button("Inativar", key=f"serv_inat_{sid}", use_container_width=True):
-                            exec_sql("update public.servicos set ativo=false where id=%s;", (sid,))
-                            st.rerun()
-                    else:
-                        if st.button("Ativar", key=f"serv_at_{sid}", use_container_width=True):
-                            exec_sql("update public.servicos set ativo=true where id=%s;", (sid,))
-                            st.rerun()
-                with bE2:
-                    st.write("")  # só pra manter alinhamento
+    cadastro_lista(
+        "lst_serv",
+        "select id, nome, unidade, ativo, criado_em from public.servicos",
+        ["nome", "id"],
+        ["nome", "unidade", "ativo"],
+        {"nome": "Serviço", "unidade": "Unidade", "ativo": COL_ATIVO},
+        tabela="servicos",
+        edit_key="edit_servico_id",
+        titulo=lambda rr: f"**{rr['nome']}** ({rr['unidade']})",
+        vazio="Nenhum serviço cadastrado.",
+        dica="Selecione um serviço na lista para editar ou ativar/inativar.",
+    )
 
 # ======================================================
 # OBRAS (estável: form + modo edição + cliente rápido com origem/indicação)
 # ======================================================
 if menu == "OBRAS":
+    secao("OBRAS")
     st.subheader("🏗️ Obras")
 
     if "edit_obra" not in st.session_state:
         st.session_state["edit_obra"] = None
 
     # Listas base
-    df_cli_ativos = safe_df("select id, nome from public.clientes where ativo=true order by nome;")
-    df_ind_ativos = safe_df("select id, nome from public.indicacoes where ativo=true order by nome;")
+    df_ind_ativos = safe_df("select id, nome from public.indicacoes where ativo=true order by nome;", ttl=CATALOGO_TTL)
 
     # -------------------------
     # Cliente rápido (com origem + indicação + indicação rápida inline)
@@ -886,15 +1672,15 @@ if menu == "OBRAS":
                     st.error(f"Erro: coluna 'id' não veio na consulta. Colunas disponíveis: {list(df_ind_ativos.columns)}")
                     st.stop()
                 # Mostra sempre (porque em form não re-renderiza condicional)   
-                ids = [int(x) for x in df_ind_ativos["id"].tolist()]
-                map_ind = dict(zip(df_ind_ativos["id"], df_ind_ativos["nome"]))
+                lbl_ind = option_labels(df_ind_ativos, "nome")
+                ids = list(lbl_ind)
                 
             if ids:
                 indicacao_id = st.selectbox(
                     "Quem indicou? (Cliente Rápido - Apenas se Origem = INDICADO)",
                     options=[None] + ids,  # sempre lista python
                     index=0,
-                    format_func=lambda x: "—" if x is None else map_ind.get(int(x), f"ID {x}"),
+                    format_func=fmt_option(lbl_ind),
                     key="obra_cli_indicacao_id",
                     disabled=(len(ids)==0),
                 )
@@ -911,17 +1697,24 @@ if menu == "OBRAS":
     
                 # Se origem indicado, precisa resolver indicacao_id (nova ou existente)
                 if origem == "INDICADO":
-                    # Se digitou nova indicação, cria e usa ela
+                    # Se digitou nova indicação, cria ela e o cliente no mesmo comando
                     if ind_nome.strip():
-                        exec_sql(
-                            "insert into public.indicacoes (nome,tipo,telefone,ativo) values (%s,%s,%s,true);",
-                            (ind_nome.strip(), ind_tipo, ind_tel.strip() or None),
-                        )
-                        df_last = safe_df(
-                            "select id from public.indicacoes where nome=%s order by id desc limit 1;",
-                            (ind_nome.strip(),),
-                        )
-                        indicacao_id = int(df_last.iloc[0]["id"])
+                        with transaction() as tx:
+                            tx.exec(
+                                """
+                                with ind as (
+                                  insert into public.indicacoes (nome,tipo,telefone,ativo)
+                                  values (%s,%s,%s,true)
+                                  returning id
+                                )
+                                insert into public.clientes (nome,telefone,endereco,origem,indicacao_id,ativo)
+                                select %s,%s,%s,%s,ind.id,true from ind;
+                                """,
+                                (ind_nome.strip(), ind_tipo, ind_tel.strip() or None,
+                                 nome.strip(), tel.strip() or None, end.strip() or None, origem),
+                            )
+                        st.success("Cliente criado. Agora selecione ele no cadastro da obra abaixo.")
+                        st.rerun()
     
                     # Se ainda não tem, exige seleção
                     if indicacao_id is None:
@@ -943,8 +1736,8 @@ if menu == "OBRAS":
 
     st.divider()
 
-    # Atualiza clientes (caso tenha criado cliente rápido)
-    df_cli_ativos = safe_df("select id, nome from public.clientes where ativo=true order by nome;")
+    # clientes ativos (o cliente rápido invalida o cache → aparece na hora)
+    df_cli_ativos = safe_df("select id, nome from public.clientes where ativo=true order by nome;", ttl=CATALOGO_TTL)
 
     if df_cli_ativos.empty:
         st.warning("Não existe nenhum Cliente ativa cadastrado ainda.")
@@ -955,7 +1748,8 @@ if menu == "OBRAS":
             st.error(f"Erro: coluna 'id' não veio na consulta. Colunas disponíveis: {list(df_cli_ativos.columns)}")
             st.stop()
         # Mostra sempre (porque em form não re-renderiza condicional)   
-        cli_ids = [int(x) for x in df_cli_ativos["id"].tolist()]
+        lbl_cli = option_labels(df_cli_ativos, "nome")
+        cli_ids = list(lbl_cli)
 
     if not cli_ids:
         st.warning("Cadastre pelo menos um cliente ativo.")
@@ -969,7 +1763,7 @@ if menu == "OBRAS":
             cliente_id = st.selectbox(
                 "Cliente",
                 cli_ids,
-                format_func=lambda x: df_cli_ativos.loc[df_cli_ativos["id"] == x, "nome"].iloc[0],
+                format_func=fmt_option(lbl_cli),
             )
             titulo = st.text_input("Título da obra")
             endereco = st.text_input("Endereço (opcional)")
@@ -994,11 +1788,10 @@ if menu == "OBRAS":
                 st.success("Obra cadastrada.")
                 st.rerun()
     else:
-        df_one = safe_df("select * from public.obras where id=%s;", (int(edit_id),))
-        if df_one.empty:
+        r = safe_one("select * from public.obras where id=%s;", (int(edit_id),))
+        if r is None:
             st.session_state["edit_obra"] = None
             st.rerun()
-        r = df_one.iloc[0]
 
         st.markdown("### ✏️ Editar obra")
         with st.form("form_obra_edit", clear_on_submit=False):
@@ -1009,7 +1802,7 @@ if menu == "OBRAS":
                 "Cliente",
                 cli_ids,
                 index=idx,
-                format_func=lambda x: df_cli_ativos.loc[df_cli_ativos["id"] == x, "nome"].iloc[0],
+                format_func=fmt_option(lbl_cli),
                 key="obra_cli_edit",
             )
             titulo = st.text_input("Título da obra", value=r["titulo"], key="obra_tit_edit")
@@ -1050,38 +1843,24 @@ if menu == "OBRAS":
     st.divider()
     st.markdown("### 📋 Lista de obras")
 
-    df_obras = safe_df("""
+    cadastro_lista(
+        "lst_obras",
+        """
         select o.id, o.titulo, o.status, o.ativo, c.nome as cliente
         from public.obras o
         join public.clientes c on c.id=o.cliente_id
-        order by o.id desc;
-    """)
+        """,
+        ["id"],
+        ["id", "titulo", "cliente", "status", "ativo"],
+        {"id": "#", "titulo": "Obra", "cliente": "Cliente", "status": "Status", "ativo": COL_ATIVO},
+        tabela="obras",
+        edit_key="edit_obra",
+        titulo=lambda rr: f"**{rr['titulo']}** — {rr['cliente']} • {rr['status']}",
+        vazio="Nenhuma obra cadastrada.",
+        desc=True,
+        recarrega_tela=True,  # "Abrir uma Obra" só lista obras ativas
+    )
 
-    if df_obras.empty:
-        st.info("Nenhuma obra cadastrada.")
-    else:
-        for _, rr in df_obras.iterrows():
-            colA, colB, colC = st.columns([6, 2, 2])
-            with colA:
-                st.write(f"**{rr['titulo']}** — {rr['cliente']}")
-            with colB:
-                st.write(rr["status"])
-            with colC:
-                b1, b2 = st.columns(2)
-                with b1:
-                    if st.button("EDITAR ✏️", key=f"obra_edit_{int(rr['id'])}", use_container_width=True):
-                        st.session_state["edit_obra"] = int(rr["id"])
-                        st.rerun()
-                with b2:
-                    if rr["ativo"]:
-                        if st.button("INATIVAR ⛔", key=f"obra_inat_{int(rr['id'])}", use_container_width=True):
-                            exec_sql("update public.obras set ativo=false where id=%s;", (int(rr["id"]),))
-                            st.rerun()
-                    else:
-                        if st.button("ATIVAR ✅", key=f"obra_at_{int(rr['id'])}", use_container_width=True):
-                            exec_sql("update public.obras set ativo=true where id=%s;", (int(rr["id"]),))
-                            st.rerun()
-                            
     if "obra_sel" not in st.session_state:
         st.session_state["obra_sel"] = None
     if "orc_sel" not in st.session_state:
@@ -1091,6 +1870,79 @@ if menu == "OBRAS":
     if "edit_fase" not in st.session_state:
         st.session_state["edit_fase"] = None
 
+    @st.fragment
+    def exportar_orcamentos():
+        # vários orçamentos (por obra, cliente ou período) num ZIP só
+        with st.expander("📦 Exportar orçamentos (ZIP de PDFs)"):
+            df_o = safe_df("""
+                select o.id, o.titulo, c.nome as cliente
+                from public.obras o
+                join public.clientes c on c.id=o.cliente_id
+                order by o.id desc;
+            """, ttl=CATALOGO_TTL)
+            df_c = safe_df("select id, nome from public.clientes order by nome;", ttl=CATALOGO_TTL)
+            lbl_o = option_labels(df_o, lambda r: f"#{r['id']} • {r['titulo']} • {r['cliente']}")
+            lbl_c = option_labels(df_c, "nome")
+
+            with st.form("form_exp_orc"):
+                c1, c2 = st.columns(2)
+                with c1:
+                    f_obra = st.selectbox("Obra", [None] + list(lbl_o), format_func=fmt_option(lbl_o, "Todas"))
+                with c2:
+                    f_cli = st.selectbox("Cliente", [None] + list(lbl_c), format_func=fmt_option(lbl_c, "Todos"))
+                c3, c4, c5 = st.columns([2, 2, 4])
+                with c3:
+                    f_ini = st.date_input("Criado de", value=None)
+                with c4:
+                    f_fim = st.date_input("até", value=None)
+                with c5:
+                    f_status = st.multiselect(
+                        "Status", ["RASCUNHO", "EMITIDO", "APROVADO", "REPROVADO", "CANCELADO"],
+                        default=["EMITIDO", "APROVADO"],
+                    )
+                gerar = st.form_submit_button("Gerar ZIP", type="primary", use_container_width=True)
+
+            if gerar:
+                df_ids = safe_df(
+                    """
+                    select o.id
+                    from public.orcamentos o
+                    join public.obras ob on ob.id=o.obra_id
+                    where (%(obra)s::bigint is null or o.obra_id = %(obra)s)
+                      and (%(cli)s::bigint is null or ob.cliente_id = %(cli)s)
+                      and (%(ini)s::date is null or o.criado_em >= %(ini)s)
+                      and (%(fim)s::date is null or o.criado_em < %(fim)s::date + 1)
+                      and o.status = any(%(status)s)
+                    order by o.id
+                    limit %(lim)s;
+                    """,
+                    {"obra": f_obra, "cli": f_cli, "ini": f_ini, "fim": f_fim,
+                     "status": f_status or ["EMITIDO", "APROVADO"], "lim": EXPORT_MAX + 1},
+                )
+                ids = [int(i) for i in df_ids["id"]] if not df_ids.empty else []
+                if not ids:
+                    st.session_state["exp_orc_zip"] = None
+                    st.info("Nenhum orçamento com esses filtros.")
+                elif len(ids) > EXPORT_MAX:
+                    st.session_state["exp_orc_zip"] = None
+                    st.warning(f"Mais de {EXPORT_MAX} orçamentos: refine os filtros.")
+                else:
+                    with st.spinner(f"Gerando {len(ids)} PDF(s)..."):
+                        st.session_state["exp_orc_zip"] = (len(ids), exportar_zip(ids))
+
+            pronto = st.session_state.get("exp_orc_zip")
+            if pronto:
+                st.download_button(
+                    f"⬇️ Baixar ZIP ({pronto[0]} orçamento(s))",
+                    data=pronto[1],
+                    file_name=f"SEPOL_Orcamentos_{date.today():%Y%m%d}.zip",
+                    mime="application/zip",
+                    use_container_width=True,
+                    key="exp_orc_dl",
+                )
+
+    exportar_orcamentos()
+
     st.divider()
     st.markdown("## 🔎 Abrir uma Obra")
 
@@ -1101,20 +1953,21 @@ if menu == "OBRAS":
         where o.ativo=true
         order by o.id desc
         limit 200;
-    """)
+    """, ttl=CATALOGO_TTL)
 
     if df_obras.empty:
         st.info("Nenhuma obra cadastrada.")
         st.stop()
 
-    obra_ids = df_obras["id"].tolist()
+    lbl_obras = option_labels(df_obras, lambda r: f"#{r['id']} • {r['titulo']} • {r['cliente']}")
+    obra_ids = list(lbl_obras)
     default_obra = st.session_state["obra_sel"] if st.session_state["obra_sel"] in obra_ids else obra_ids[0]
 
     obra_sel = st.selectbox(
         "Selecione a obra",
         obra_ids,
         index=obra_ids.index(default_obra),
-        format_func=lambda x: f"#{x} • {df_obras.loc[df_obras['id']==x,'titulo'].iloc[0]} • {df_obras.loc[df_obras['id']==x,'cliente'].iloc[0]}",
+        format_func=fmt_option(lbl_obras),
         key="obra_sel_box",
     )
 
@@ -1128,20 +1981,93 @@ if menu == "OBRAS":
 
     obra_id = int(st.session_state["obra_sel"])
 
-    tabs = st.tabs(["Orçamentos", "Fases do Orçamento", "Serviços", "Recebimentos"])
-
-    with tabs[0]:
+    # ---------- snapshot da obra: orçamentos → fases → itens + recebimentos numa consulta ----------
+    # guardado na sessão e refeito quando alguma dessas tabelas recebe escrita (desta sessão,
+    # de outra ou por aviso do banco — ver table_versions). Escritas que não avisam (outra
+    # réplica sem LISTEN, psql, sql/002 não aplicada) aparecem em até CATALOGO_TTL; com o
+    # ouvinte desconectado, o snapshot vale só dentro da mesma execução.
+    WS_TABELAS = {"orcamentos", "obra_fases", "orcamento_fase_servicos", "servicos", "recebimentos"}
+    WS_COLUNAS = {
+        "orcamentos": ["id", "titulo", "status", "valor_total", "desconto_valor", "valor_total_final",
+                       "criado_em", "aprovado_em", "observacao"],
+        "fases": ["id", "orcamento_id", "ordem", "nome_fase", "status", "valor_fase"],
+        "itens": ["id", "orcamento_id", "obra_fase_id", "servico", "unidade", "quantidade", "valor_unit",
+                  "valor_total", "observacao"],
+        "recebimentos": ["receb_id", "orcamento_id", "obra_fase_id", "receb_status", "valor_previsto", "acrescimo",
+                         "valor_total", "vencimento", "recebido_em"],
+    }
+    WS_DATAS = {"aprovado_em", "vencimento", "recebido_em"}
+
+    def _ws_df(nome, linhas):
+        # jsonb → DataFrame com as colunas de sempre (datas voltam a ser date/None)
+        df = pd.DataFrame(linhas or [], columns=WS_COLUNAS[nome])
+        # isinstance: valor ausente pode vir como NaN (ex.: pandas 3), e NaN é verdadeiro num if
+        for c in WS_DATAS & set(df.columns):
+            df[c] = [date.fromisoformat(v[:10]) if isinstance(v, str) else None for v in df[c]]
+        if "criado_em" in df.columns:
+            # timestamptz em texto vem no fuso da sessão (ex.: -03:00): fica nesse fuso,
+            # como o psycopg2 devolve na consulta direta
+            df["criado_em"] = [pd.Timestamp(v) if isinstance(v, str) else None for v in df["criado_em"]]
+        return df
+
+    def obra_ws(obra_id):
+        versoes = table_versions(WS_TABELAS)
+        ws = st.session_state.get("obra_ws")
+        if ws and ws["obra_id"] == obra_id and ws["versoes"] == versoes:
+            if ws["execucao"] == _T0:
+                return ws["dados"]
+            if _ouvinte()["conectado"] and time.monotonic() - ws["lido_em"] < CATALOGO_TTL:
+                return ws["dados"]
+        df = safe_df("""
+            select jsonb_build_object(
+              'orcamentos', (
+                select jsonb_agg(to_jsonb(o) order by o.id desc)
+                from (select id, titulo, status, valor_total, desconto_valor, valor_total_final,
+                             criado_em, aprovado_em, observacao
+                      from public.orcamentos where obra_id=%(obra)s) o),
+              'fases', (
+                select jsonb_agg(to_jsonb(f) order by f.orcamento_id, f.ordem)
+                from (select id, orcamento_id, ordem, nome_fase, status, valor_fase
+                      from public.obra_fases where obra_id=%(obra)s) f),
+              'itens', (
+                select jsonb_agg(to_jsonb(i) order by i.obra_fase_id, i.servico)
+                from (select ofs.id, ofs.orcamento_id, ofs.obra_fase_id, s.nome as servico, s.unidade,
+                             ofs.quantidade, ofs.valor_unit, ofs.valor_total, ofs.observacao
+                      from public.orcamento_fase_servicos ofs
+                      join public.obra_fases f on f.id=ofs.obra_fase_id
+                      join public.servicos s on s.id=ofs.servico_id
+                      where f.obra_id=%(obra)s) i),
+              'recebimentos', (
+                select jsonb_agg(to_jsonb(r) order by r.receb_id desc)
+                from (select r.id as receb_id, r.orcamento_id, r.obra_fase_id, r.status as receb_status,
+                             r.valor_previsto, r.acrescimo, r.valor_total, r.vencimento, r.recebido_em
+                      from public.recebimentos r
+                      join public.obra_fases f on f.id=r.obra_fase_id
+                      where f.obra_id=%(obra)s) r)
+            ) as ws;
+        """, {"obra": obra_id})
+        bruto = df.iloc[0]["ws"] if not df.empty else {}
+        dados = {nome: _ws_df(nome, bruto.get(nome)) for nome in WS_COLUNAS}
+        st.session_state["obra_ws"] = {"obra_id": obra_id, "versoes": versoes, "dados": dados,
+                                       "lido_em": time.monotonic(), "execucao": _T0}
+        return dados
+
+    def ws_do_orc(nome, orc_id):
+        df = obra_ws(obra_id)[nome]
+        return df[df["orcamento_id"] == int(orc_id)].reset_index(drop=True)
+
+    # só a seção escolhida roda (consultas + widgets); as outras carregam quando abertas
+    SECOES_OBRA = ["Orçamentos", "Fases do Orçamento", "Serviços", "Recebimentos"]
+    secao_obra = st.radio("Seção", SECOES_OBRA, horizontal=True, key="obra_secao", label_visibility="collapsed")
+
+    def obra_orcamentos(obra_id):
+        secao("OBRAS/Orçamentos")
         st.markdown("### 📄 Orçamentos da Obra")
     
         # =========================
         # 1) Lista de orçamentos da obra
         # =========================
-        df_orc = safe_df("""
-            select id, titulo, status, valor_total, desconto_valor, valor_total_final, criado_em, aprovado_em
-            from public.orcamentos
-            where obra_id=%s
-            order by id desc;
-        """, (obra_id,))
+        df_orc = obra_ws(obra_id)["orcamentos"]
     
         # =========================
         # 2) Criar novo orçamento
@@ -1170,12 +2096,13 @@ if menu == "OBRAS":
     
         if df_orc.empty:
             st.info("Nenhum orçamento ainda. Crie um orçamento.")
-            st.stop()
+            return
     
         # =========================
         # 3) Seleção do orçamento ativo (UI)
         # =========================
-        orc_ids = [int(x) for x in df_orc["id"].tolist()]
+        lbl_orc = option_labels(df_orc, lambda r: f"#{r['id']} • {r['titulo']} • {r['status']}")
+        orc_ids = list(lbl_orc)
     
         if "orc_sel" not in st.session_state or st.session_state["orc_sel"] not in orc_ids:
             st.session_state["orc_sel"] = orc_ids[0]
@@ -1184,7 +2111,7 @@ if menu == "OBRAS":
             "Orçamento selecionado",
             options=orc_ids,
             index=orc_ids.index(int(st.session_state["orc_sel"])),
-            format_func=lambda x: f"#{x} • {df_orc.loc[df_orc['id']==x,'titulo'].iloc[0]} • {df_orc.loc[df_orc['id']==x,'status'].iloc[0]}",
+            format_func=fmt_option(lbl_orc),
             key="orc_sel_box",
         )
         st.session_state["orc_sel"] = int(sel)
@@ -1196,15 +2123,11 @@ if menu == "OBRAS":
         st.markdown("### 🔎 Orçamento selecionado")
     
         orc_sel = int(st.session_state["orc_sel"])
-        df_sel = safe_df("""
-            select id, titulo, status, criado_em, aprovado_em, valor_total, desconto_valor, valor_total_final, observacao
-            from public.orcamentos
-            where id=%s;
-        """, (orc_sel,))
+        df_sel = df_orc[df_orc["id"] == orc_sel]
     
         if df_sel.empty:
             st.warning("Orçamento selecionado não encontrado.")
-            st.stop()
+            return
     
         rr = df_sel.iloc[0]
         status_atual = rr["status"]
@@ -1238,11 +2161,12 @@ if menu == "OBRAS":
             b1, b2 = st.columns(2)
             with b1:
                 if st.button("Salvar desconto", use_container_width=True, disabled=travado_final):
-                    exec_sql(
-                        "update public.orcamentos set desconto_valor=%s where id=%s;",
-                        (float(desc_novo), orc_sel),
-                    )
-                    exec_sql("select public.fn_recalcular_orcamento(%s);", (orc_sel,))
+                    with transaction() as tx:
+                        tx.exec(
+                            "update public.orcamentos set desconto_valor=%s where id=%s;",
+                            (float(desc_novo), orc_sel),
+                        )
+                        tx.exec("select public.fn_recalcular_orcamento(%s);", (orc_sel,))
                     st.success("Desconto aplicado e totais recalculados.")
                     st.rerun()
     
@@ -1265,51 +2189,14 @@ if menu == "OBRAS":
             # EMITIR: recalcula + seta status + gera PDF
             if st.button("Emitir e gerar PDF", key=f"emitir_sel_{orc_sel}",
                          type="primary", use_container_width=True, disabled=travado_final):
-                exec_sql("update public.orcamentos set desconto_valor=%s where id=%s;", (float(desc_novo), orc_sel))
-                exec_sql("select public.fn_recalcular_orcamento(%s);", (orc_sel,))
-                exec_sql("update public.orcamentos set status='EMITIDO' where id=%s;", (orc_sel,))
-    
-                df_head = safe_df(
-                    """
-                    select
-                      o.id as orcamento_id, o.titulo, o.status,
-                      o.valor_total, o.desconto_valor, o.valor_total_final,
-                      ob.titulo as obra_titulo, ob.endereco_obra,
-                      c.nome as cliente_nome, c.telefone as cliente_tel
-                    from public.orcamentos o
-                    join public.obras ob on ob.id=o.obra_id
-                    join public.clientes c on c.id=ob.cliente_id
-                    where o.id=%s;
-                    """,
-                    (orc_sel,),
-                )
-    
-                df_itens = safe_df(
-                    """
-                    select
-                      f.id as fase_id, f.ordem, f.nome_fase, f.valor_fase,
-                      s.nome as servico, s.unidade,
-                      ofs.quantidade, ofs.valor_unit, ofs.valor_total
-                    from public.obra_fases f
-                    left join public.orcamento_fase_servicos ofs
-                      on ofs.obra_fase_id=f.id and ofs.orcamento_id=f.orcamento_id
-                    left join public.servicos s on s.id=ofs.servico_id
-                    where f.orcamento_id=%s
-                    order by f.ordem, s.nome nulls last;
-                    """,
-                    (orc_sel,),
-                )
+                with transaction() as tx:
+                    tx.exec("update public.orcamentos set desconto_valor=%s where id=%s;", (float(desc_novo), orc_sel))
+                    tx.exec("select public.fn_recalcular_orcamento(%s);", (orc_sel,))
+                    tx.exec("update public.orcamentos set status='EMITIDO' where id=%s;", (orc_sel,))
     
-                pdf_bytes = gerar_pdf_orcamento(df_head, df_itens)
+                st.session_state["orc_pdf_pedido"] = orc_sel
                 st.success("Orçamento emitido! Baixe o PDF abaixo.")
-                st.download_button(
-                    "⬇️ Baixar PDF do Orçamento",
-                    data=pdf_bytes,
-                    file_name=f"SEPOL_Orcamento_{orc_sel}.pdf",
-                    mime="application/pdf",
-                    use_container_width=True,
-                    key=f"orc_pdf_sel_{orc_sel}",
-                )
+                botao_pdf_orcamento(orc_sel, f"orc_pdf_sel_{orc_sel}")
     
         st.divider()
     
@@ -1318,10 +2205,20 @@ if menu == "OBRAS":
         # =========================
         st.markdown("#### Lista (selecionar / editar / aprovar)")
     
-        for _, r in df_orc.iterrows():
+        df_orc_lst = df_orc.assign(
+            situacao=df_orc["status"].map(badge_status_orc),
+            total=df_orc["valor_total_final"].map(brl),
+            atual=(df_orc["id"] == orc_sel).map({True: "✅", False: ""}),
+        )
+        r = grid_select(
+            "lst_orc", df_orc_lst, ["atual", "id", "titulo", "situacao", "total", "criado_em"],
+            {"atual": "", "id": "#", "titulo": "Título", "situacao": "Status", "total": "Total final", "criado_em": "Criado em"},
+        )
+        if r is None:
+            st.caption("Selecione um orçamento na lista para as ações.")
+        else:
             rid = int(r["id"])
             status_row = r["status"]
-            selecionado = (rid == orc_sel)
             travado_final_row = status_row in ("APROVADO", "REPROVADO", "CANCELADO")
     
             c1, c2, c3, c4, c5 = st.columns([6, 2, 2, 2, 3])
@@ -1329,23 +2226,21 @@ if menu == "OBRAS":
             with c1:
                 st.write(f"**#{rid} — {r['titulo']}**")
                 st.caption(f"{badge_status_orc(status_row)} • Criado: {str(r['criado_em'])[:19]}")
-                if selecionado:
-                    st.success("✅ Selecionado")
     
             with c2:
-                if st.button("Selecionar", key=f"orc_pick_{rid}", use_container_width=True):
+                if st.button("Selecionar", key="orc_pick_sel", use_container_width=True, disabled=(rid == orc_sel)):
                     st.session_state["orc_sel"] = rid
                     st.rerun()
     
             with c3:
-                if st.button("Editar", key=f"orc_edit_{rid}", use_container_width=True):
+                if st.button("Editar", key="orc_edit_sel", use_container_width=True):
                     st.session_state["edit_orc"] = rid
                     st.rerun()
     
             with c4:
                 # fluxo 60+: aprovar preferencialmente quando EMITIDO
                 pode_aprovar = (status_row == "EMITIDO")
-                if st.button("Aprovar", key=f"orc_ap_{rid}", type="primary", use_container_width=True, disabled=(not pode_aprovar)):
+                if st.button("Aprovar", key="orc_ap_sel", type="primary", use_container_width=True, disabled=(not pode_aprovar)):
                     try:
                         exec_sql(
                             "update public.orcamentos set status='APROVADO', aprovado_em=current_date where id=%s;",
@@ -1375,15 +2270,18 @@ if menu == "OBRAS":
                     exec_sql("update public.orcamentos set status=%s where id=%s;", (novo_status, rid))
                     st.success("Status atualizado.")
                     st.rerun()
+
+            # já emitido: gera/baixa o PDF sob pedido, sem mexer no status
+            if status_row in ("EMITIDO", "APROVADO"):
+                botao_pdf_orcamento(rid, f"orc_pdf_lst_{rid}")
     
         # =========================
         # 6) Form de edição (fica igual ao seu, só não mistura com painel)
         # =========================
         edit_id = st.session_state.get("edit_orc")
         if edit_id:
-            df_one = safe_df("select * from public.orcamentos where id=%s;", (int(edit_id),))
-            if not df_one.empty:
-                rr2 = df_one.iloc[0]
+            rr2 = safe_one("select * from public.orcamentos where id=%s;", (int(edit_id),))
+            if rr2 is not None:
                 st.divider()
                 st.markdown("#### ✏️ Editar orçamento")
                 with st.form("orc_edit_form", clear_on_submit=False):
@@ -1413,35 +2311,34 @@ if menu == "OBRAS":
                         st.session_state["edit_orc"] = None
                         st.rerun()
 
-    with tabs[1]:
+    def obra_fases(obra_id):
+        secao("OBRAS/Fases")
         st.markdown("### 🧱 Fases do Orçamento")
     
         orc_id = st.session_state.get("orc_sel")
         if not orc_id:
-            st.info("Selecione um orçamento na aba Orçamentos.")
-            st.stop()
+            st.info("Nenhum orçamento nesta obra. Crie um na seção Orçamentos.")
+            return
     
         # status do orçamento (para travar apontamento depois)
-        df_orc1 = safe_df("select id, status, titulo from public.orcamentos where id=%s;", (int(orc_id),))
+        df_orc1 = obra_ws(obra_id)["orcamentos"]
+        df_orc1 = df_orc1[df_orc1["id"] == int(orc_id)]
+        if df_orc1.empty:
+            st.session_state["orc_sel"] = None
+            st.rerun()
         orc_status = df_orc1.iloc[0]["status"]
         st.caption(f"Orçamento #{orc_id}: **{df_orc1.iloc[0]['titulo']}** • Status: **{orc_status}**")
     
-        df_fases = safe_df("""
-            select id, ordem, nome_fase, status, valor_fase
-            from public.obra_fases
-            where orcamento_id=%s
-            order by ordem asc;
-        """, (int(orc_id),))
+        df_fases = ws_do_orc("fases", orc_id)
     
         # --- Nova fase / editar fase ---
         edit_fase = st.session_state.get("edit_fase")
     
         if edit_fase:
-            df_one = safe_df("select * from public.obra_fases where id=%s;", (int(edit_fase),))
-            if df_one.empty:
+            r = safe_one("select * from public.obra_fases where id=%s;", (int(edit_fase),))
+            if r is None:
                 st.session_state["edit_fase"] = None
                 st.rerun()
-            r = df_one.iloc[0]
             st.markdown("#### ✏️ Editar fase")
             with st.form("fase_edit", clear_on_submit=False):
                 c1, c2, c3 = st.columns([2,5,2])
@@ -1530,41 +2427,36 @@ if menu == "OBRAS":
         else:            
             total_orc = float(df_fases["valor_fase"].sum()) if "valor_fase" in df_fases.columns else 0.0
             st.success(f"Total das Fases neste Orçamento: {brl(total_orc)}")
-            for _, rr in df_fases.iterrows():
+            rr = grid_select(
+                "lst_fases", df_fases.assign(valor=df_fases["valor_fase"].map(brl)),
+                ["ordem", "nome_fase", "status", "valor"],
+                {"ordem": "Ordem", "nome_fase": "Fase", "status": "Status", "valor": "Valor"},
+            )
+            if rr is not None:
                 fid = int(rr["id"])
-                c1, c2, c3, c4, c5 = st.columns([1,4,2,2,2])
+                c1, c2 = st.columns([8, 2])
                 with c1:
-                    st.write(int(rr["ordem"]))
+                    st.write(f"**{int(rr['ordem'])} — {rr['nome_fase']}** • {rr['status']} • {brl(rr['valor_fase'])}")
                 with c2:
-                    st.write(f"**{rr['nome_fase']}**")
-                with c3:
-                    st.write(rr["status"])
-                with c4:
-                    st.write(brl(rr["valor_fase"]))
-                with c5:
-                    if st.button("Editar", key=f"fase_edit_{fid}", use_container_width=True):
+                    if st.button("Editar", key="fase_edit_sel", use_container_width=True):
                         st.session_state["edit_fase"] = fid
                         st.rerun()
 
-    with tabs[2]:
+    def obra_servicos(obra_id):
+        secao("OBRAS/Serviços")
         st.markdown("### 🧾 Serviços da Fase (Orçamento)")
     
         orc_id = st.session_state.get("orc_sel")
         if not orc_id:
-            st.info("Selecione um orçamento na aba Orçamentos.")
-            st.stop()
+            st.info("Nenhum orçamento nesta obra. Crie um na seção Orçamentos.")
+            return
     
         # fases do orçamento
-        df_fases = safe_df("""
-            select id, ordem, nome_fase, status, valor_fase
-            from public.obra_fases
-            where orcamento_id=%s
-            order by ordem;
-        """, (int(orc_id),))
+        df_fases = ws_do_orc("fases", orc_id)
     
         if df_fases.empty:
-            st.info("Crie fases primeiro na aba Fases do Orçamento.")
-            st.stop()
+            st.info("Crie fases primeiro na seção Fases do Orçamento.")
+            return
     
         # catálogo serviços ativos
         df_serv = safe_df("""
@@ -1572,14 +2464,15 @@ if menu == "OBRAS":
             from public.servicos
             where ativo=true
             order by nome;
-        """)
+        """, ttl=CATALOGO_TTL)
     
         if df_serv.empty:
             st.warning("Cadastre serviços primeiro em Cadastros → Serviços.")
-            st.stop()
+            return
     
         # selecionar fase
-        fase_ids = df_fases["id"].astype(int).tolist()
+        lbl_fases = option_labels(df_fases, lambda r: f"{int(r['ordem'])} - {r['nome_fase']}")
+        fase_ids = list(lbl_fases)
         if "fase_sel" not in st.session_state or st.session_state["fase_sel"] not in fase_ids:
             st.session_state["fase_sel"] = fase_ids[0]
     
@@ -1587,7 +2480,7 @@ if menu == "OBRAS":
             "Selecione a fase",
             options=fase_ids,
             index=fase_ids.index(st.session_state["fase_sel"]),
-            format_func=lambda x: f"{int(df_fases.loc[df_fases['id']==x,'ordem'].iloc[0])} - {df_fases.loc[df_fases['id']==x,'nome_fase'].iloc[0]}",
+            format_func=fmt_option(lbl_fases),
             key="fase_sel_box"
         )
         st.session_state["fase_sel"] = fase_sel
@@ -1598,11 +2491,11 @@ if menu == "OBRAS":
         # adicionar serviço na fase
         st.markdown("#### ➕ Adicionar serviço na fase")
         with st.form("add_servico_fase", clear_on_submit=True):
-            serv_ids = df_serv["id"].astype(int).tolist()
+            lbl_serv = option_labels(df_serv, lambda r: f"{r['nome']} ({r['unidade']})")
             serv_id = st.selectbox(
                 "Serviço",
-                options=serv_ids,
-                format_func=lambda x: f"{df_serv.loc[df_serv['id']==x,'nome'].iloc[0]} ({df_serv.loc[df_serv['id']==x,'unidade'].iloc[0]})"
+                options=list(lbl_serv),
+                format_func=fmt_option(lbl_serv),
             )
             c1, c2 = st.columns(2)
             with c1:
@@ -1627,136 +2520,111 @@ if menu == "OBRAS":
                     st.exception(e)
                     st.stop()
     
-        # lista serviços na fase
-        st.divider()
-        st.markdown("#### Lista de serviços da fase")
-    
-        df_it = safe_df("""
-            select
-              ofs.id,
-              s.nome as servico,
-              s.unidade,
-              ofs.quantidade,
-              ofs.valor_unit,
-              ofs.valor_total,
-              ofs.observacao
-            from public.orcamento_fase_servicos ofs
-            join public.servicos s on s.id=ofs.servico_id
-            where ofs.orcamento_id=%s and ofs.obra_fase_id=%s
-            order by s.nome;
-        """, (int(orc_id), obra_fase_id))
-    
-        if df_it.empty:
-            st.info("Nenhum serviço adicionado nesta fase.")
-        else:
-            total_fase = float(df_it["valor_total"].sum()) if "valor_total" in df_it.columns else 0.0
-            st.success(f"Total dos serviços nesta fase: {brl(total_fase)}")
-    
-            # editar/excluir por linha (simples)
-            for _, r in df_it.iterrows():
-                iid = int(r["id"])
-                col1, col2, col3, col4, col5, col6 = st.columns([4,1,1,2,2,2])
-                with col1:
-                    st.write(f"**{r['servico']}**")
-                    if r.get("observacao"):
-                        st.caption(r["observacao"])
-                with col2:
-                    st.write(r["unidade"])
-                with col3:
-                    st.write(float(r["quantidade"]))
-                with col4:
-                    st.write(brl(r["valor_unit"]))
-                with col5:
-                    st.write(brl(r["valor_total"]))
-                with col6:
-                    bE, bX = st.columns(2)
-                    with bE:
-                        if st.button("Editar", key=f"ofs_edit_{iid}", use_container_width=True):
+        @st.fragment
+        def itens_da_fase(orc_id, obra_fase_id):
+            # lista + editor do item: editar/remover só reroda este trecho
+            st.divider()
+            st.markdown("#### Lista de serviços da fase")
+    
+            df_it = ws_do_orc("itens", orc_id)
+            df_it = df_it[df_it["obra_fase_id"] == obra_fase_id].reset_index(drop=True)
+    
+            if df_it.empty:
+                st.info("Nenhum serviço adicionado nesta fase.")
+            else:
+                total_fase = float(df_it["valor_total"].sum()) if "valor_total" in df_it.columns else 0.0
+                st.success(f"Total dos serviços nesta fase: {brl(total_fase)}")
+    
+                # editar/excluir a linha selecionada
+                r = grid_select(
+                    f"lst_ofs_{obra_fase_id}",
+                    df_it.assign(vunit=df_it["valor_unit"].map(brl), vtotal=df_it["valor_total"].map(brl)),
+                    ["servico", "unidade", "quantidade", "vunit", "vtotal", "observacao"],
+                    {"servico": "Serviço", "unidade": "Un", "quantidade": "Qtd",
+                     "vunit": "V. unit", "vtotal": "Total", "observacao": "Observação"},
+                )
+                if r is not None:
+                    iid = int(r["id"])
+                    col1, col2, col3 = st.columns([6, 2, 2])
+                    with col1:
+                        st.write(f"**{r['servico']}** • {float(r['quantidade'])} {r['unidade']} • {brl(r['valor_total'])}")
+                    with col2:
+                        if st.button("Editar", key="ofs_edit_sel", use_container_width=True):
                             st.session_state["edit_ofs_id"] = iid
-                            st.rerun()
-                    with bX:
-                        if st.button("Remover", key=f"ofs_del_{iid}", use_container_width=True):
+                            st.rerun(scope="fragment")
+                    with col3:
+                        if st.button("Remover", key="ofs_del_sel", use_container_width=True):
                             exec_sql("delete from public.orcamento_fase_servicos where id=%s;", (iid,))
                             st.success("Removido.")
-                            st.rerun()
+                            st.rerun(scope="fragment")
     
-        # editor inline do item selecionado
-        if "edit_ofs_id" not in st.session_state:
-            st.session_state["edit_ofs_id"] = None
+            # editor inline do item selecionado
+            if "edit_ofs_id" not in st.session_state:
+                st.session_state["edit_ofs_id"] = None
     
-        edit_ofs_id = st.session_state.get("edit_ofs_id")
-        if edit_ofs_id:
-            df_one = safe_df("""
-                select ofs.*, s.nome as servico_nome, s.unidade
-                from public.orcamento_fase_servicos ofs
-                join public.servicos s on s.id=ofs.servico_id
-                where ofs.id=%s;
-            """, (int(edit_ofs_id),))
+            edit_ofs_id = st.session_state.get("edit_ofs_id")
+            if edit_ofs_id:
+                rr = safe_one("""
+                    select ofs.*, s.nome as servico_nome, s.unidade
+                    from public.orcamento_fase_servicos ofs
+                    join public.servicos s on s.id=ofs.servico_id
+                    where ofs.id=%s;
+                """, (int(edit_ofs_id),))
     
-            if df_one.empty:
-                st.session_state["edit_ofs_id"] = None
-                st.rerun()
+                if rr is None:
+                    st.session_state["edit_ofs_id"] = None
+                    st.rerun(scope="fragment")
     
-            rr = df_one.iloc[0]
-            st.divider()
-            st.markdown(f"#### ✏️ Editar item — {rr['servico_nome']} ({rr['unidade']})")
+                st.divider()
+                st.markdown(f"#### ✏️ Editar item — {rr['servico_nome']} ({rr['unidade']})")
     
-            with st.form("ofs_edit_form", clear_on_submit=False):
-                c1, c2 = st.columns(2)
-                with c1:
-                    qtd2 = st.number_input("Quantidade", min_value=0.01, step=1.0, value=float(rr["quantidade"]))
-                with c2:
-                    vunit2 = st.number_input("Valor unitário (R$)", min_value=0.0, step=50.0, value=float(rr["valor_unit"]))
-                obs2 = st.text_input("Observação", value=(rr["observacao"] or ""))
+                with st.form("ofs_edit_form", clear_on_submit=False):
+                    c1, c2 = st.columns(2)
+                    with c1:
+                        qtd2 = st.number_input("Quantidade", min_value=0.01, step=1.0, value=float(rr["quantidade"]))
+                    with c2:
+                        vunit2 = st.number_input("Valor unitário (R$)", min_value=0.0, step=50.0, value=float(rr["valor_unit"]))
+                    obs2 = st.text_input("Observação", value=(rr["observacao"] or ""))
     
-                b1, b2 = st.columns(2)
-                with b1:
-                    salvar = st.form_submit_button("Salvar alteração", type="primary", use_container_width=True)
-                with b2:
-                    cancelar = st.form_submit_button("Cancelar", use_container_width=True)
+                    b1, b2 = st.columns(2)
+                    with b1:
+                        salvar = st.form_submit_button("Salvar alteração", type="primary", use_container_width=True)
+                    with b2:
+                        cancelar = st.form_submit_button("Cancelar", use_container_width=True)
     
-                if salvar:
-                    exec_sql("""
-                        update public.orcamento_fase_servicos
-                        set quantidade=%s, valor_unit=%s, observacao=%s
-                        where id=%s;
-                    """, (float(qtd2), float(vunit2), obs2.strip() or None, int(edit_ofs_id)))
-                    st.session_state["edit_ofs_id"] = None
-                    st.success("Atualizado.")
-                    st.rerun()
+                    if salvar:
+                        exec_sql("""
+                            update public.orcamento_fase_servicos
+                            set quantidade=%s, valor_unit=%s, observacao=%s
+                            where id=%s;
+                        """, (float(qtd2), float(vunit2), obs2.strip() or None, int(edit_ofs_id)))
+                        st.session_state["edit_ofs_id"] = None
+                        st.success("Atualizado.")
+                        st.rerun(scope="fragment")
     
-                if cancelar:
-                    st.session_state["edit_ofs_id"] = None
-                    st.rerun()
+                    if cancelar:
+                        st.session_state["edit_ofs_id"] = None
+                        st.rerun(scope="fragment")
 
-    
-    with tabs[3]:
+        itens_da_fase(int(orc_id), obra_fase_id)
+
+    def obra_recebimentos(obra_id):
+        secao("OBRAS/Recebimentos")
         st.markdown("### 💳 Recebimentos (por fase)")
     
         orc_id = st.session_state.get("orc_sel")
         if not orc_id:
-            st.info("Selecione um orçamento na aba Orçamentos.")
-            st.stop()
+            st.info("Nenhum orçamento nesta obra. Crie um na seção Orçamentos.")
+            return
     
-        df_fases = safe_df("""
-            select id, ordem, nome_fase, valor_fase, status
-            from public.obra_fases
-            where orcamento_id=%s
-            order by ordem;
-        """, (int(orc_id),))
+        df_fases = ws_do_orc("fases", orc_id)
     
         if df_fases.empty:
             st.info("Crie fases primeiro.")
-            st.stop()
+            return
     
         # lista fases + recebimento existente (se houver)
-        df_rec = safe_df("""
-            select r.id as receb_id, r.obra_fase_id, r.status as receb_status,
-                   r.valor_previsto, r.acrescimo, r.valor_total, r.vencimento, r.recebido_em
-            from public.recebimentos r
-            where r.orcamento_id=%s
-            order by r.id desc;
-        """, (int(orc_id),))
+        df_rec = ws_do_orc("recebimentos", orc_id)
     
         rec_by_fase = {}
         if not df_rec.empty:
@@ -1830,6 +2698,17 @@ if menu == "OBRAS":
                             st.success("Recebimento atualizado.")
                             st.rerun()
 
+    if secao_obra != "Orçamentos" and not st.session_state.get("orc_sel"):
+        # abriu outra seção direto: usa o mesmo padrão da seção Orçamentos (o mais recente)
+        st.session_state["orc_sel"] = to_int(first_or_none(obra_ws(obra_id)["orcamentos"], "id"))
+
+    {
+        "Orçamentos": obra_orcamentos,
+        "Fases do Orçamento": obra_fases,
+        "Serviços": obra_servicos,
+        "Recebimentos": obra_recebimentos,
+    }[secao_obra](obra_id)
+
 # ======================================================
 # SEPOL - V1.2 Novas funcionalidades estáveis
 # ======================================================
@@ -1837,24 +2716,39 @@ if menu == "OBRAS":
 # HOJE (60+ operacional)
 # ======================================================
 if menu == "HOJE":
+    secao("HOJE")
     st.subheader("📅 HOJE")
 
-    # KPIs (usa view do seu SQL V1)
-    kpi = safe_df("select * from public.home_hoje_kpis;")
-    if not kpi.empty:
-        r = kpi.iloc[0]
-        c1, c2, c3, c4, c5 = st.columns(5)
-        c1.metric("Hoje", str(r["hoje"]))
-        c2.metric("Sexta-alvo", str(r["sexta"]))
-        c3.metric("Fases em andamento", int(r["fases_em_andamento"]))
-        c4.metric("Recebimentos vencidos", int(r["recebimentos_vencidos_qtd"]))
-        c5.metric("A receber (total)", brl(r["recebimentos_pendentes_total"]))
-
-        c6, c7 = st.columns(2)
-        c6.metric("Pagar na sexta (total)", brl(r["pagar_na_sexta_total"]))
-        c7.metric("Extras pendentes (total)", brl(r["extras_pendentes_total"]))
-    else:
-        st.info("Sem dados ainda.")
+    @st.fragment(run_every=KPI_POLL_S)
+    def hoje_painel():
+        # KPIs: resumo pré-calculado (sql/001), 1 linha pela PK; recalcula só se sujo/velho.
+        # A cada KPI_POLL_S só compara versões das tabelas em memória (avisos do banco,
+        # sql/002): o banco só é lido quando algo mudou ou o resumo envelheceu.
+        versoes = table_versions(KPI_TABELAS)
+        memo = st.session_state.get("hoje_kpis_memo")
+        if memo and memo["versoes"] == versoes and time.monotonic() - memo["em"] < KPI_IDADE_MAX_S:
+            r, idade_s = memo["r"], (None if memo["idade_s"] is None else memo["idade_s"] + time.monotonic() - memo["em"])
+        else:
+            r, idade_s = hoje_kpis()
+            st.session_state["hoje_kpis_memo"] = {"versoes": versoes, "em": time.monotonic(), "r": r, "idade_s": idade_s}
+
+        if r is not None:
+            c1, c2, c3, c4, c5 = st.columns(5)
+            c1.metric("Hoje", str(r["hoje"]))
+            c2.metric("Sexta-alvo", str(r["sexta"]))
+            c3.metric("Fases em andamento", int(r["fases_em_andamento"]))
+            c4.metric("Recebimentos vencidos", int(r["recebimentos_vencidos_qtd"]))
+            c5.metric("A receber (total)", brl(r["recebimentos_pendentes_total"]))
+
+            c6, c7 = st.columns(2)
+            c6.metric("Pagar na sexta (total)", brl(r["pagar_na_sexta_total"]))
+            c7.metric("Extras pendentes (total)", brl(r["extras_pendentes_total"]))
+            if idade_s is not None:
+                st.caption("Atualizado agora" if idade_s < 60 else f"Atualizado há {int(idade_s // 60)} min")
+        else:
+            st.info("Sem dados ainda.")
+
+    hoje_painel()
 
     st.divider()
     st.markdown("### Ações rápidas")
@@ -1876,21 +2770,38 @@ if menu == "HOJE":
 # APONTAMENTOS (estável + trava se pago)
 # ======================================================
 if menu == "APONTAMENTOS":
+    secao("APONTAMENTOS")
     st.subheader("📝 Apontamentos")
     st.caption("Regra: 1 apontamento por pessoa, por dia, por obra. Se errou, edite (se não estiver pago).")
 
     if "edit_ap" not in st.session_state:
         st.session_state["edit_ap"] = None
 
-    df_pessoas = safe_df("select id,nome from public.pessoas where ativo=true order by nome;")
-    df_obras = safe_df("select id,titulo from public.obras where ativo=true order by titulo;")
+    # trava "pago": coluna mantida por trigger (sql/003); sem a migração, exists por linha
+    ap_pago = "a.pago"
+    if safe_df("""
+        select 1 from information_schema.columns
+        where table_schema='public' and table_name='apontamentos' and column_name='pago';
+    """, ttl=CATALOGO_TTL).empty:
+        st.warning("Migração sql/003 não aplicada (python tools/migrate.py): a trava de pago é calculada linha a linha, mais devagar.")
+        ap_pago = """exists (
+              select 1
+              from public.pagamento_itens pi
+              join public.pagamentos pg on pg.id=pi.pagamento_id
+              where pi.apontamento_id=a.id and pg.status='PAGO'
+            )"""
+
+    df_pessoas = safe_df("select id,nome from public.pessoas where ativo=true order by nome;", ttl=CATALOGO_TTL)
+    df_obras = safe_df("select id,titulo from public.obras where ativo=true order by titulo;", ttl=CATALOGO_TTL)
 
     if df_pessoas.empty or df_obras.empty:
         st.warning("Cadastre profissionais e obras primeiro.")
         st.stop()
 
-    pessoa_ids = df_pessoas["id"].tolist()
-    obra_ids = df_obras["id"].tolist()
+    lbl_pessoas = option_labels(df_pessoas, "nome")
+    lbl_obras = option_labels(df_obras, "titulo")
+    pessoa_ids = list(lbl_pessoas)
+    obra_ids = list(lbl_obras)
 
     edit_id = st.session_state["edit_ap"]
 
@@ -1902,13 +2813,13 @@ if menu == "APONTAMENTOS":
                 obra_id = st.selectbox(
                     "Obra",
                     obra_ids,
-                    format_func=lambda x: df_obras.loc[df_obras["id"] == x, "titulo"].iloc[0],
+                    format_func=fmt_option(lbl_obras),
                 )
             with c2:
                 pessoa_id = st.selectbox(
                     "Profissional",
                     pessoa_ids,
-                    format_func=lambda x: df_pessoas.loc[df_pessoas["id"] == x, "nome"].iloc[0],
+                    format_func=fmt_option(lbl_pessoas),
                 )
             with c3:
                 data_ap = st.date_input("Data", value=date.today())
@@ -1926,22 +2837,22 @@ if menu == "APONTAMENTOS":
             salvar = st.form_submit_button("Salvar apontamento", type="primary", use_container_width=True)
             if salvar:
                 try:
-                    df_orc_ap = safe_df(
-                        "select id from public.orcamentos where obra_id=%s and status='APROVADO' limit 1;",
-                        (int(obra_id),)
-                    )                    
-                    if df_orc_ap.empty:
-                        st.warning("Esta obra ainda não tem ORÇAMENTO APROVADO. Aprove um orçamento primeiro (Obras → Orçamentos).")
-                        st.stop()
-                    orcamento_id = int(df_orc_ap.iloc[0]["id"])
-                    exec_sql(
+                    # orçamento APROVADO resolvido no próprio insert (sem consulta separada)
+                    ins = exec_sql(
                         """
                         insert into public.apontamentos
                         (obra_id,orcamento_id,pessoa_id,data,tipo_dia,valor_base,desconto_valor,observacao)
-                        values (%s,%s,%s,%s,%s,%s,%s,%s);
+                        select %s, o.id, %s,%s,%s,%s,%s,%s
+                        from public.orcamentos o
+                        where o.obra_id=%s and o.status='APROVADO'
+                        limit 1
+                        returning id;
                         """,
-                        (int(obra_id), int(orcamento_id), int(pessoa_id), data_ap, tipo_dia, float(valor_base), float(desconto), obs.strip() or None),
+                        (int(obra_id), int(pessoa_id), data_ap, tipo_dia, float(valor_base), float(desconto), obs.strip() or None, int(obra_id)),
                     )
+                    if not ins:
+                        st.warning("Esta obra ainda não tem ORÇAMENTO APROVADO. Aprove um orçamento primeiro (Obras → Orçamentos).")
+                        st.stop()
                     st.success("Apontamento salvo.")
                     st.rerun()
                 except psycopg2.errors.UniqueViolation:
@@ -1950,25 +2861,16 @@ if menu == "APONTAMENTOS":
 
     # ---------- EDITAR ----------
     else:
-        df_one = safe_df("select * from public.apontamentos where id=%s;", (int(edit_id),))
-        if df_one.empty:
+        r = safe_one("select * from public.apontamentos where id=%s;", (int(edit_id),))
+        if r is None:
             st.session_state["edit_ap"] = None
             st.rerun()
-        r = df_one.iloc[0]
 
-        # trava se apontamento estiver ligado a pagamento PAGO
-        lock = safe_df(
-            """
-            select exists (
-              select 1
-              from public.pagamento_itens pi
-              join public.pagamentos p on p.id=pi.pagamento_id
-              where pi.apontamento_id=%s and p.status='PAGO'
-            ) as travado;
-            """,
-            (int(edit_id),),
-        )
-        travado = bool(lock.iloc[0]["travado"])
+        # trava se apontamento estiver ligado a pagamento PAGO (coluna mantida por trigger, sql/003)
+        if "pago" in r.keys():
+            travado = bool(r["pago"])
+        else:
+            travado = bool(safe_scalar(f"select {ap_pago} from public.apontamentos a where a.id=%s;", (int(edit_id),)))
 
         if travado:
             st.warning("🔒 Este apontamento está ligado a pagamento PAGO. Não é possível editar/excluir.")
@@ -1983,7 +2885,7 @@ if menu == "APONTAMENTOS":
                         "Obra",
                         obra_ids,
                         index=obra_ids.index(int(r["obra_id"])) if int(r["obra_id"]) in obra_ids else 0,
-                        format_func=lambda x: df_obras.loc[df_obras["id"] == x, "titulo"].iloc[0],
+                        format_func=fmt_option(lbl_obras),
                         key="ap_obra_edit",
                     )
                 with c2:
@@ -1991,7 +2893,7 @@ if menu == "APONTAMENTOS":
                         "Profissional",
                         pessoa_ids,
                         index=pessoa_ids.index(int(r["pessoa_id"])) if int(r["pessoa_id"]) in pessoa_ids else 0,
-                        format_func=lambda x: df_pessoas.loc[df_pessoas["id"] == x, "nome"].iloc[0],
+                        format_func=fmt_option(lbl_pessoas),
                         key="ap_pessoa_edit",
                     )
                 with c3:
@@ -2044,56 +2946,220 @@ if menu == "APONTAMENTOS":
 
                 if excluir:
                     # remove itens e aponta (pagamento será recalculado ao gerar semana novamente)
-                    exec_sql("delete from public.pagamento_itens where apontamento_id=%s;", (int(edit_id),))
-                    exec_sql("delete from public.apontamentos where id=%s;", (int(edit_id),))
+                    with transaction() as tx:
+                        tx.exec("delete from public.pagamento_itens where apontamento_id=%s;", (int(edit_id),))
+                        tx.exec("delete from public.apontamentos where id=%s;", (int(edit_id),))
                     st.success("Apontamento excluído.")
                     st.session_state["edit_ap"] = None
                     st.rerun()
 
+    # ---------- SEMANA (grade pessoa × dia) ----------
     st.divider()
-    st.markdown("### Apontamentos recentes")
-    df_recent = safe_df(
-        """
-        select a.id, a.data, p.nome as profissional, o.titulo as obra,
-               a.tipo_dia, a.valor_final,
-               exists (
-                 select 1
-                 from public.pagamento_itens pi
-                 join public.pagamentos pg on pg.id=pi.pagamento_id
-                 where pi.apontamento_id=a.id and pg.status='PAGO'
-               ) as travado_pago
+    st.markdown("### 🗓️ Semana da equipe (grade)")
+    st.caption(
+        "Uma linha por profissional, uma coluna por dia: digite o valor base do dia e salve tudo de uma vez. "
+        "Célula vazia = sem apontamento (para excluir um existente, use EDITAR)."
+    )
+
+    resultado_sem = st.session_state.pop("ap_sem_resultado", None)
+    if resultado_sem:
+        st.success(resultado_sem["resumo"])
+        if resultado_sem["avisos"]:
+            st.warning("Algumas células não foram gravadas:")
+            st.dataframe(pd.DataFrame(resultado_sem["avisos"]), hide_index=True, use_container_width=True)
+
+    g1, g2 = st.columns([6, 3])
+    with g1:
+        obra_sem = int(st.selectbox("Obra", obra_ids, format_func=fmt_option(lbl_obras), key="ap_sem_obra"))
+    with g2:
+        seg_sem = monday(st.date_input("Semana (qualquer dia dela)", value=date.today(), key="ap_sem_data"))
+    dias = [seg_sem + timedelta(days=i) for i in range(6)]  # segunda a sábado
+    rotulos = {d: f"{DIAS_SEMANA[d.weekday()]} {d:%d/%m}" for d in dias}
+
+    # orçamento APROVADO resolvido uma vez para a grade toda
+    orc_sem = to_int(safe_scalar(
+        "select id from public.orcamentos where obra_id=%s and status='APROVADO' limit 1;", (obra_sem,)
+    ))
+
+    df_sem = safe_df(
+        f"""
+        select a.id, a.pessoa_id, a.data, a.valor_base, {ap_pago} as travado
         from public.apontamentos a
-        join public.pessoas p on p.id=a.pessoa_id
-        join public.obras o on o.id=a.obra_id
-        order by a.data desc, a.id desc
-        limit 80;
-        """
+        where a.obra_id=%s and a.data between %s and %s;
+        """,
+        (obra_sem, dias[0], dias[-1]),
     )
+    existentes = {(int(r["pessoa_id"]), r["data"]): r for r in df_sem.to_dict("records")}
+
+    grade = pd.DataFrame(
+        {
+            rotulos[d]: [
+                float(existentes[(p, d)]["valor_base"]) if (p, d) in existentes else None
+                for p in pessoa_ids
+            ]
+            for d in dias
+        },
+        index=pessoa_ids,
+    )
+    grade.insert(0, "Profissional", [lbl_pessoas[p] for p in pessoa_ids])
+
+    if orc_sem is None:
+        st.warning("Esta obra ainda não tem ORÇAMENTO APROVADO. Aprove um orçamento primeiro (Obras → Orçamentos).")
+    n_travados = sum(1 for r in existentes.values() if r["travado"])
+    if n_travados:
+        st.caption(f"🔒 {n_travados} apontamento(s) desta semana já pago(s): alterações neles são ignoradas.")
+
+    with st.form("form_ap_semana", clear_on_submit=False), perf("grade semana"):
+        editada = st.data_editor(
+            grade,
+            key=f"ap_sem_grid_{obra_sem}_{seg_sem}",
+            hide_index=True,
+            use_container_width=True,
+            disabled=["Profissional"],
+            column_config={
+                rotulos[d]: st.column_config.NumberColumn(rotulos[d], min_value=0.0, step=10.0, format="%.2f")
+                for d in dias
+            },
+        )
+        salvar_sem = st.form_submit_button(
+            "Salvar semana", type="primary", use_container_width=True, disabled=(orc_sem is None)
+        )
+
+    if salvar_sem:
+        novos, alterados, avisos = [], [], []
+        for p in pessoa_ids:
+            for d in dias:
+                v = editada.at[p, rotulos[d]]
+                v = None if pd.isna(v) else float(v)
+                atual = existentes.get((p, d))
+                if atual is None:
+                    if v is not None:
+                        novos.append((p, d, v))
+                elif v is None:
+                    avisos.append({"Profissional": lbl_pessoas[p], "Dia": rotulos[d], "Motivo": "não excluído (use EDITAR)"})
+                elif v != float(atual["valor_base"]):
+                    if atual["travado"]:
+                        avisos.append({"Profissional": lbl_pessoas[p], "Dia": rotulos[d], "Motivo": "🔒 já pago"})
+                    else:
+                        alterados.append((int(atual["id"]), v))
+
+        if not novos and not alterados:
+            st.info("Nada mudou na grade.")
+            st.stop()
+
+        try:
+            # tudo num comando só: insere novos (conflito → ignorado e reportado), atualiza alterados
+            linhas = exec_sql(
+                """
+                with ins as (
+                  insert into public.apontamentos
+                    (obra_id, orcamento_id, pessoa_id, data, tipo_dia, valor_base, desconto_valor)
+                  select %s, %s, n.pessoa_id, n.data,
+                         case extract(isodow from n.data) when 6 then 'SABADO' when 7 then 'DOMINGO' else 'NORMAL' end,
+                         n.valor_base, 0
+                  from unnest(%s::bigint[], %s::date[], %s::numeric[]) as n(pessoa_id, data, valor_base)
+                  on conflict do nothing
+                  returning pessoa_id, data
+                ),
+                upd as (
+                  update public.apontamentos a
+                  set valor_base = u.valor_base
+                  from unnest(%s::bigint[], %s::numeric[]) as u(id, valor_base)
+                  where a.id = u.id
+                  returning a.id
+                )
+                select 'I' as op, pessoa_id, data from ins
+                union all
+                select 'U', null, null from upd;
+                """,
+                (
+                    obra_sem, orc_sem,
+                    [n[0] for n in novos], [n[1] for n in novos], [n[2] for n in novos],
+                    [a[0] for a in alterados], [a[1] for a in alterados],
+                ),
+            )
+        except psycopg2.Error as e:
+            st.error("Falha ao gravar a semana (nada foi salvo).")
+            st.exception(e)
+            st.stop()
+
+        inseridos = {(int(r["pessoa_id"]), r["data"]) for r in linhas if r["op"] == "I"}
+        n_upd = sum(1 for r in linhas if r["op"] == "U")
+        for p, d, _ in novos:
+            if (p, d) not in inseridos:
+                avisos.append({"Profissional": lbl_pessoas[p], "Dia": rotulos[d],
+                               "Motivo": "conflito: já existe apontamento para essa pessoa nesse dia"})
+        st.session_state["ap_sem_resultado"] = {
+            "resumo": f"Semana gravada: {len(inseridos)} incluído(s), {n_upd} alterado(s).",
+            "avisos": avisos,
+        }
+        st.rerun()
+
+    st.divider()
+    st.markdown("### Apontamentos recentes")
+
+    @st.fragment
+    def apontamentos_recentes():
+        # paginar/selecionar/filtrar não reroda o form de apontamento
+        f1, f2, f3, f4 = st.columns([3, 3, 3, 2])
+        with f1:
+            ap_ini, ap_fim = filtro_periodo("Período", "lst_ap_periodo")
+        with f2:
+            ap_obra = st.selectbox("Obra", [None] + list(lbl_obras), format_func=fmt_option(lbl_obras, "Todas"),
+                                   key="lst_ap_obra")
+        with f3:
+            ap_pessoa = st.selectbox("Profissional", [None] + list(lbl_pessoas),
+                                     format_func=fmt_option(lbl_pessoas, "Todos"), key="lst_ap_pessoa")
+        with f4:
+            ap_tipo = st.selectbox("Tipo do dia", [None, "NORMAL", "FERIADO", "SABADO", "DOMINGO"],
+                                   format_func=lambda x: "Todos" if x is None else x, key="lst_ap_tipo")
+        where, params = filtros_where([
+            ("a.data >= %s", ap_ini), ("a.data <= %s", ap_fim), ("a.obra_id = %s", ap_obra),
+            ("a.pessoa_id = %s", ap_pessoa), ("a.tipo_dia = %s", ap_tipo),
+        ])
+        df_recent = keyset_page(
+            "lst_ap",
+            f"""
+            select a.id, a.data, p.nome as profissional, o.titulo as obra,
+                   a.tipo_dia, a.valor_final, {ap_pago} as travado_pago
+            from public.apontamentos a
+            join public.pessoas p on p.id=a.pessoa_id
+            join public.obras o on o.id=a.obra_id
+            """ + where,
+            ["data", "id"],
+            params=params,
+            desc=True,
+            soma="valor_final",
+        )
+
+        if df_recent.empty:
+            st.info("Nenhum apontamento encontrado." if params else "Nenhum apontamento ainda.")
+        else:
+            rr = grid_select(
+                "lst_ap", df_recent.assign(valor=df_recent["valor_final"].map(brl)),
+                ["data", "profissional", "obra", "tipo_dia", "valor", "travado_pago"],
+                {"data": "Data", "profissional": "Profissional", "obra": "Obra", "tipo_dia": "Tipo do dia",
+                 "valor": "Valor", "travado_pago": st.column_config.CheckboxColumn("🔒 Pago")},
+            )
+            if rr is not None:
+                colA, colB = st.columns([8, 2])
+                with colA:
+                    st.write(f"**{rr['data']}** • {rr['profissional']} • {rr['obra']} • {rr['tipo_dia']}")
+                    if rr["travado_pago"]:
+                        st.caption("🔒 pago — não pode ser editado")
+                with colB:
+                    if st.button("EDITAR ✏️", key="ap_edit_sel", disabled=bool(rr["travado_pago"]), use_container_width=True):
+                        st.session_state["edit_ap"] = int(rr["id"])
+                        st.rerun()
+
+    apontamentos_recentes()
 
-    if df_recent.empty:
-        st.info("Nenhum apontamento ainda.")
-    else:
-        for _, rr in df_recent.iterrows():
-            colA, colB, colC, colD, colE = st.columns([2, 4, 3, 2, 2])
-            with colA:
-                st.write(f"**{rr['data']}**")
-            with colB:
-                st.write(rr["profissional"])
-                if rr["travado_pago"]:
-                    st.caption("🔒 pago")
-            with colC:
-                st.write(rr["obra"])
-            with colD:
-                st.write(rr["tipo_dia"])
-            with colE:
-                if st.button("EDITAR ✏️", key=f"ap_edit_{int(rr['id'])}", disabled=bool(rr["travado_pago"]), use_container_width=True):
-                    st.session_state["edit_ap"] = int(rr["id"])
-                    st.rerun()
 
 # ======================================================
 # FINANCEIRO (gerar, pagar, estornar, histórico)
 # ======================================================
 if menu == "FINANCEIRO":
+    secao("FINANCEIRO")
     st.subheader("💰 Financeiro")
 
     # -------- Gerar pagamentos da semana --------
@@ -2109,83 +3175,277 @@ if menu == "FINANCEIRO":
     # -------- Pagar / Estornar --------
     st.markdown("## 2) Pagar / Estornar")
 
-    tab1, tab2 = st.tabs(["Pagar pendentes", "Histórico por profissional"])
+    # filtros de estorno/histórico: catálogos pequenos, em cache
+    df_prof = safe_df("select id,nome from public.pessoas order by nome;", ttl=CATALOGO_TTL)
+    lbl_todos = option_labels(df_prof, "nome")
+    df_tipos_pag = safe_df("select distinct tipo, status from public.pagamentos;", ttl=CATALOGO_TTL)
+    tipos_pag = sorted(set(df_tipos_pag["tipo"].dropna())) if not df_tipos_pag.empty else []
+    status_pag = sorted(set(df_tipos_pag["status"].dropna())) if not df_tipos_pag.empty else []
+
+    tab1, tab2, tab3 = st.tabs(["Pagar pendentes", "Histórico por profissional", "Recibos da semana"])
+
+    def pagar_lote(ids, data_pg):
+        # lote inteiro numa transação e numa ida ao banco; devolve o status final de cada um
+        with transaction() as tx:
+            tx.exec(
+                "select public.fn_marcar_pagamento_pago(u.id, %s, %s) from unnest(%s::bigint[]) as u(id);",
+                (st.session_state["usuario"], data_pg, ids),
+            )
+            tx.exec(
+                """
+                select p.id, pe.nome as pessoa, p.tipo, p.status, p.valor_total, p.pago_em
+                from public.pagamentos p
+                join public.pessoas pe on pe.id=p.pessoa_id
+                where p.id = any(%s)
+                order by pe.nome, p.id;
+                """,
+                (ids,),
+            )
+        return tx.rows
+
+    def lista_pagar(key, df, titulo_col, data_pg, rotulo):
+        # seleção múltipla + "pagar selecionados" (sem botão por linha)
+        # versão na chave: depois de pagar, a grade nasce sem seleção (os índices antigos
+        # apontariam para as linhas que subiram para essas posições)
+        versao = st.session_state.get(f"{key}_versao", 0)
+        sel = grid_multi(
+            f"{key}_v{versao}", df.assign(valor=df["valor_total"].map(brl)), ["pessoa_nome", titulo_col, "valor"],
+            {"pessoa_nome": "Profissional", titulo_col: "Tipo" if titulo_col == "tipo" else "Data extra", "valor": "Valor"},
+        )
+        st.caption(f"Selecionados: {len(sel)} • Total: {brl(sel['valor_total'].sum() if not sel.empty else 0)}")
+        if st.button(f"{rotulo} ({len(sel)})", key=f"{key}_pagar", type="primary",
+                     use_container_width=True, disabled=sel.empty):
+            try:
+                st.session_state["fin_pag_resultado"] = pagar_lote([int(x) for x in sel["id"].tolist()], data_pg)
+            except psycopg2.Error as e:
+                st.error("Falha ao pagar o lote (nenhum pagamento foi marcado).")
+                st.exception(e)
+                return
+            st.session_state[f"{key}_versao"] = versao + 1
+            st.session_state.pop(f"{key}_v{versao}", None)
+            st.rerun(scope="fragment")
+
+    @st.fragment
+    def fin_pagar_pendentes():
+        secao("FINANCEIRO/Pagar pendentes")
+        # pagar/estornar reroda só este bloco (listas + totais), não a página
+        df_sexta = safe_df("select * from public.pagamentos_para_sexta;")
+        df_extras = safe_df("select * from public.pagamentos_extras_pendentes;")
+
+        k1, k2, k3, k4 = st.columns(4)
+        k1.metric("Pendentes p/ sexta", len(df_sexta))
+        k2.metric("Total sexta", brl(df_sexta["valor_total"].sum() if not df_sexta.empty else 0))
+        k3.metric("Extras pendentes", len(df_extras))
+        k4.metric("Total extras", brl(df_extras["valor_total"].sum() if not df_extras.empty else 0))
+
+        resultado = st.session_state.pop("fin_pag_resultado", None)
+        if resultado:
+            df_res = pd.DataFrame(resultado)
+            pagos = int((df_res["status"] == "PAGO").sum())
+            st.success(f"Lote processado: {pagos} de {len(df_res)} pagamento(s) PAGO.")
+            st.dataframe(
+                df_res.assign(valor=df_res["valor_total"].map(brl)),
+                column_order=["id", "pessoa", "tipo", "valor", "status", "pago_em"],
+                column_config={"id": "#", "pessoa": "Profissional", "tipo": "Tipo", "valor": "Valor",
+                               "status": "Status", "pago_em": "Pago em"},
+                hide_index=True, use_container_width=True,
+            )
 
-    with tab1:
         st.markdown("### Pendentes para sexta")
-        df_sexta = safe_df("select * from public.pagamentos_para_sexta;")
         if df_sexta.empty:
             st.info("Nada para pagar na próxima sexta.")
         else:
             data_pg = st.date_input("Data do pagamento", value=date.today(), key="data_pg_fin")
-            for _, r in df_sexta.iterrows():
-                c1, c2, c3 = st.columns([6, 2, 2])
-                with c1:
-                    st.write(f"**{r['pessoa_nome']}** • {r['tipo']}")
-                with c2:
-                    st.write(brl(r["valor_total"]))
-                with c3:
-                    if st.button("Pagar", key=f"pay_{int(r['id'])}", type="primary", use_container_width=True):
-                        exec_sql("select public.fn_marcar_pagamento_pago(%s,%s,%s);", (int(r["id"]), st.session_state["usuario"], data_pg))
-                        st.success("Pago!")
-                        st.rerun()
+            lista_pagar("fin_sexta", df_sexta, "tipo", data_pg, "Pagar selecionados")
 
         st.divider()
         st.markdown("### Extras pendentes (sábado/domingo)")
-        df_extras = safe_df("select * from public.pagamentos_extras_pendentes;")
         if df_extras.empty:
             st.info("Sem extras pendentes.")
         else:
             data_pg2 = st.date_input("Data do pagamento (extras)", value=date.today(), key="data_pg_extras")
-            for _, r in df_extras.iterrows():
-                c1, c2, c3 = st.columns([6, 2, 2])
-                with c1:
-                    st.write(f"**{r['pessoa_nome']}** • EXTRA ({r.get('data_extra')})")
-                with c2:
-                    st.write(brl(r["valor_total"]))
-                with c3:
-                    if st.button("Pagar extra", key=f"pay_extra_{int(r['id'])}", type="primary", use_container_width=True):
-                        exec_sql("select public.fn_marcar_pagamento_pago(%s,%s,%s);", (int(r["id"]), st.session_state["usuario"], data_pg2))
-                        st.success("Extra pago!")
-                        st.rerun()
+            lista_pagar("fin_extras", df_extras, "data_extra", data_pg2, "Pagar extras selecionados")
 
         st.divider()
         st.markdown("### Estornar pagamento (se houve confusão)")
-        df_pagos = safe_df("""
+        e1, e2 = st.columns(2)
+        with e1:
+            est_ini, est_fim = filtro_periodo("Pago entre", "est_periodo")
+        with e2:
+            est_pessoa = st.selectbox("Profissional", [None] + list(lbl_todos), key="est_pessoa",
+                                      format_func=fmt_option(lbl_todos, "Todos"))
+        where, params = filtros_where([
+            ("p.pago_em >= %s", est_ini), ("p.pago_em <= %s", est_fim), ("p.pessoa_id = %s", est_pessoa),
+        ], prefixo=" and ")
+        df_pagos = keyset_page(
+            "est_pagos",
+            """
             select p.id, pe.nome as pessoa, p.tipo, p.valor_total, p.pago_em
             from public.pagamentos p
             join public.pessoas pe on pe.id=p.pessoa_id
             where p.status='PAGO'
-            order by p.pago_em desc, p.id desc
-            limit 200;
-        """)
+            """ + where,
+            ["pago_em", "id"],
+            params=params,
+            desc=True,
+            page_size=100,
+        )
         if df_pagos.empty:
             st.info("Nenhum pagamento PAGO para estornar.")
         else:
-            opcoes = df_pagos["id"].tolist()
+            lbl_pagos = option_labels(
+                df_pagos, lambda r: f"#{r['id']} • {r['pessoa']} • {r['tipo']} • {brl(r['valor_total'])} • {r['pago_em']}"
+            )
             pid = st.selectbox(
                 "Selecione um pagamento PAGO",
-                opcoes,
-                format_func=lambda x: f"#{x} • {df_pagos.loc[df_pagos['id']==x,'pessoa'].iloc[0]} • {df_pagos.loc[df_pagos['id']==x,'tipo'].iloc[0]} • {brl(df_pagos.loc[df_pagos['id']==x,'valor_total'].iloc[0])} • {df_pagos.loc[df_pagos['id']==x,'pago_em'].iloc[0]}",
+                list(lbl_pagos),
+                format_func=fmt_option(lbl_pagos),
             )
             motivo = st.text_input("Motivo do estorno (opcional)")
             if st.button("Estornar", use_container_width=True):
                 exec_sql("select public.fn_estornar_pagamento(%s,%s,%s);", (int(pid), st.session_state["usuario"], motivo or None))
                 st.success("Pagamento estornado (voltou para ABERTO).")
-                st.rerun()
+                st.rerun(scope="fragment")
+
+    with tab1:
+        fin_pagar_pendentes()
 
     with tab2:
+        secao("FINANCEIRO/Histórico")
         st.markdown("### Histórico por profissional (muito útil 60+)")
-        df_prof = safe_df("select id,nome from public.pessoas order by nome;")
         if df_prof.empty:
             st.info("Cadastre profissionais primeiro.")
         else:
-            prof_id = st.selectbox("Profissional", df_prof["id"].tolist(), format_func=lambda x: df_prof.loc[df_prof["id"]==x,"nome"].iloc[0])
-            df_hist = safe_df("""
-                select p.id, p.tipo, p.status, p.valor_total, p.referencia_inicio, p.referencia_fim, p.pago_em
+            lbl_prof = lbl_todos
+            h1, h2, h3, h4 = st.columns([3, 3, 2, 2])
+            with h1:
+                prof_id = st.selectbox("Profissional", list(lbl_prof), format_func=fmt_option(lbl_prof))
+            with h2:
+                hist_ini, hist_fim = filtro_periodo("Período", "hist_periodo")
+            with h3:
+                hist_status = st.selectbox("Status", [None] + status_pag, key="hist_status",
+                                           format_func=lambda x: "Todos" if x is None else x)
+            with h4:
+                hist_tipo = st.selectbox("Tipo", [None] + tipos_pag, key="hist_tipo",
+                                         format_func=lambda x: "Todos" if x is None else x)
+            # data de referência do pagamento (pago_em, senão o fim/início do período) → cursor (ref_data, id)
+            ref = "coalesce(p.pago_em, p.referencia_fim, p.referencia_inicio)"
+            where, params = filtros_where([
+                (f"{ref} >= %s", hist_ini), (f"{ref} <= %s", hist_fim),
+                ("p.status = %s", hist_status), ("p.tipo = %s", hist_tipo),
+            ], prefixo=" and ")
+            df_hist = keyset_page(
+                "fin_hist",
+                f"""
+                select p.id, p.tipo, p.status, p.valor_total, p.referencia_inicio, p.referencia_fim, p.pago_em,
+                       {ref} as ref_data
                 from public.pagamentos p
-                where p.pessoa_id=%s
-                order by coalesce(p.pago_em, p.referencia_fim, p.referencia_inicio) desc, p.id desc
-                limit 200;
-            """, (int(prof_id),))
-            st.dataframe(df_hist, use_container_width=True, hide_index=True)
+                where p.pessoa_id = %s
+                """ + where,
+                ["ref_data", "id"],
+                params=(int(prof_id),) + params,
+                desc=True,
+                soma="valor_total",
+            )
+            st.dataframe(df_hist, use_container_width=True, hide_index=True,
+                         column_order=["id", "tipo", "status", "valor_total", "referencia_inicio",
+                                       "referencia_fim", "pago_em"])
+
+    with tab3:
+        secao("FINANCEIRO/Recibos")
+        st.markdown("### Recibos da semana (para imprimir)")
+        seg_rec = monday(st.date_input("Semana do pagamento", value=date.today(), key="rec_semana"))
+        st.caption(f"Pagamentos PAGOS de {seg_rec:%d/%m} a {seg_rec + timedelta(days=6):%d/%m}: um recibo por pagamento.")
+        if st.button("Gerar recibos", type="primary", use_container_width=True, key="rec_gerar"):
+            recibos = recibos_semana(seg_rec)
+            if not recibos:
+                st.session_state["rec_pdf"] = None
+                st.info("Nenhum pagamento PAGO nessa semana.")
+            else:
+                with st.spinner(f"Gerando {len(recibos)} recibo(s)..."):
+                    st.session_state["rec_pdf"] = (seg_rec, len(recibos), pdf_recibos(recibos))
+        pronto = st.session_state.get("rec_pdf")
+        if pronto and pronto[0] == seg_rec:
+            st.download_button(
+                f"⬇️ Baixar recibos ({pronto[1]})",
+                data=pronto[2],
+                file_name=f"SEPOL_Recibos_{seg_rec:%Y%m%d}.pdf",
+                mime="application/pdf",
+                use_container_width=True,
+                key="rec_dl",
+            )
+
+# ======================================================
+# ADMIN: SQL desta execução
+# ======================================================
+if is_admin():
+    with st.sidebar:
+        with st.expander("⏱️ SQL desta execução"):
+            tot = sql_totals()
+            st.caption(
+                f"Comandos: {tot['comandos']} • Tempo: {tot['ms']:.0f} ms • Linhas: {tot['linhas']}  \n"
+                f"Bytes (aprox.): {tot['bytes']:,} • Lentos (≥ {SLOW_QUERY_MS:.0f} ms): {tot['lentos']} • "
+                f"Cache: {tot['cache_hits']} acerto(s)"
+            )
+            if _SQL_RUN["stmts"]:
+                st.dataframe(
+                    pd.DataFrame(_SQL_RUN["stmts"]).sort_values("ms", ascending=False),
+                    column_order=["secao", "ms", "linhas", "bytes", "sql"],
+                    hide_index=True,
+                    use_container_width=True,
+                )
+
+# ======================================================
+# PERFIL: cascata desta execução
+# (execuções encerradas por st.stop()/st.rerun() não chegam aqui)
+# ======================================================
+if _PERF["ativo"]:
+    perf_lap(None)
+    sql_por_secao = {}
+    for x in _SQL_RUN["stmts"]:
+        agg = sql_por_secao.setdefault(x["secao"], {"comandos": 0, "sql_ms": 0.0})
+        agg["comandos"] += 1
+        agg["sql_ms"] += x["ms"]
+    marcas = [
+        {**m, "trecho": ("· " * m["nivel"]) + m["nome"],
+         "sql_ms": round(sql_por_secao.get(m["nome"], {}).get("sql_ms", 0.0), 2) if m["nivel"] == 0 else None}
+        for m in sorted(_PERF["marcas"], key=lambda m: (m["ini_ms"], m["nivel"]))
+    ]
+    relatorio = {
+        "em": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "menu": st.session_state.get("menu"),
+        "total_ms": round(_perf_ms(), 2),
+        "marcas": marcas,
+        "sql": sql_totals(),
+        "sql_por_secao": sql_por_secao,
+    }
+    with st.expander(f"⏱️ Perfil desta execução — {relatorio['total_ms']:.0f} ms", expanded=False):
+        if marcas:
+            st.vega_lite_chart(
+                pd.DataFrame(marcas),
+                {
+                    "mark": {"type": "bar", "tooltip": True},
+                    "encoding": {
+                        "y": {"field": "trecho", "type": "nominal", "sort": None, "title": None},
+                        "x": {"field": "ini_ms", "type": "quantitative", "title": "ms desde o início"},
+                        "x2": {"field": "fim_ms"},
+                        "color": {"field": "nivel", "type": "ordinal", "legend": None},
+                    },
+                },
+                use_container_width=True,
+            )
+        st.download_button(
+            "Baixar JSON",
+            data=json.dumps(relatorio, ensure_ascii=False, indent=2, default=str).encode("utf-8"),
+            file_name=f"perfil_{time.strftime('%Y%m%d_%H%M%S')}.json",
+            mime="application/json",
+            key="perf_json",
+        )
+    pasta = _cfg("PROFILE_DIR", "")
+    if pasta:
+        try:
+            os.makedirs(pasta, exist_ok=True)
+            with open(os.path.join(pasta, f"perfil_{time.time_ns()}.json"), "w", encoding="utf-8") as f:
+                json.dump(relatorio, f, ensure_ascii=False, default=str)
+        except OSError as e:
+            _slow_log.warning("perfil não gravado em %s: %s", pasta, e)
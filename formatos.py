@@ -0,0 +1,8 @@
+"""Formatação de valores para tela e PDF (leve: sem reportlab/pandas)."""
+
+
+def brl(v):
+    try:
+        return f"R$ {float(v):,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+    except Exception:
+        return "R$ 0,00"
@@ -0,0 +1,38 @@
+"""Linhas compactas para consultas pequenas (sem DataFrame).
+
+Cada conjunto de colunas vira uma tupla nomeada com __slots__ vazio: r.nome, r["nome"],
+r[0] e r.get("nome") funcionam, como nas linhas do RealDictCursor/DataFrame.
+"""
+from collections import namedtuple
+
+_TIPOS = {}
+
+
+def tipo_linha(colunas):
+    colunas = tuple(colunas)
+    tipo = _TIPOS.get(colunas)
+    if tipo is None:
+        # rename=True: nomes que não são identificadores (ex.: "exists") viram _0, _1...;
+        # o acesso por nome usa _idx com o nome original
+        base = namedtuple("Linha", colunas, rename=True)
+        idx = {c: i for i, c in enumerate(colunas)}
+
+        def __getitem__(self, k):
+            return tuple.__getitem__(self, idx[k] if isinstance(k, str) else k)
+
+        def get(self, k, default=None):
+            i = idx.get(k)
+            return default if i is None else tuple.__getitem__(self, i)
+
+        tipo = type("Linha", (base,), {
+            "__slots__": (), "_idx": idx, "__getitem__": __getitem__, "get": get,
+            "keys": lambda self: idx.keys(),
+        })
+        _TIPOS[colunas] = tipo
+    return tipo
+
+
+def linhas_do_cursor(cur, rows):
+    # rows: tuplas de um cursor comum (não RealDictCursor)
+    tipo = tipo_linha(d[0] for d in cur.description)
+    return [tipo._make(r) for r in rows]
@@ -0,0 +1,226 @@
+"""Geração dos PDFs (sem Streamlit: importável pelos processos do lote)."""
+import os
+import sys
+from functools import lru_cache
+from io import BytesIO
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.utils import ImageReader
+from reportlab.pdfgen import canvas
+
+from formatos import brl
+
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "sepol_logo.png")
+
+
+@lru_cache(maxsize=1)
+def _logo_pdf():
+    # lido e decodificado uma vez por processo (None se não houver logo)
+    if not os.path.exists(LOGO_PATH):
+        return None
+    try:
+        logo = ImageReader(LOGO_PATH)
+        logo.getSize()  # força a leitura agora
+        return logo
+    except Exception:
+        return None
+
+
+def _vazio(v):
+    return v is None or v != v  # None ou NaN (linhas vindas de DataFrame)
+
+
+def desenhar_orcamento(destino, r, linhas):
+    """Desenha o orçamento em `destino` (arquivo/BytesIO) consumindo as linhas em ordem.
+
+    r: dict do cabeçalho. linhas: iterável de dicts (fase + serviço) ordenado por fase;
+    pode ser um cursor do banco: cada linha é desenhada e descartada (sem DataFrame/groupby).
+    """
+    c = canvas.Canvas(destino, pagesize=A4)
+    w, h = A4
+    
+    # --- LOGO (topo direito) ---
+    logo = _logo_pdf()
+    if logo is not None:
+        try:
+            logo_w = 110  # largura em pontos (ajuste fino)
+            logo_h = 40   # altura em pontos (ajuste fino)
+            x = w - 50 - logo_w
+            y = h - 50 - logo_h + 10
+            c.drawImage(logo, x, y, width=logo_w, height=logo_h, mask="auto")
+        except Exception:
+            pass
+    
+    y = h - 50
+    
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(50, y, f"SEPOL - Orçamento #{r['orcamento_id']}")    
+    y -= 16
+    
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(50, y, f"{r['titulo']}  - Status: {r['status']}")
+    y -= 16
+
+    c.setFont("Helvetica", 10)
+    c.drawString(50, y, f"Cliente: {r['cliente_nome']}  Tel: {r.get('cliente_tel') or ''}")
+    y -= 14
+    c.drawString(50, y, f"Obra: {r['obra_titulo']}")
+    y -= 14
+    c.drawString(50, y, f"Endereço: {r.get('endereco_obra') or ''}")
+    y -= 14
+    
+    y -= 24
+
+    # Fases na ordem das linhas: muda o fase_id → fecha a anterior e abre o cabeçalho da nova
+    fase_atual = None
+    for row in linhas:
+        if row["fase_id"] != fase_atual:
+            if fase_atual is not None:
+                y -= 14
+            fase_atual = row["fase_id"]
+            if y < 120:
+                c.showPage()
+                y = h - 50
+
+            c.setFont("Helvetica-Bold", 12)
+            # c.drawString(50, y, f"Fase {int(row['ordem'])} - {row['nome_fase']}  |  Total fase: {brl(row['valor_fase'])}")
+            c.drawString(50, y, f"Fase {int(row['ordem'])} - {row['nome_fase']}")
+            y -= 16
+
+            # Cabeçalho da tabela
+            c.setFont("Helvetica-Bold", 9)
+            c.drawString(50, y, "Serviço")
+            c.drawString(270, y, "Qtd")
+            c.drawString(310, y, "Un")
+            # c.drawString(340, y, "V.Unit")
+            # c.drawString(430, y, "Total")
+            y -= 12
+            c.setFont("Helvetica", 9)
+
+        serv = row.get("servico") or "-"
+        qtd = row.get("quantidade")
+        un = row.get("unidade") or ""
+        # vunit = row.get("valor_unit")
+        # vtot = row.get("valor_total")
+
+        if y < 90:
+            c.showPage()
+            y = h - 50
+            c.setFont("Helvetica", 9)
+
+        c.drawString(50, y, str(serv)[:40])
+        c.drawRightString(300, y, "" if _vazio(qtd) else f"{float(qtd):.2f}")
+        c.drawString(310, y, str(un))
+        # c.drawRightString(410, y, "" if _vazio(vunit) else brl(vunit))
+        # c.drawRightString(520, y, "" if _vazio(vtot) else brl(vtot))
+        y -= 12
+
+    if fase_atual is None:
+        c.setFont("Helvetica", 10)
+        c.drawString(50, y, "Sem fases/serviços cadastrados.")
+        c.showPage()
+        c.save()
+        return
+
+    y -= 14
+    y -= 14
+    c.setFont("Helvetica-Bold", 11)
+    c.drawString(50, y, f"VALOR BRUTO: {brl(r['valor_total'])}")
+    c.drawString(225, y, f"DESCONTO: {brl(r['desconto_valor'])}")
+    c.drawString(375, y, f"VALOR FINAL: {brl(r['valor_total_final'])}")
+    y -= 20
+
+    c.showPage()
+    c.save()
+
+
+def gerar_pdf_orcamento(df_head, df_itens) -> bytes:
+    buf = BytesIO()
+    desenhar_orcamento(buf, df_head.iloc[0].to_dict(), df_itens.to_dict("records"))
+    return buf.getvalue()
+
+
+def gerar_pdf_lote(trabalho):
+    # worker do ProcessPoolExecutor: (orc_id, cabeçalho, linhas dos itens) → (orc_id, bytes)
+    orc_id, head, itens = trabalho
+    buf = BytesIO()
+    desenhar_orcamento(buf, head, itens)
+    return orc_id, buf.getvalue()
+
+
+def modulos_do_app():
+    # roda no worker: módulos do app que não deviam ter vindo junto (app.py re-executado)
+    return [m for m in ("streamlit", "pandas") if m in sys.modules]
+
+
+def _desenhar_logo(c, w, h):
+    logo = _logo_pdf()
+    if logo is not None:
+        try:
+            c.drawImage(logo, w - 50 - 110, h - 50 - 40 + 10, width=110, height=40, mask="auto")
+        except Exception:
+            pass
+
+
+def desenhar_recibo(c, pag, itens):
+    """Um recibo (1+ páginas) no canvas `c`: pagamento + apontamentos que ele quitou."""
+    w, h = A4
+    _desenhar_logo(c, w, h)
+    y = h - 50
+
+    c.setFont("Helvetica-Bold", 14)
+    c.drawString(50, y, f"SEPOL - Recibo de pagamento #{pag['pagamento_id']}")
+    y -= 18
+    c.setFont("Helvetica", 10)
+    c.drawString(50, y, f"Profissional: {pag['pessoa_nome']}")
+    y -= 14
+    c.drawString(50, y, f"Tipo: {pag['tipo']}  •  Referência: {pag['referencia_inicio'] or ''} a {pag['referencia_fim'] or ''}")
+    y -= 14
+    c.drawString(50, y, f"Pago em: {pag['pago_em'] or ''}")
+    y -= 24
+
+    def cabecalho(y):
+        c.setFont("Helvetica-Bold", 9)
+        c.drawString(50, y, "Data")
+        c.drawString(110, y, "Obra")
+        c.drawString(330, y, "Tipo do dia")
+        c.drawRightString(540, y, "Valor")
+        c.setFont("Helvetica", 9)
+        return y - 12
+
+    y = cabecalho(y)
+    for it in itens:
+        if y < 140:
+            c.showPage()
+            y = cabecalho(h - 50)
+        c.drawString(50, y, str(it["data"]))
+        c.drawString(110, y, str(it["obra"] or "")[:40])
+        c.drawString(330, y, str(it["tipo_dia"] or ""))
+        c.drawRightString(540, y, brl(it["valor_final"]))
+        y -= 12
+    if not itens:
+        c.drawString(50, y, "(sem apontamentos vinculados)")
+        y -= 12
+
+    y -= 10
+    c.setFont("Helvetica-Bold", 11)
+    c.drawRightString(540, y, f"TOTAL: {brl(pag['valor_total'])}")
+    y -= 30
+
+    c.setFont("Helvetica", 10)
+    c.drawString(50, y, f"Recebi de SEPOL Pinturas a importância de {brl(pag['valor_total'])}, referente aos serviços acima.")
+    y -= 50
+    c.line(50, y, 300, y)
+    c.drawString(50, y - 12, str(pag["pessoa_nome"]))
+    c.showPage()
+
+
+def gerar_recibos_lote(trabalho):
+    # worker: (índice do pedaço, [(pagamento, itens), ...]) → (índice, PDF com todos em sequência)
+    indice, recibos = trabalho
+    buf = BytesIO()
+    c = canvas.Canvas(buf, pagesize=A4)
+    for pag, itens in recibos:
+        desenhar_recibo(c, pag, itens)
+    c.save()
+    return indice, buf.getvalue()
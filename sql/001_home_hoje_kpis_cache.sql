@@ -0,0 +1,77 @@
+-- KPIs do HOJE pré-calculados: a tela lê 1 linha pela PK em vez de agregar a view.
+-- Triggers marcam o resumo como "sujo" quando as tabelas de origem mudam; quem ler
+-- um resumo sujo (ou de outro dia, ou velho demais) recalcula a partir da view.
+
+create table if not exists public.home_hoje_kpis_cache (
+  id            smallint primary key default 1 check (id = 1),
+  dados         jsonb not null default '{}'::jsonb,
+  dia           date,
+  atualizado_em timestamptz not null default now(),
+  sujo          boolean not null default true
+);
+
+insert into public.home_hoje_kpis_cache (id) values (1) on conflict (id) do nothing;
+
+-- trigger por comando (não por linha): um lote de 500 apontamentos marca 1 vez só.
+-- "and not sujo" → se já está sujo, nenhuma linha é tocada (sem disputa de lock).
+create or replace function public.fn_home_hoje_kpis_sujar()
+returns trigger
+language plpgsql
+as $$
+begin
+  update public.home_hoje_kpis_cache set sujo = true where id = 1 and not sujo;
+  return null;
+end;
+$$;
+
+do $$
+declare
+  t text;
+begin
+  foreach t in array array['recebimentos', 'pagamentos', 'pagamento_itens', 'obra_fases', 'apontamentos'] loop
+    execute format('drop trigger if exists trg_home_hoje_kpis_sujar on public.%I', t);
+    execute format(
+      'create trigger trg_home_hoje_kpis_sujar
+         after insert or update or delete or truncate on public.%I
+         for each statement execute function public.fn_home_hoje_kpis_sujar()', t);
+  end loop;
+end;
+$$;
+
+-- recalcula (se precisar) e devolve o resumo. p_idade_max: idade aceitável mesmo sem
+-- mudanças (vencimentos dependem do relógio). Só uma sessão recalcula por vez; as
+-- outras recebem o resumo atual na hora em vez de esperar.
+create or replace function public.fn_home_hoje_kpis_refresh(p_idade_max interval default interval '5 minutes')
+returns table (dados jsonb, atualizado_em timestamptz, sujo boolean)
+language plpgsql
+as $$
+begin
+  if exists (
+       select 1 from public.home_hoje_kpis_cache k
+       where k.id = 1
+         and (k.sujo or k.dia is distinct from current_date or k.atualizado_em < now() - p_idade_max)
+     )
+     and pg_try_advisory_xact_lock(hashtext('home_hoje_kpis_cache'))
+  then
+    -- (substituída em 005: zerar aqui perde mudanças de comandos ainda não confirmados
+    -- quando o resumo já estava sujo — o trigger "and not sujo" não toca a linha)
+    update public.home_hoje_kpis_cache k
+    set sujo = false
+    where k.id = 1;
+
+    update public.home_hoje_kpis_cache k
+    set dados = coalesce((select to_jsonb(v) from public.home_hoje_kpis v limit 1), '{}'::jsonb),
+        dia = current_date,
+        atualizado_em = now()
+    where k.id = 1;
+  end if;
+
+  return query
+    select k.dados, k.atualizado_em, k.sujo
+    from public.home_hoje_kpis_cache k
+    where k.id = 1;
+end;
+$$;
+
+-- opcional (se o banco tiver pg_cron): mantém o resumo quente mesmo sem ninguém no HOJE
+-- select cron.schedule('home_hoje_kpis', '*/5 * * * *', $$select public.fn_home_hoje_kpis_refresh()$$);
@@ -0,0 +1,32 @@
+-- Avisa os processos do app (LISTEN sepol_mudancas) quando uma tabela muda.
+-- Payload = nome da tabela; o app descarta do cache só as consultas que leem dela.
+-- Por comando (não por linha), e o Postgres junta avisos iguais da mesma transação:
+-- um lote grande gera 1 aviso por tabela, entregue só no COMMIT (rollback não avisa).
+
+create or replace function public.fn_notificar_mudanca()
+returns trigger
+language plpgsql
+as $$
+begin
+  perform pg_notify('sepol_mudancas', tg_table_name);
+  return null;
+end;
+$$;
+
+do $$
+declare
+  t text;
+begin
+  foreach t in array array[
+    'pessoas', 'indicacoes', 'clientes', 'servicos', 'obras',
+    'orcamentos', 'obra_fases', 'orcamento_fase_servicos',
+    'apontamentos', 'pagamentos', 'pagamento_itens', 'recebimentos'
+  ] loop
+    execute format('drop trigger if exists trg_notificar_mudanca on public.%I', t);
+    execute format(
+      'create trigger trg_notificar_mudanca
+         after insert or update or delete or truncate on public.%I
+         for each statement execute function public.fn_notificar_mudanca()', t);
+  end loop;
+end;
+$$;
@@ -0,0 +1,85 @@
+-- Trava de "pago" guardada no próprio apontamento: listas e edição leem a coluna em vez
+-- de um exists(pagamento_itens ⨝ pagamentos) por linha.
+-- Mantida por triggers em pagamento_itens (entra/sai do pagamento) e pagamentos (muda o
+-- status): vale para fn_marcar_pagamento_pago, fn_estornar_pagamento e qualquer outro caminho.
+
+alter table public.apontamentos add column if not exists pago boolean not null default false;
+
+update public.apontamentos a
+set pago = true
+where not a.pago
+  and exists (
+    select 1
+    from public.pagamento_itens pi
+    join public.pagamentos p on p.id = pi.pagamento_id
+    where pi.apontamento_id = a.id and p.status = 'PAGO'
+  );
+
+-- lista "Apontamentos recentes": cursor (data, id) desc
+create index if not exists ix_apontamentos_data_id on public.apontamentos (data desc, id desc);
+
+-- recalcula só os apontamentos afetados pelo comando (tabelas de transição), 1 update por comando
+create or replace function public.fn_apontamentos_pago_sync()
+returns trigger
+language plpgsql
+as $$
+declare
+  ids bigint[];
+begin
+  if tg_table_name = 'pagamentos' then
+    select array_agg(distinct pi.apontamento_id) into ids
+    from novos n
+    join velhos v on v.id = n.id
+    join public.pagamento_itens pi on pi.pagamento_id = n.id
+    where n.status is distinct from v.status;
+  elsif tg_op = 'INSERT' then
+    select array_agg(distinct apontamento_id) into ids from novos;
+  elsif tg_op = 'DELETE' then
+    select array_agg(distinct apontamento_id) into ids from velhos;
+  else
+    select array_agg(distinct x.apontamento_id) into ids
+    from (select apontamento_id from novos union select apontamento_id from velhos) x;
+  end if;
+
+  if ids is not null then
+    update public.apontamentos a
+    set pago = t.pago
+    from (
+      select u.id, exists (
+               select 1
+               from public.pagamento_itens pi
+               join public.pagamentos p on p.id = pi.pagamento_id
+               where pi.apontamento_id = u.id and p.status = 'PAGO'
+             ) as pago
+      from unnest(ids) as u(id)
+    ) t
+    where a.id = t.id and a.pago is distinct from t.pago;
+  end if;
+  return null;
+end;
+$$;
+
+-- tabelas de transição exigem um trigger por evento
+drop trigger if exists trg_apontamentos_pago_ins on public.pagamento_itens;
+create trigger trg_apontamentos_pago_ins
+  after insert on public.pagamento_itens
+  referencing new table as novos
+  for each statement execute function public.fn_apontamentos_pago_sync();
+
+drop trigger if exists trg_apontamentos_pago_del on public.pagamento_itens;
+create trigger trg_apontamentos_pago_del
+  after delete on public.pagamento_itens
+  referencing old table as velhos
+  for each statement execute function public.fn_apontamentos_pago_sync();
+
+drop trigger if exists trg_apontamentos_pago_upd on public.pagamento_itens;
+create trigger trg_apontamentos_pago_upd
+  after update on public.pagamento_itens
+  referencing old table as velhos new table as novos
+  for each statement execute function public.fn_apontamentos_pago_sync();
+
+drop trigger if exists trg_apontamentos_pago_status on public.pagamentos;
+create trigger trg_apontamentos_pago_status
+  after update on public.pagamentos
+  referencing old table as velhos new table as novos
+  for each statement execute function public.fn_apontamentos_pago_sync();
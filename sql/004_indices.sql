@@ -0,0 +1,36 @@
+-- Índices exigidos pelos caminhos de acesso do app (um por formato de consulta).
+-- Conferir com: python tools/explain_check.py --dsn ... (acusa Seq Scan em tabela grande).
+-- Obs.: roda dentro da transação do migrate.py, então sem "concurrently"; numa base
+-- grande em produção, criar antes à mão com "create index concurrently" (mesmo nome).
+
+-- itens por fase (PDF, snapshot da obra, digest do PDF): join ofs.obra_fase_id = f.id [and orcamento_id]
+create index if not exists ix_ofs_fase_orcamento
+  on public.orcamento_fase_servicos (obra_fase_id, orcamento_id);
+
+-- fases de um orçamento na ordem (PDF, seção Fases) e todas as fases da obra (snapshot)
+create index if not exists ix_obra_fases_orcamento_ordem on public.obra_fases (orcamento_id, ordem, id);
+create index if not exists ix_obra_fases_obra on public.obra_fases (obra_id);
+
+-- orçamentos da obra / o APROVADO da obra (grade da semana)
+create index if not exists ix_orcamentos_obra_status on public.orcamentos (obra_id, status);
+
+-- recebimentos por orçamento e por fase (snapshot da obra)
+create index if not exists ix_recebimentos_orcamento on public.recebimentos (orcamento_id);
+create index if not exists ix_recebimentos_fase on public.recebimentos (obra_fase_id);
+
+-- apontamentos: grade da semana (obra + intervalo de datas); a lista (data, id) vem de sql/003
+create index if not exists ix_apontamentos_obra_data on public.apontamentos (obra_id, data);
+
+-- itens de pagamento nos dois sentidos (trava "pago" de sql/003, recibos da semana)
+create index if not exists ix_pagamento_itens_apontamento on public.pagamento_itens (apontamento_id);
+create index if not exists ix_pagamento_itens_pagamento on public.pagamento_itens (pagamento_id);
+
+-- histórico por profissional: cursor (ref_data, id) desc, ref_data = coalesce(...) como no app
+create index if not exists ix_pagamentos_pessoa_ref
+  on public.pagamentos (pessoa_id, (coalesce(pago_em, referencia_fim, referencia_inicio)) desc, id desc);
+
+-- estorno (PAGO por pago_em, id) e recibos da semana (PAGO num intervalo de pago_em)
+create index if not exists ix_pagamentos_status_pago_em on public.pagamentos (status, pago_em desc, id desc);
+
+analyze public.orcamento_fase_servicos, public.obra_fases, public.orcamentos, public.recebimentos,
+        public.apontamentos, public.pagamento_itens, public.pagamentos;
@@ -0,0 +1,55 @@
+-- Corrige a corrida do resumo do HOJE (sql/001): com "and not sujo", um comando que mudava
+-- as tabelas enquanto o resumo já estava sujo não tocava a linha; o recálculo zerava o
+-- "sujo", lia a view sem as linhas ainda não confirmadas desse comando e o resumo ficava
+-- velho, marcado como limpo.
+--
+-- Agora todo comando conta uma versão (e marca sujo). O recálculo guarda a versão que leu
+-- antes de agregar e só limpa o "sujo" se ela não mudou. A versão é gravada na transação de
+-- quem escreveu: o update final do recálculo espera essa transação terminar e compara com a
+-- versão confirmada — mudança durante o cálculo mantém o resumo sujo.
+-- Custo: comandos concorrentes nas tabelas de origem disputam a linha do resumo até o commit.
+
+alter table public.home_hoje_kpis_cache add column if not exists versao bigint not null default 0;
+
+create or replace function public.fn_home_hoje_kpis_sujar()
+returns trigger
+language plpgsql
+as $$
+begin
+  update public.home_hoje_kpis_cache set versao = versao + 1, sujo = true where id = 1;
+  return null;
+end;
+$$;
+
+create or replace function public.fn_home_hoje_kpis_refresh(p_idade_max interval default interval '5 minutes')
+returns table (dados jsonb, atualizado_em timestamptz, sujo boolean)
+language plpgsql
+as $$
+declare
+  v_lida  bigint;
+  v_dados jsonb;
+begin
+  select k.versao into v_lida
+  from public.home_hoje_kpis_cache k
+  where k.id = 1
+    and (k.sujo or k.dia is distinct from current_date or k.atualizado_em < now() - p_idade_max);
+
+  if found and pg_try_advisory_xact_lock(hashtext('home_hoje_kpis_cache')) then
+    v_dados := coalesce((select to_jsonb(v) from public.home_hoje_kpis v limit 1), '{}'::jsonb);
+
+    -- k.versao aqui é a confirmada (o update espera quem está escrevendo): se mudou desde
+    -- a leitura, o cálculo pode não ter visto essa mudança → continua sujo
+    update public.home_hoje_kpis_cache k
+    set dados = v_dados,
+        dia = current_date,
+        atualizado_em = now(),
+        sujo = (k.versao <> v_lida)
+    where k.id = 1;
+  end if;
+
+  return query
+    select k.dados, k.atualizado_em, k.sujo
+    from public.home_hoje_kpis_cache k
+    where k.id = 1;
+end;
+$$;
@@ -0,0 +1,146 @@
+"""Benchmark de ponta a ponta: roda cada menu do app sem navegador (AppTest do Streamlit).
+
+Uso:
+    python tools/seed.py --dsn postgresql://localhost/sepol_dev --limpar
+    python tools/bench.py --dsn postgresql://localhost/sepol_dev --execucoes 20 --json bench.json
+    python tools/bench.py --dsn ... --comparar bench.json      # falha se p95 piorar além da tolerância
+
+Para cada cenário (HOJE, cada seção de OBRAS, APONTAMENTOS, FINANCEIRO): 1 execução de
+aquecimento + N medidas. Reporta p50/p95 do tempo de execução do script, comandos SQL e
+acertos de cache (de session_state["_sql_run"]) e pico de memória Python (tracemalloc).
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+from streamlit.testing.v1 import AppTest
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+# nome → estado da sessão antes da execução (o app lê menu/seção daqui)
+CENARIOS = {
+    "HOJE": {"menu": "HOJE"},
+    "OBRAS/Orçamentos": {"menu": "OBRAS", "obra_secao": "Orçamentos"},
+    "OBRAS/Fases": {"menu": "OBRAS", "obra_secao": "Fases do Orçamento"},
+    "OBRAS/Serviços": {"menu": "OBRAS", "obra_secao": "Serviços"},
+    "OBRAS/Recebimentos": {"menu": "OBRAS", "obra_secao": "Recebimentos"},
+    "APONTAMENTOS": {"menu": "APONTAMENTOS"},
+    "FINANCEIRO": {"menu": "FINANCEIRO"},
+}
+
+
+def pct(xs, p):
+    xs = sorted(xs)
+    k = (len(xs) - 1) * p
+    i = int(k)
+    return xs[i] if i + 1 >= len(xs) else xs[i] + (xs[i + 1] - xs[i]) * (k - i)
+
+
+def nova_sessao(a, estado):
+    at = AppTest.from_file(APP, default_timeout=a.timeout)
+    at.secrets["DATABASE_URL"] = a.dsn
+    at.secrets["DB_SSLMODE"] = a.sslmode
+    at.session_state["usuario"] = a.usuario
+    for k, v in estado.items():
+        at.session_state[k] = v
+    if "menu" in estado:
+        at.session_state["menu_widget"] = estado["menu"]
+    if a.obra:
+        at.session_state["obra_sel"] = a.obra
+    return at
+
+
+def medir(a, nome, estado):
+    at = nova_sessao(a, estado)
+    at.run()  # aquecimento (imports, pool, cache de catálogo)
+    if at.exception:
+        raise RuntimeError(f"{nome}: {at.exception[0].value}")
+
+    tempos, comandos, sql_ms, acertos, picos = [], [], [], [], []
+    for _ in range(a.execucoes):
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        at.run()
+        tempos.append((time.perf_counter() - t0) * 1000)
+        picos.append(tracemalloc.get_traced_memory()[1] / 2**20)
+        tracemalloc.stop()
+        if at.exception:
+            raise RuntimeError(f"{nome}: {at.exception[0].value}")
+        run = at.session_state["_sql_run"]
+        comandos.append(len(run["stmts"]))
+        sql_ms.append(sum(x["ms"] for x in run["stmts"]))
+        acertos.append(run["cache_hits"])
+
+    return {
+        "cenario": nome,
+        "p50_ms": round(pct(tempos, 0.50), 1),
+        "p95_ms": round(pct(tempos, 0.95), 1),
+        "sql_ms_p50": round(statistics.median(sql_ms), 1),
+        "comandos": max(comandos),
+        "cache_hits": min(acertos),
+        "pico_mb": round(max(picos), 2),
+    }
+
+
+def comparar(atual, base, tolerancia):
+    # regressão = p95 acima de base*(1+tolerância) ou mais comandos SQL que antes
+    base = {r["cenario"]: r for r in base["resultados"]}
+    falhas = []
+    for r in atual:
+        b = base.get(r["cenario"])
+        if not b:
+            continue
+        if r["p95_ms"] > b["p95_ms"] * (1 + tolerancia):
+            falhas.append(f"{r['cenario']}: p95 {b['p95_ms']} → {r['p95_ms']} ms")
+        if r["comandos"] > b["comandos"]:
+            falhas.append(f"{r['cenario']}: comandos {b['comandos']} → {r['comandos']}")
+    return falhas
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--dsn", default=os.environ.get("DATABASE_URL"), help="(padrão: $DATABASE_URL)")
+    ap.add_argument("--sslmode", default=os.environ.get("DB_SSLMODE", "disable"))
+    ap.add_argument("--usuario", default="bench")
+    ap.add_argument("--obra", type=int, default=None, help="obra aberta nos cenários de OBRAS (padrão: a primeira)")
+    ap.add_argument("--execucoes", type=int, default=10)
+    ap.add_argument("--timeout", type=float, default=60)
+    ap.add_argument("--cenarios", nargs="*", default=list(CENARIOS), metavar="NOME", help=", ".join(CENARIOS))
+    ap.add_argument("--json", help="grava os resultados neste arquivo")
+    ap.add_argument("--comparar", help="JSON de uma execução anterior (linha de base)")
+    ap.add_argument("--tolerancia", type=float, default=0.20, help="piora aceitável do p95 (0.20 = 20%%)")
+    a = ap.parse_args(argv)
+    if not a.dsn:
+        ap.error("informe --dsn ou DATABASE_URL")
+    desconhecidos = set(a.cenarios) - set(CENARIOS)
+    if desconhecidos:
+        ap.error(f"cenário(s) desconhecido(s): {', '.join(sorted(desconhecidos))}")
+
+    resultados = []
+    print(f"{'cenário':<22}{'p50 ms':>9}{'p95 ms':>9}{'SQL ms':>9}{'cmds':>6}{'cache':>7}{'pico MB':>9}")
+    for nome in a.cenarios:
+        r = medir(a, nome, CENARIOS[nome])
+        resultados.append(r)
+        print(f"{nome:<22}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['sql_ms_p50']:>9}"
+              f"{r['comandos']:>6}{r['cache_hits']:>7}{r['pico_mb']:>9}", flush=True)
+
+    if a.json:
+        with open(a.json, "w", encoding="utf-8") as f:
+            json.dump({"em": time.strftime("%Y-%m-%dT%H:%M:%S"), "execucoes": a.execucoes,
+                       "resultados": resultados}, f, ensure_ascii=False, indent=2)
+
+    if a.comparar:
+        with open(a.comparar, encoding="utf-8") as f:
+            falhas = comparar(resultados, json.load(f), a.tolerancia)
+        for msg in falhas:
+            print(f"REGRESSÃO {msg}", file=sys.stderr)
+        return 1 if falhas else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
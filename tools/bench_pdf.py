@@ -0,0 +1,74 @@
+"""Benchmark do PDF de orçamento: tempo e memória em função do nº de serviços (sem banco).
+
+Uso:
+    python tools/bench_pdf.py                       # 100, 1.000, 10.000 e 50.000 itens
+    python tools/bench_pdf.py --itens 500 5000 --fases 20
+
+Compara as duas formas de alimentar relatorios_pdf.desenhar_orcamento:
+  lista   → todas as linhas materializadas antes (como um DataFrame/fetchall)
+  stream  → gerador que cria cada linha na hora (como o cursor do app em iter_rows)
+O pico de memória (tracemalloc) mostra só o que é Python; o reportlab ainda guarda as
+páginas prontas até o save(), então cresce com o nº de PÁGINAS, não com o de linhas vivas.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from relatorios_pdf import desenhar_orcamento  # noqa: E402
+
+HEAD = {
+    "orcamento_id": 1, "titulo": "Condomínio benchmark", "status": "EMITIDO",
+    "valor_total": Decimal("1000000.00"), "desconto_valor": Decimal("0"), "valor_total_final": Decimal("1000000.00"),
+    "obra_titulo": "Obra benchmark", "endereco_obra": "Rua das Flores, 100",
+    "cliente_nome": "Cliente benchmark", "cliente_tel": "(11) 99999-0000",
+}
+
+
+def linhas(n_itens, n_fases):
+    por_fase = max(1, n_itens // n_fases)
+    for i in range(n_itens):
+        f = min(i // por_fase, n_fases - 1)
+        yield {
+            "fase_id": f + 1, "ordem": f + 1, "nome_fase": f"Fase {f + 1}", "valor_fase": Decimal("0"),
+            "servico": f"Serviço {i:06d} - pintura látex parede", "unidade": "M2",
+            "quantidade": Decimal("12.50"), "valor_unit": Decimal("35.00"), "valor_total": Decimal("437.50"),
+        }
+
+
+def medir(n_itens, n_fases, modo):
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    fonte = list(linhas(n_itens, n_fases)) if modo == "lista" else linhas(n_itens, n_fases)
+    with tempfile.SpooledTemporaryFile(max_size=8 * 2**20) as arq:
+        desenhar_orcamento(arq, HEAD, fonte)
+        tamanho = arq.tell()
+    ms = (time.perf_counter() - t0) * 1000
+    pico = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return ms, pico, tamanho
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--itens", type=int, nargs="*", default=[100, 1000, 10000, 50000])
+    ap.add_argument("--fases", type=int, default=10)
+    ap.add_argument("--repeticoes", type=int, default=3, help="vale o melhor tempo")
+    a = ap.parse_args(argv)
+
+    print(f"{'itens':>8}{'modo':>8}{'ms':>10}{'µs/item':>10}{'pico MB':>10}{'PDF KB':>10}")
+    for n in a.itens:
+        for modo in ("lista", "stream"):
+            res = [medir(n, a.fases, modo) for _ in range(a.repeticoes)]
+            ms = min(r[0] for r in res)
+            pico = max(r[1] for r in res)
+            print(f"{n:>8}{modo:>8}{ms:>10.0f}{ms * 1000 / n:>10.1f}{pico:>10.2f}{res[0][2] / 1024:>10.0f}", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
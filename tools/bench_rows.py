@@ -0,0 +1,95 @@
+"""Benchmark das buscas pequenas: DataFrame + .iloc[0] contra linha tipada (linhas.py).
+
+Uso:
+    python tools/bench_rows.py                                  # só Python, sem banco
+    python tools/bench_rows.py --dsn postgresql://localhost/sepol_dev --tabela pessoas
+
+Sem --dsn, monta a mesma linha (um "select * ... where id=%s" típico) dos dois jeitos e
+lê 3 campos, como os formulários de edição fazem. Com --dsn, mede também a ida ao banco
+(RealDictCursor + DataFrame contra cursor comum + linhas_do_cursor).
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date
+from decimal import Decimal
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from linhas import linhas_do_cursor, tipo_linha  # noqa: E402
+
+COLUNAS = ("id", "nome", "tipo", "telefone", "diaria", "ativo", "observacao", "criado_em")
+VALORES = (42, "Fulano de Tal", "PINTOR", "(11) 99999-0000", Decimal("250.00"), True, None, date(2024, 5, 1))
+
+
+def por_dataframe():
+    r = pd.DataFrame([dict(zip(COLUNAS, VALORES))]).iloc[0]
+    return r["nome"], r["diaria"], r["ativo"]
+
+
+def por_linha():
+    r = tipo_linha(COLUNAS)._make(VALORES)
+    return r["nome"], r["diaria"], r["ativo"]
+
+
+def medir(fn, n):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    us = (time.perf_counter() - t0) * 1e6 / n
+    tracemalloc.start()
+    guardadas = [fn() for _ in range(1000)]
+    pico = tracemalloc.get_traced_memory()[1] / 1000
+    tracemalloc.stop()
+    del guardadas
+    return us, pico
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--n", type=int, default=5000, help="repetições por medida")
+    ap.add_argument("--dsn", default=None)
+    ap.add_argument("--sslmode", default=os.environ.get("DB_SSLMODE", "disable"))
+    ap.add_argument("--tabela", default="pessoas")
+    a = ap.parse_args(argv)
+
+    print(f"{'forma':<12}{'µs/busca':>10}{'bytes/busca':>13}")
+    for nome, fn in (("DataFrame", por_dataframe), ("linha", por_linha)):
+        us, b = medir(fn, a.n)
+        print(f"{nome:<12}{us:>10.1f}{b:>13.0f}")
+
+    if a.dsn:
+        import psycopg2
+        import psycopg2.extensions
+        from psycopg2.extras import RealDictCursor
+
+        conn = psycopg2.connect(a.dsn, sslmode=a.sslmode, cursor_factory=RealDictCursor)
+        conn.autocommit = True
+        sql = f"select * from public.{a.tabela} order by id limit 1;"
+
+        def banco_df():
+            with conn.cursor() as cur:
+                cur.execute(sql)
+                return pd.DataFrame(cur.fetchall()).iloc[0]
+
+        def banco_linha():
+            with conn.cursor(cursor_factory=psycopg2.extensions.cursor) as cur:
+                cur.execute(sql)
+                return linhas_do_cursor(cur, cur.fetchall())[0]
+
+        try:
+            print(f"\ncom banco ({a.tabela}):")
+            for nome, fn in (("DataFrame", banco_df), ("linha", banco_linha)):
+                us, b = medir(fn, max(1, a.n // 10))
+                print(f"{nome:<12}{us:>10.1f}{b:>13.0f}")
+        finally:
+            conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+"""Benchmark de partida a frio: tela de login num processo Python novo (sem banco).
+
+Uso:
+    python tools/bench_startup.py                   # 5 processos novos
+    python tools/bench_startup.py --execucoes 10 --json startup.json
+
+Cada execução abre um interpretador novo (como um container que acabou de subir) e mede:
+  import   → `import streamlit` + AppTest
+  login    → 1ª execução do app.py até a tela de login (st.stop() antes do menu)
+  total    → do início do processo até o login pronto
+e quais módulos pesados já estavam carregados nesse ponto (devem carregar só no 1º uso).
+Também mede, cada um num processo novo, quanto custa importar cada módulo pesado sozinho.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+PESADOS = ["pandas", "reportlab.pdfgen.canvas", "pypdf", "relatorios_pdf", "concurrent.futures.process"]
+
+# roda no processo filho
+FILHO = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+t1 = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+at.secrets["DATABASE_URL"] = "postgresql://nao-usado/na-tela-de-login"
+at.run()
+t2 = time.perf_counter()
+erro = str(at.exception[0].value) if at.exception else None
+print(json.dumps({
+    "import_ms": (t1 - t0) * 1000, "login_ms": (t2 - t1) * 1000, "total_ms": (t2 - t0) * 1000,
+    "carregados": [m for m in json.loads(sys.argv[2]) if m in sys.modules], "erro": erro,
+}))
+"""
+
+
+def filho(codigo, *args):
+    t0 = time.perf_counter()
+    r = subprocess.run([sys.executable, "-c", codigo, *args], capture_output=True, text=True,
+                       cwd=os.path.dirname(APP))
+    if r.returncode != 0:
+        raise RuntimeError(r.stderr.strip().splitlines()[-1] if r.stderr.strip() else f"código {r.returncode}")
+    return r.stdout, (time.perf_counter() - t0) * 1000
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--execucoes", type=int, default=5)
+    ap.add_argument("--json", help="grava os resultados neste arquivo")
+    a = ap.parse_args(argv)
+
+    print(f"{'módulo':<30}{'import ms':>10}")
+    modulos = {}
+    for m in PESADOS:
+        base = filho("pass")[1]
+        ms = min(filho(f"import {m}")[1] for _ in range(3)) - base
+        modulos[m] = round(ms, 1)
+        print(f"{m:<30}{ms:>10.0f}", flush=True)
+
+    runs = []
+    for _ in range(a.execucoes):
+        saida, _ = filho(FILHO, APP, json.dumps(PESADOS))
+        r = json.loads(saida.strip().splitlines()[-1])
+        if r["erro"]:
+            raise RuntimeError(f"login: {r['erro']}")
+        runs.append(r)
+
+    res = {k: round(statistics.median(r[k] for r in runs), 1) for k in ("import_ms", "login_ms", "total_ms")}
+    carregados = sorted({m for r in runs for m in r["carregados"]})
+    print(f"\nlogin a frio (mediana de {a.execucoes}): import {res['import_ms']:.0f} ms • "
+          f"1ª execução {res['login_ms']:.0f} ms • total {res['total_ms']:.0f} ms")
+    print("pesados já carregados no login:", ", ".join(carregados) or "nenhum")
+
+    if a.json:
+        with open(a.json, "w", encoding="utf-8") as f:
+            json.dump({"em": time.strftime("%Y-%m-%dT%H:%M:%S"), "execucoes": a.execucoes,
+                       "modulos_ms": modulos, "login": res, "carregados": carregados},
+                      f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
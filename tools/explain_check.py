@@ -0,0 +1,210 @@
+"""Confere o plano de cada consulta do app: acusa Seq Scan em tabela grande.
+
+Uso:
+    python tools/seed.py --dsn postgresql://localhost/sepol_dev --limpar
+    python tools/migrate.py --dsn postgresql://localhost/sepol_dev
+    python tools/explain_check.py --dsn postgresql://localhost/sepol_dev --min-linhas 1000
+
+Lê app.py (ast) e pega cada texto SQL que começa com select/with: literais, constantes
+do módulo (_PDF_ITENS_SQL + " where ...") e f-strings montadas só com textos fixos. As
+listas de keyset_page ganham o "order by ... limit" que o app acrescenta; os filtros
+opcionais (filtros_where) ficam de fora, então vale o plano "sem filtro". Cada consulta vira um
+PREPARE ($1, $2... no lugar de %s / %(nome)s) e roda EXPLAIN (FORMAT JSON) EXECUTE com
+plan_cache_mode = force_generic_plan: o plano genérico vale para qualquer parâmetro,
+então os valores passados (NULL) não importam. Nada é executado de fato.
+
+Sai com código 1 se algum Seq Scan cair numa tabela com mais de --min-linhas linhas
+(pg_class.reltuples) ou se alguma consulta não puder ser conferida (erro no PREPARE/EXPLAIN,
+ex.: tipo de um parâmetro que o Postgres não consegue deduzir). SQL que depende de valores de execução é listado como ignorado.
+"""
+import argparse
+import ast
+import json
+import os
+import re
+import sys
+
+import psycopg2
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+PARAM = re.compile(r"%\((\w+)\)s|%s")
+
+
+def keyset_extras(arvore):
+    # id do literal SQL passado a keyset_page → sufixo "order by ... limit" que o app põe
+    # (limit = page_size + 1, com page_size da chamada ou o PAGE_SIZE do app)
+    padrao = next((n.value.value for n in arvore.body
+                   if isinstance(n, ast.Assign) and getattr(n.targets[0], "id", None) == "PAGE_SIZE"
+                   and isinstance(n.value, ast.Constant)), 50)
+    extras = {}
+    for n in ast.walk(arvore):
+        if not (isinstance(n, ast.Call) and getattr(n.func, "id", None) == "keyset_page" and len(n.args) >= 3):
+            continue
+        sql, cols = n.args[1], n.args[2]
+        while isinstance(sql, ast.BinOp):  # "..." + where
+            sql = sql.left
+        if not isinstance(cols, ast.List):
+            continue
+        desc = any(k.arg == "desc" and getattr(k.value, "value", False) for k in n.keywords)
+        tam = next((k.value.value for k in n.keywords
+                    if k.arg == "page_size" and isinstance(k.value, ast.Constant)), padrao)
+        ordem = ", ".join(f"{c.value} {'desc' if desc else 'asc'}" for c in cols.elts)
+        extras[id(sql)] = f" order by {ordem} limit {int(tam) + 1}"
+    return extras
+
+
+def texto(n, conhecidos):
+    # valor do nó se der para montar sem executar: literal, constante do módulo, "a" + "b", f"{CONST}"
+    if isinstance(n, ast.Constant) and isinstance(n.value, str):
+        return n.value
+    if isinstance(n, ast.Name):
+        return conhecidos.get(n.id)
+    if isinstance(n, ast.BinOp) and isinstance(n.op, ast.Add):
+        a, b = texto(n.left, conhecidos), texto(n.right, conhecidos)
+        return None if a is None or b is None else a + b
+    if isinstance(n, ast.JoinedStr):
+        partes = []
+        for v in n.values:
+            if isinstance(v, ast.FormattedValue):
+                if v.format_spec is not None or v.conversion != -1:
+                    return None
+                v = v.value
+            t = texto(v, conhecidos)
+            if t is None:
+                return None
+            partes.append(t)
+        return "".join(partes)
+    return None
+
+
+def parece_sql(t):
+    t = " ".join(t.split())
+    return re.match(r"(select|with)\b", t, re.I) and " from " in t.lower()
+
+
+def consultas(caminho):
+    with open(caminho, encoding="utf-8") as f:
+        arvore = ast.parse(f.read(), caminho)
+    # constantes de texto do módulo (ex.: _PDF_ITENS_SQL): são moldes, valem onde são usadas
+    # (e textos simples atribuídos dentro do app, ex.: ref = "coalesce(...)", usados em f-strings)
+    conhecidos, moldes = {}, set()
+    for n in arvore.body:
+        if isinstance(n, ast.Assign) and len(n.targets) == 1 and isinstance(n.targets[0], ast.Name):
+            t = texto(n.value, conhecidos)
+            if t is not None:
+                conhecidos[n.targets[0].id] = t
+                moldes.add(id(n.value))
+    for n in ast.walk(arvore):
+        if (isinstance(n, ast.Assign) and len(n.targets) == 1 and isinstance(n.targets[0], ast.Name)
+                and isinstance(n.value, ast.Constant) and isinstance(n.value.value, str)):
+            conhecidos.setdefault(n.targets[0].id, n.value.value)
+    extras = keyset_extras(arvore)
+    achadas, ignoradas = [], []
+
+    def visitar(n):
+        if id(n) in moldes:
+            return
+        if isinstance(n, (ast.Constant, ast.BinOp, ast.JoinedStr)):
+            t = texto(n, conhecidos)
+            if t is not None:
+                if parece_sql(t):
+                    sql = t.strip().rstrip(";")
+                    if id(n) in extras:
+                        sql = f"select * from ({sql}) q{extras[id(n)]}"
+                    achadas.append((n.lineno, sql))
+                return
+            if isinstance(n, ast.JoinedStr):
+                fixo = "".join(v.value for v in n.values if isinstance(v, ast.Constant))
+                if parece_sql(fixo.strip()):
+                    ignoradas.append(n.lineno)
+                return
+        for filho in ast.iter_child_nodes(n):
+            visitar(filho)
+
+    visitar(arvore)
+    return sorted(achadas), sorted(set(ignoradas))
+
+
+def numerar(sql):
+    # %s → $1, $2...; %(nome)s repete o mesmo $n para o mesmo nome
+    nomes, cont = {}, [0]
+
+    def troca(m):
+        if m.group(1):
+            if m.group(1) not in nomes:
+                cont[0] += 1
+                nomes[m.group(1)] = cont[0]
+            return f"${nomes[m.group(1)]}"
+        cont[0] += 1
+        return f"${cont[0]}"
+
+    return PARAM.sub(troca, sql.replace("%%", "%")), cont[0]
+
+
+def seq_scans(plano):
+    if plano.get("Node Type") == "Seq Scan":
+        yield plano
+    for filho in plano.get("Plans", []):
+        yield from seq_scans(filho)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--dsn", default=os.environ.get("DATABASE_URL"), help="(padrão: $DATABASE_URL)")
+    ap.add_argument("--sslmode", default=os.environ.get("DB_SSLMODE", "disable"))
+    ap.add_argument("--app", default=APP)
+    ap.add_argument("--min-linhas", type=int, default=1000, help="tabelas menores que isso podem ter Seq Scan")
+    ap.add_argument("--verbose", action="store_true", help="mostra também as consultas sem problema")
+    a = ap.parse_args(argv)
+    if not a.dsn:
+        ap.error("informe --dsn ou DATABASE_URL")
+
+    achadas, ignoradas = consultas(a.app)
+    conn = psycopg2.connect(a.dsn, sslmode=a.sslmode)
+    conn.autocommit = True
+    problemas = erros = 0
+    try:
+        with conn.cursor() as cur:
+            cur.execute("set plan_cache_mode = force_generic_plan;")
+            cur.execute("select c.oid::regclass::text, c.relname, c.reltuples from pg_class c where c.relkind = 'r';")
+            tamanho = {}
+            for nome_q, nome, linhas in cur.fetchall():
+                tamanho[nome_q] = tamanho[nome] = max(0, int(linhas))
+
+            for linha, sql in achadas:
+                preparado, n = numerar(sql)
+                try:
+                    cur.execute(f"prepare q_check as {preparado}")
+                    try:
+                        cur.execute(f"explain (format json) execute q_check({', '.join(['null'] * n)})"
+                                    if n else "explain (format json) execute q_check")
+                        plano = cur.fetchone()[0]
+                        plano = (json.loads(plano) if isinstance(plano, str) else plano)[0]["Plan"]
+                    finally:
+                        cur.execute("deallocate q_check;")
+                except psycopg2.Error as e:
+                    erros += 1
+                    print(f"app.py:{linha}  ERRO  {str(e).strip().splitlines()[0]}")
+                    continue
+
+                grandes = [(s["Relation Name"], tamanho.get(s["Relation Name"], 0), s.get("Filter"))
+                           for s in seq_scans(plano) if tamanho.get(s["Relation Name"], 0) >= a.min_linhas]
+                if grandes:
+                    problemas += 1
+                    print(f"app.py:{linha}  SEQ SCAN  custo {plano['Total Cost']:.0f}")
+                    for rel, linhas, filtro in grandes:
+                        print(f"    {rel} (~{linhas} linhas){f'  filtro: {filtro}' if filtro else ''}")
+                    print(f"    {' '.join(sql.split())[:160]}")
+                elif a.verbose:
+                    print(f"app.py:{linha}  ok  custo {plano['Total Cost']:.0f}")
+    finally:
+        conn.close()
+
+    print(f"\n{len(achadas)} consulta(s) • {problemas} com Seq Scan em tabela ≥ {a.min_linhas} linhas • "
+          f"{erros} erro(s) • {len(ignoradas)} montada(s) em tempo de execução (ignoradas: linhas "
+          f"{', '.join(map(str, ignoradas)) or '—'})")
+    return 1 if problemas or erros else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
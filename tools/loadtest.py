@@ -0,0 +1,460 @@
+"""Teste de carga: N sessões simultâneas do app contra um Postgres LOCAL.
+
+Uso:
+    python tools/seed.py --dsn postgresql://localhost/sepol_dev --limpar
+    python tools/loadtest.py --dsn postgresql://localhost/sepol_dev --usuarios 20 --iteracoes 5 --pool-max 10
+
+Cada usuário virtual roda num PROCESSO próprio com a sua sessão AppTest (o AppTest troca
+estado global do Streamlit — runtime, st.secrets — a cada run, então duas sessões no
+mesmo processo se atropelam). Roteiro: login → APONTAMENTOS (salva um apontamento na
+semana atual) → FINANCEIRO (gera a semana). Em paralelo, uma thread amostra
+pg_stat_activity: sessões esperando lock e conexões em uso ao mesmo tempo.
+
+Pool: cada processo tem o seu pool, então a espera medida (session_state["_sql_run"]["pool"])
+é a de dentro da sessão. A demanda de um pool compartilhado (servidor único) é o pico de
+conexões ATIVAS simultâneas no banco, também reportado: DB_POOL_MAX abaixo dele = fila.
+
+"pagar_sql" é uma linha de base do banco, reportada à parte: o AppTest não simula seleção
+em st.dataframe, então ela chama fn_marcar_pagamento_pago em lote numa conexão própria,
+fora do pool/pagar_lote/transaction() do app — mede a disputa no banco, não o app.
+
+Modo --modo pool (dimensionar DB_POOL_MAX):
+    python tools/loadtest.py --dsn ... --modo pool --threads 40 --operacoes 50 --pool-max 10
+
+Carrega de app.py só a camada de banco (pool, get_conn, query_df, transaction e o cache de
+invalidação) num processo, com um st mínimo (secrets/session_state/cache_resource), e põe
+--threads threads disputando O MESMO pool, como as sessões de um servidor. Operações:
+leituras (query_df) e escritas em transaction() — gerar a semana e pagar em lote com os
+mesmos comandos de pagar_lote. Reporta a espera por vaga em cada checkout e os timeouts.
+"""
+import argparse
+import ast
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import psycopg2
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+PASSOS = ["login", "apontamento", "gerar_semana"]
+BASE = ["pagar_sql"]
+
+
+def pct(xs, p):
+    xs = sorted(xs)
+    if not xs:
+        return 0.0
+    k = (len(xs) - 1) * p
+    i = int(k)
+    return xs[i] if i + 1 >= len(xs) else xs[i] + (xs[i + 1] - xs[i]) * (k - i)
+
+
+def widget(lista, label):
+    return next(w for w in lista if w.label == label)
+
+
+def checar(at, passo):
+    # exceção no script ou st.error do app (ex.: falha de conexão em safe_df) = erro do passo
+    if at.exception:
+        raise RuntimeError(f"{passo}: {at.exception[0].value}")
+    if at.error:
+        raise RuntimeError(f"{passo}: {at.error[0].value}")
+
+
+def nova_coleta():
+    return {
+        "tempos": {p: [] for p in PASSOS + BASE},
+        "erros": {p: [] for p in PASSOS + BASE},
+        # por passo: checkouts do pool do app, esperas por vaga (ms) e timeouts
+        "pool": {p: {"checkouts": 0, "esperas_ms": [], "timeouts": 0} for p in PASSOS},
+        "conflitos": 0,
+        "roteiros": 0,
+    }
+
+
+def usuario_virtual(n, a, coleta, segunda):
+    # roda no processo filho: uma sessão AppTest só neste processo
+    from streamlit.testing.v1 import AppTest
+
+    rnd = random.Random(a.semente + n)
+    at = AppTest.from_file(APP, default_timeout=a.timeout)
+    at.secrets["DATABASE_URL"] = a.dsn
+    at.secrets["DB_SSLMODE"] = a.sslmode
+    at.secrets["DB_POOL_MAX"] = a.pool_max
+    at.secrets["DB_POOL_TIMEOUT"] = a.pool_timeout
+    atual = {"passo": None}
+
+    def rodar(x):
+        # x.run() + o que o pool do app registrou nessa execução
+        x.run()
+        pool = at.session_state["_sql_run"]["pool"]
+        c = coleta["pool"][atual["passo"]]
+        c["checkouts"] += pool["checkouts"]
+        c["timeouts"] += pool["timeouts"]
+        if pool["checkouts"]:
+            c["esperas_ms"].append(pool["espera_max_ms"])
+
+    def passo(nome, fn):
+        atual["passo"] = nome
+        t0 = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:  # passo falhou; o roteiro segue para o próximo
+            coleta["erros"][nome].append((str(e).splitlines() or [repr(e)])[0][:200])
+            return False
+        coleta["tempos"][nome].append((time.perf_counter() - t0) * 1000)
+        return True
+
+    def login():
+        rodar(at)
+        at.text_input[0].input(a.usuario)
+        at.text_input[1].input(a.senha)
+        rodar(widget(at.button, "Entrar").click())
+        checar(at, "login")
+        if at.session_state["usuario"] != a.usuario:
+            raise RuntimeError("login: usuário/senha recusados")
+
+    def apontamento():
+        rodar(at.selectbox(key="menu_widget").select("APONTAMENTOS"))
+        checar(at, "apontamento")
+        obra = widget(at.selectbox, "Obra")
+        pessoa = widget(at.selectbox, "Profissional")
+        obra.select_index(rnd.randrange(len(obra.options)))
+        pessoa.select_index(rnd.randrange(len(pessoa.options)))
+        widget(at.date_input, "Data").set_value(segunda + timedelta(days=rnd.randint(0, 4)))
+        widget(at.number_input, "Valor base (R$)").set_value(float(rnd.choice([150, 200, 250])))
+        rodar(widget(at.button, "Salvar apontamento").click())
+        checar(at, "apontamento")
+        if any("Já existe apontamento" in w.value for w in at.warning):
+            coleta["conflitos"] += 1
+
+    def gerar_semana():
+        rodar(at.selectbox(key="menu_widget").select("FINANCEIRO"))
+        checar(at, "gerar_semana")
+        widget(at.date_input, "Segunda-feira da semana").set_value(segunda)
+        rodar(widget(at.button, "Gerar pagamentos desta semana").click())
+        checar(at, "gerar_semana")
+
+    def pagar_sql():
+        # linha de base: mesmo comando de pagar_lote, direto no banco (fora do app)
+        conn = psycopg2.connect(a.dsn, sslmode=a.sslmode)
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cur:
+                cur.execute("""
+                    select p.id from public.pagamentos p
+                    where p.status <> 'PAGO' and p.referencia_inicio = %s
+                    order by random() limit %s;
+                """, (segunda, a.pagar_por_vez))
+                ids = [r[0] for r in cur.fetchall()]
+                if ids:
+                    cur.execute(
+                        "select public.fn_marcar_pagamento_pago(u.id, %s, %s) from unnest(%s::bigint[]) as u(id);",
+                        (a.usuario, date.today(), ids),
+                    )
+        finally:
+            conn.close()
+
+    if not passo("login", login):
+        return
+    for _ in range(a.iteracoes):
+        passo("apontamento", apontamento)
+        passo("gerar_semana", gerar_semana)
+        if a.pagar_por_vez:
+            passo("pagar_sql", pagar_sql)
+        coleta["roteiros"] += 1
+        if a.pausa:
+            time.sleep(rnd.uniform(0, a.pausa))
+
+
+# camada de banco do app.py usada no modo pool (definições de topo, pelo nome)
+CAMADA_BANCO = {
+    "_cfg", "SLOW_QUERY_MS", "_slow_log", "_SQL_RUN", "_rows_bytes", "_sql_record", "_CONN_KW",
+    "_pool_holder", "_close_quietly", "_conn_ok", "_pool_checkout", "_pool_checkin", "pool_stats",
+    "get_conn", "query_df", "_Tx", "_run_batch", "transaction", "exec_sql",
+    "_RE_TAB_LIDA", "_RE_TAB_ESCRITA", "_RE_FN", "_FN_TABELAS", "tables_read", "tables_written",
+    "_read_cache", "invalidate_tables",
+}
+OPERACOES = ["ler_sexta", "ler_lista", "gerar_semana", "pagar_lote"]
+
+
+def _cache_resource(fn):
+    # st.cache_resource de processo único: 1 valor por argumentos, .clear() descarta
+    memo = {}
+
+    def f(*args):
+        if args not in memo:
+            memo[args] = fn(*args)
+        return memo[args]
+
+    f.clear = memo.clear
+    return f
+
+
+def carregar_banco(a):
+    # executa só as definições de CAMADA_BANCO de app.py (o resto do script é tela)
+    import logging
+    import re
+
+    import pandas as pd
+    import psycopg2.extensions
+    import psycopg2.pool
+    from psycopg2.extras import RealDictCursor
+
+    with open(APP, encoding="utf-8") as f:
+        arvore = ast.parse(f.read(), APP)
+    corpo = [n for n in arvore.body
+             if (isinstance(n, (ast.FunctionDef, ast.ClassDef)) and n.name in CAMADA_BANCO)
+             or (isinstance(n, ast.Assign) and any(getattr(t, "id", None) in CAMADA_BANCO for t in n.targets))]
+    faltam = CAMADA_BANCO - {getattr(n, "name", None) or n.targets[0].id for n in corpo}
+    if faltam:
+        raise RuntimeError(f"app.py sem: {', '.join(sorted(faltam))}")
+
+    st = SimpleNamespace(
+        secrets={"DATABASE_URL": a.dsn, "DB_SSLMODE": a.sslmode, "DB_POOL_MAX": a.pool_max,
+                 "DB_POOL_TIMEOUT": a.pool_timeout},
+        session_state={},
+        cache_resource=_cache_resource,
+    )
+    ns = {"st": st, "psycopg2": psycopg2, "pd": pd, "RealDictCursor": RealDictCursor, "json": json,
+          "logging": logging, "re": re, "threading": threading, "time": time, "contextmanager": contextmanager}
+    exec(compile(ast.Module(body=corpo, type_ignores=[]), APP, "exec"), ns)
+
+    # espera por vaga de CADA checkout (o pool só guarda total/máximo)
+    esperas, original = [], ns["_pool_checkout"]
+
+    def checkout_medido(holder):
+        t0 = time.perf_counter()
+        try:
+            return original(holder)
+        finally:
+            esperas.append((time.perf_counter() - t0) * 1000)
+
+    ns["_pool_checkout"] = checkout_medido
+    return ns, esperas
+
+
+def modo_pool(a, segunda):
+    ns, esperas = carregar_banco(a)
+    query_df, transaction = ns["query_df"], ns["transaction"]
+    tempos = {o: [] for o in OPERACOES}
+    erros = {o: [] for o in OPERACOES}
+    lock = threading.Lock()
+
+    def operacao(nome):
+        if nome == "ler_sexta":
+            query_df("select * from public.pagamentos_para_sexta;")
+        elif nome == "ler_lista":
+            query_df("""
+                select a.id, a.data, p.nome as profissional, o.titulo as obra, a.tipo_dia, a.valor_final
+                from public.apontamentos a
+                join public.pessoas p on p.id=a.pessoa_id
+                join public.obras o on o.id=a.obra_id
+                order by a.data desc, a.id desc limit 51;
+            """)
+        elif nome == "gerar_semana":
+            with transaction() as tx:
+                tx.exec("select public.fn_gerar_pagamentos_semana(%s);", (segunda,))
+        else:
+            df = query_df("""
+                select p.id from public.pagamentos p
+                where p.status <> 'PAGO' and p.referencia_inicio = %s
+                order by random() limit %s;
+            """, (segunda, max(1, a.pagar_por_vez)))
+            ids = [int(x) for x in df["id"]] if not df.empty else []
+            if ids:
+                # mesmos comandos de pagar_lote no app
+                with transaction() as tx:
+                    tx.exec("select public.fn_marcar_pagamento_pago(u.id, %s, %s) from unnest(%s::bigint[]) as u(id);",
+                            (a.usuario, date.today(), ids))
+                    tx.exec("select p.id, p.status from public.pagamentos p where p.id = any(%s);", (ids,))
+
+    def trabalhador(n):
+        rnd = random.Random(a.semente + n)
+        pesos = [6, 3, 1, 1]
+        for _ in range(a.operacoes):
+            nome = rnd.choices(OPERACOES, pesos)[0]
+            t0 = time.perf_counter()
+            try:
+                operacao(nome)
+            except Exception as e:
+                with lock:
+                    erros[nome].append((str(e).splitlines() or [repr(e)])[0][:200])
+                continue
+            with lock:
+                tempos[nome].append((time.perf_counter() - t0) * 1000)
+
+    print(f"{a.threads} thread(s) × {a.operacoes} operação(ões) num pool só (máx. {a.pool_max}, "
+          f"timeout {a.pool_timeout:.0f}s)...", flush=True)
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=trabalhador, args=(n,)) for n in range(a.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    duracao = time.perf_counter() - t0
+
+    total = sum(len(x) for x in tempos.values())
+    print(f"\nDuração: {duracao:.1f}s • Operações ok: {total} ({total / duracao:.1f}/s)")
+    print(f"\n{'operação':<14}{'ok':>6}{'erros':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'máx ms':>9}")
+    for o in OPERACOES:
+        xs = tempos[o]
+        print(f"{o:<14}{len(xs):>6}{len(erros[o]):>7}{pct(xs, .5):>9.0f}{pct(xs, .95):>9.0f}"
+              f"{pct(xs, .99):>9.0f}{max(xs, default=0):>9.0f}")
+
+    s = ns["pool_stats"]()
+    print(f"\nPool: {s['checkouts']} checkout(s) • esperaram: {s['esperas']} • timeouts: {s['timeouts']} • "
+          f"conexões criadas: {s['criadas']} • descartadas: {s['descartadas']}")
+    print(f"Espera por vaga (ms) p50/p95/p99/máx.: {pct(esperas, .5):.1f}/{pct(esperas, .95):.1f}/"
+          f"{pct(esperas, .99):.1f}/{max(esperas, default=0):.1f}")
+
+    todos = [(o, m) for o in OPERACOES for m in erros[o]]
+    if todos:
+        print("\nErros (primeiros 10):")
+        for o, m in todos[:10]:
+            print(f"  [{o}] {m}")
+    return 1 if todos or s["timeouts"] else 0
+
+
+def juntar(total, parte):
+    for p in total["tempos"]:
+        total["tempos"][p] += parte["tempos"][p]
+        total["erros"][p] += parte["erros"][p]
+    for p in total["pool"]:
+        for k in ("checkouts", "timeouts"):
+            total["pool"][p][k] += parte["pool"][p][k]
+        total["pool"][p]["esperas_ms"] += parte["pool"][p]["esperas_ms"]
+    total["conflitos"] += parte["conflitos"]
+    total["roteiros"] += parte["roteiros"]
+
+
+def amostrar_locks(a, parar, amostras):
+    # sessões do banco atual esperando lock e conexões ativas, a cada --intervalo segundos
+    conn = psycopg2.connect(a.dsn, sslmode=a.sslmode)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            while not parar.is_set():
+                cur.execute("""
+                    select count(*) filter (where wait_event_type = 'Lock'),
+                           coalesce(max(extract(epoch from now() - query_start))
+                                    filter (where wait_event_type = 'Lock'), 0),
+                           count(*),
+                           count(*) filter (where state = 'active')
+                    from pg_stat_activity
+                    where datname = current_database() and pid <> pg_backend_pid();
+                """)
+                amostras.append(cur.fetchone())
+                parar.wait(a.intervalo)
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--dsn", default=os.environ.get("DATABASE_URL"), help="(padrão: $DATABASE_URL)")
+    ap.add_argument("--sslmode", default=os.environ.get("DB_SSLMODE", "disable"))
+    ap.add_argument("--usuario", default="bench")
+    ap.add_argument("--senha", default="bench")
+    ap.add_argument("--usuarios", type=int, default=10, help="sessões simultâneas (1 processo cada)")
+    ap.add_argument("--iteracoes", type=int, default=5, help="roteiros por usuário")
+    ap.add_argument("--pausa", type=float, default=0.5, help="pausa máxima (s) entre roteiros")
+    ap.add_argument("--pool-max", type=int, default=10, help="DB_POOL_MAX do app")
+    ap.add_argument("--pool-timeout", type=float, default=15, help="DB_POOL_TIMEOUT do app")
+    ap.add_argument("--pagar-por-vez", type=int, default=5, help="0 = sem a linha de base pagar_sql")
+    ap.add_argument("--intervalo", type=float, default=0.2, help="amostragem de pg_stat_activity (s)")
+    ap.add_argument("--timeout", type=float, default=120)
+    ap.add_argument("--semente", type=int, default=42)
+    ap.add_argument("--modo", choices=["sessoes", "pool"], default="sessoes",
+                    help="sessoes: AppTest, 1 processo por usuário; pool: threads num pool só")
+    ap.add_argument("--threads", type=int, default=20, help="(modo pool) threads disputando o pool")
+    ap.add_argument("--operacoes", type=int, default=50, help="(modo pool) operações por thread")
+    ap.add_argument("--filho", type=int, default=None, help=argparse.SUPPRESS)
+    a = ap.parse_args(argv)
+    if not a.dsn:
+        ap.error("informe --dsn ou DATABASE_URL")
+
+    hoje = date.today()
+    segunda = hoje - timedelta(days=hoje.weekday())
+
+    if a.modo == "pool":
+        return modo_pool(a, segunda)
+
+    if a.filho is not None:
+        coleta = nova_coleta()
+        usuario_virtual(a.filho, a, coleta, segunda)
+        print(json.dumps(coleta))
+        return 0
+
+    amostras, parar = [], threading.Event()
+    sampler = threading.Thread(target=amostrar_locks, args=(a, parar, amostras), daemon=True)
+    sampler.start()
+
+    print(f"{a.usuarios} usuário(s) × {a.iteracoes} roteiro(s), pool máx. {a.pool_max} por sessão...", flush=True)
+    t0 = time.perf_counter()
+    filhos = [subprocess.Popen([sys.executable, os.path.abspath(__file__), *argv, "--filho", str(n)],
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+              for n in range(a.usuarios)]
+    saidas = [f.communicate() for f in filhos]
+    duracao = time.perf_counter() - t0
+    parar.set()
+    sampler.join()
+
+    coleta = nova_coleta()
+    for n, ((out, err), f) in enumerate(zip(saidas, filhos)):
+        linhas = out.strip().splitlines()
+        if f.returncode != 0 or not linhas:
+            coleta["erros"]["login"].append(f"processo {n}: " + ((err.strip().splitlines() or ["sem saída"])[-1])[:200])
+            continue
+        juntar(coleta, json.loads(linhas[-1]))
+
+    tempos, erros_passo = coleta["tempos"], coleta["erros"]
+    roteiros, conflitos = coleta["roteiros"], coleta["conflitos"]
+    print(f"\nDuração: {duracao:.1f}s • Roteiros completos: {roteiros} "
+          f"({roteiros / duracao:.2f}/s) • Conflitos de apontamento: {conflitos}")
+
+    def tabela(passos):
+        print(f"\n{'passo':<14}{'ok':>6}{'erros':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'máx ms':>9}")
+        for p in passos:
+            xs = tempos[p]
+            print(f"{p:<14}{len(xs):>6}{len(erros_passo[p]):>7}{pct(xs, .5):>9.0f}{pct(xs, .95):>9.0f}"
+                  f"{pct(xs, .99):>9.0f}{max(xs, default=0):>9.0f}")
+
+    tabela(PASSOS)
+    print(f"\n{'pool (app)':<14}{'checkouts':>10}{'espera p95':>12}{'máx ms':>9}{'timeouts':>10}")
+    for p in PASSOS:
+        c = coleta["pool"][p]
+        print(f"{p:<14}{c['checkouts']:>10}{pct(c['esperas_ms'], .95):>12.1f}"
+              f"{max(c['esperas_ms'], default=0):>9.1f}{c['timeouts']:>10}")
+    if a.pagar_por_vez:
+        print("\nLinha de base do banco (SQL direto, fora do pool/pagar_lote do app):", end="")
+        tabela(BASE)
+
+    if amostras:
+        esperando = [x[0] for x in amostras]
+        ativas = [x[3] for x in amostras]
+        print(f"\nLocks: {sum(1 for x in esperando if x)} de {len(amostras)} amostras com espera • "
+              f"máx. simultâneas: {max(esperando)} • maior espera: {max(float(x[1]) for x in amostras):.2f}s")
+        print(f"Conexões no banco (méd./máx.): {statistics.mean(x[2] for x in amostras):.1f}/"
+              f"{max(x[2] for x in amostras)} • ativas ao mesmo tempo (p95/máx.): "
+              f"{pct(ativas, .95):.0f}/{max(ativas)} ← demanda de um pool compartilhado")
+
+    erros = [(p, m) for p in PASSOS + BASE for m in erros_passo[p]]
+    if erros:
+        print("\nErros (primeiros 10):")
+        for p, m in erros[:10]:
+            print(f"  [{p}] {m}")
+    return 1 if erros else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
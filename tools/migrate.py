@@ -0,0 +1,65 @@
+"""Aplica as migrações de sql/ (NNN_nome.sql) em ordem, uma vez cada.
+
+Uso:
+    python tools/migrate.py --dsn "$DATABASE_URL"            # aplica as pendentes
+    python tools/migrate.py --dsn "$DATABASE_URL" --status   # só lista
+
+Cada arquivo roda numa transação própria e fica registrado em public.schema_migrations.
+"""
+import argparse
+import os
+import re
+import sys
+
+import psycopg2
+
+PASTA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sql")
+
+
+def migracoes():
+    arquivos = sorted(f for f in os.listdir(PASTA) if re.match(r"^\d{3}_.+\.sql$", f))
+    return [(f.split("_", 1)[0], f) for f in arquivos]
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--dsn", default=os.environ.get("DATABASE_URL"), help="(padrão: $DATABASE_URL)")
+    ap.add_argument("--sslmode", default=os.environ.get("DB_SSLMODE", "require"))
+    ap.add_argument("--status", action="store_true", help="mostra o que falta sem aplicar")
+    a = ap.parse_args(argv)
+    if not a.dsn:
+        ap.error("informe --dsn ou DATABASE_URL")
+
+    conn = psycopg2.connect(a.dsn, sslmode=a.sslmode)
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute("""
+                create table if not exists public.schema_migrations (
+                  versao      text primary key,
+                  arquivo     text not null,
+                  aplicado_em timestamptz not null default now()
+                );
+            """)
+            cur.execute("select versao from public.schema_migrations;")
+            feitas = {r[0] for r in cur.fetchall()}
+
+        pendentes = [(v, f) for v, f in migracoes() if v not in feitas]
+        for v, f in migracoes():
+            print(f"  {'ok      ' if v in feitas else 'pendente'}  {f}")
+        if a.status or not pendentes:
+            return 0
+
+        for v, f in pendentes:
+            with open(os.path.join(PASTA, f), encoding="utf-8") as arq:
+                sql = arq.read()
+            with conn, conn.cursor() as cur:
+                cur.execute(sql)
+                cur.execute("insert into public.schema_migrations (versao, arquivo) values (%s, %s);", (v, f))
+            print(f"aplicada {f}")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,252 @@
+"""Popula um Postgres LOCAL com dados sintéticos (reprodutíveis) para medir o app.
+
+Uso:
+    python tools/seed.py --dsn postgresql://localhost/sepol_dev --anos 3 --pessoas 40 --obras 300
+
+Mesma --semente + mesmos volumes → mesmo conjunto de dados.
+Usa as funções do próprio banco (fn_recalcular_orcamento, fn_gerar_pagamentos_semana,
+fn_marcar_pagamento_pago) para que totais e pagamentos saiam como no uso real.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, timedelta
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+TABELAS = [
+    "pagamento_itens", "pagamentos", "recebimentos", "apontamentos",
+    "orcamento_fase_servicos", "obra_fases", "orcamentos", "obras",
+    "clientes", "indicacoes", "servicos", "pessoas",
+]
+
+NOMES = ["Ana", "Bruno", "Carla", "Diego", "Elaine", "Fábio", "Gustavo", "Helena", "Igor", "Joana",
+         "Kleber", "Larissa", "Marcos", "Natália", "Otávio", "Paula", "Rafael", "Sandra", "Tiago", "Vera"]
+SOBRENOMES = ["Silva", "Souza", "Oliveira", "Santos", "Pereira", "Lima", "Costa", "Ribeiro", "Almeida", "Rocha"]
+RUAS = ["Rua das Flores", "Av. Brasil", "Rua XV de Novembro", "Rua Sete de Setembro", "Av. Paulista"]
+SERVICOS = [("Pintura látex parede", "M2"), ("Pintura acrílica fachada", "M2"), ("Massa corrida", "M2"),
+            ("Textura", "M2"), ("Esmalte portas", "UN"), ("Verniz madeira", "M2"), ("Selador", "L"),
+            ("Grafiato", "M2"), ("Lixamento", "M2"), ("Diária pintor", "DIA"), ("Hora técnica", "H")]
+FASES = ["Preparação", "Massa", "Pintura interna", "Pintura externa", "Acabamento", "Limpeza"]
+
+
+def nome(rnd):
+    return f"{rnd.choice(NOMES)} {rnd.choice(SOBRENOMES)}"
+
+
+def tel(rnd):
+    return f"(11) 9{rnd.randint(1000, 9999)}-{rnd.randint(1000, 9999)}"
+
+
+def inserir(cur, sql, linhas, page_size=1000):
+    # insere em lotes e devolve os ids na ordem das linhas
+    if not linhas:
+        return []
+    ids = execute_values(cur, sql + " returning id", linhas, page_size=page_size, fetch=True)
+    return [r[0] for r in ids]
+
+
+def semear(conn, a, rnd):
+    cur = conn.cursor()
+    hoje = date.today()
+    inicio = hoje - timedelta(days=int(365 * a.anos))
+    t = time.perf_counter()
+
+    def passo(msg):
+        conn.commit()
+        print(f"  {msg:<48} {time.perf_counter() - t:7.1f}s", flush=True)
+
+    pessoas = inserir(cur, "insert into public.pessoas (nome,tipo,telefone,ativo) values %s", [
+        (nome(rnd), rnd.choices(["PINTOR", "AJUDANTE", "TERCEIRO"], [6, 3, 1])[0], tel(rnd), rnd.random() > 0.1)
+        for _ in range(a.pessoas)
+    ])
+    servicos = inserir(cur, "insert into public.servicos (nome,unidade,ativo) values %s", [
+        (SERVICOS[i % len(SERVICOS)][0] + (f" {i // len(SERVICOS) + 1}" if i >= len(SERVICOS) else ""),
+         SERVICOS[i % len(SERVICOS)][1], True)
+        for i in range(a.servicos)
+    ])
+    indicacoes = inserir(cur, "insert into public.indicacoes (nome,tipo,telefone,ativo) values %s", [
+        (nome(rnd), rnd.choice(["ARQUITETO", "ENGENHEIRO", "LOJA", "OUTRO"]), tel(rnd), True)
+        for _ in range(a.indicacoes)
+    ])
+    linhas = []
+    for _ in range(a.clientes):
+        ind = rnd.choice(indicacoes) if indicacoes and rnd.random() < 0.4 else None
+        linhas.append((nome(rnd), tel(rnd), f"{rnd.choice(RUAS)}, {rnd.randint(1, 3000)}",
+                       "INDICADO" if ind else "PROPRIO", ind, rnd.random() > 0.05))
+    clientes = inserir(cur, "insert into public.clientes (nome,telefone,endereco,origem,indicacao_id,ativo) values %s", linhas)
+    passo(f"cadastros: {len(pessoas)} pessoas, {len(clientes)} clientes")
+
+    # obras espalhadas no período; as antigas tendem a estar concluídas
+    obras = []
+    for i in range(a.obras):
+        ini = inicio + timedelta(days=rnd.randint(0, max(0, (hoje - inicio).days - 1)))
+        fim = ini + timedelta(days=rnd.randint(14, 120))
+        status = "CONCLUIDO" if fim < hoje else rnd.choice(["INICIADO", "INICIADO", "PAUSADO", "AGUARDANDO"])
+        obras.append({"ini": ini, "fim": min(fim, hoje), "status": status, "cliente": rnd.choice(clientes)})
+    ids = inserir(cur, "insert into public.obras (cliente_id,titulo,endereco_obra,status,ativo) values %s", [
+        (o["cliente"], f"Obra {i + 1} - {rnd.choice(FASES)}", f"{rnd.choice(RUAS)}, {rnd.randint(1, 3000)}", o["status"], True)
+        for i, o in enumerate(obras)
+    ])
+    for o, oid in zip(obras, ids):
+        o["id"] = oid
+
+    # orçamentos: o último de cada obra é o aprovado (os anteriores ficam como histórico)
+    orcs = []
+    for o in obras:
+        n = rnd.randint(1, a.orcamentos_por_obra)
+        for k in range(n):
+            orcs.append({"obra": o, "status": "APROVADO" if k == n - 1 else rnd.choice(["RASCUNHO", "EMITIDO", "CANCELADO"])})
+    ids = inserir(cur, "insert into public.orcamentos (obra_id,titulo,status) values %s", [
+        (c["obra"]["id"], f"Orçamento {k + 1}", "RASCUNHO") for k, c in enumerate(orcs)
+    ])
+    for c, oid in zip(orcs, ids):
+        c["id"] = oid
+
+    fases = []
+    for c in orcs:
+        for ordem, nf in enumerate(rnd.sample(FASES, min(len(FASES), a.fases_por_orcamento)), start=1):
+            fases.append({"orc": c, "ordem": ordem, "nome": nf})
+    ids = inserir(cur, "insert into public.obra_fases (obra_id,orcamento_id,nome_fase,ordem,status,valor_fase) values %s", [
+        (f["orc"]["obra"]["id"], f["orc"]["id"], f["nome"], f["ordem"],
+         "CONCLUIDO" if f["orc"]["obra"]["status"] == "CONCLUIDO" else rnd.choice(["AGUARDANDO", "INICIADO"]), 0)
+        for f in fases
+    ])
+    for f, fid in zip(fases, ids):
+        f["id"] = fid
+
+    linhas = []
+    for f in fases:
+        for sid in rnd.sample(servicos, min(len(servicos), a.servicos_por_fase)):
+            linhas.append((f["orc"]["id"], f["id"], sid, round(rnd.uniform(1, 250), 2), round(rnd.uniform(8, 90), 2), None))
+    execute_values(cur, """
+        insert into public.orcamento_fase_servicos
+          (orcamento_id, obra_fase_id, servico_id, quantidade, valor_unit, observacao)
+        values %s
+    """, linhas, page_size=2000)
+    cur.execute("select public.fn_recalcular_orcamento(u.id) from unnest(%s::bigint[]) as u(id);", ([c["id"] for c in orcs],))
+    execute_values(cur, """
+        update public.orcamentos o
+        set status = v.status, aprovado_em = case when v.status = 'APROVADO' then v.ini end
+        from (values %s) as v(id, status, ini)
+        where o.id = v.id
+    """, [(c["id"], c["status"], c["obra"]["ini"]) for c in orcs], template="(%s, %s, %s::date)", page_size=2000)
+    passo(f"obras: {len(obras)} obras, {len(orcs)} orçamentos, {len(fases)} fases, {len(linhas)} itens")
+
+    # recebimentos: um por fase do orçamento aprovado, vencendo ao longo da obra
+    linhas = []
+    for f in fases:
+        c = f["orc"]
+        if c["status"] != "APROVADO":
+            continue
+        o = c["obra"]
+        venc = o["ini"] + timedelta(days=(o["fim"] - o["ini"]).days * f["ordem"] // a.fases_por_orcamento)
+        pago = venc < hoje - timedelta(days=7) and rnd.random() < 0.9
+        status = "PAGO" if pago else ("VENCIDO" if venc < hoje else "ABERTO")
+        linhas.append((f["id"], c["id"], status, round(rnd.uniform(1500, 25000), 2), 0,
+                       venc, (venc + timedelta(days=rnd.randint(0, 10))) if pago else None))
+    execute_values(cur, """
+        insert into public.recebimentos
+          (obra_fase_id, orcamento_id, status, valor_previsto, acrescimo, vencimento, recebido_em)
+        values %s
+    """, linhas, page_size=2000)
+    passo(f"recebimentos: {len(linhas)}")
+
+    # apontamentos: cada profissional ativo trabalha em dias úteis numa obra em andamento naquele dia
+    aprovado = {c["obra"]["id"]: c["id"] for c in orcs if c["status"] == "APROVADO"}
+    por_dia = {}
+    for o in obras:
+        d = o["ini"]
+        while d <= o["fim"]:
+            por_dia.setdefault(d, []).append(o["id"])
+            d += timedelta(days=1)
+    linhas, d = [], inicio
+    while d <= hoje:
+        obras_dia = por_dia.get(d)
+        if obras_dia and (d.weekday() < 5 or rnd.random() < 0.15):
+            tipo = "SABADO" if d.weekday() == 5 else ("DOMINGO" if d.weekday() == 6 else "NORMAL")
+            for p in pessoas:
+                if rnd.random() < a.presenca:
+                    obra_id = rnd.choice(obras_dia)
+                    linhas.append((obra_id, aprovado[obra_id], p, d, tipo,
+                                   rnd.choice([150, 180, 200, 220, 250]), 0 if rnd.random() > 0.05 else 20))
+        d += timedelta(days=1)
+    execute_values(cur, """
+        insert into public.apontamentos
+          (obra_id, orcamento_id, pessoa_id, data, tipo_dia, valor_base, desconto_valor)
+        values %s
+        on conflict do nothing
+    """, linhas, page_size=5000)
+    passo(f"apontamentos: {len(linhas)}")
+
+    # pagamentos: gera semana a semana como o FINANCEIRO faz; quita tudo que já passou
+    segunda = inicio - timedelta(days=inicio.weekday())
+    semanas = 0
+    while segunda <= hoje:
+        cur.execute("select public.fn_gerar_pagamentos_semana(%s);", (segunda,))
+        semanas += 1
+        segunda += timedelta(days=7)
+    cur.execute("""
+        select public.fn_marcar_pagamento_pago(p.id, 'seed', p.referencia_fim)
+        from public.pagamentos p
+        where p.status <> 'PAGO' and p.referencia_fim < current_date - %s;
+    """, (a.pendentes_dias,))
+    passo(f"pagamentos: {semanas} semanas geradas")
+
+    if a.usuario:
+        cur.execute("""
+            insert into public.usuarios_app (usuario, senha_hash, ativo)
+            select %s, %s, true
+            where not exists (select 1 from public.usuarios_app where usuario = %s);
+        """, (a.usuario, a.senha, a.usuario))
+        passo(f"usuário '{a.usuario}'")
+
+    cur.execute("analyze;")
+    conn.commit()
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--dsn", default=os.environ.get("DATABASE_URL"), help="(padrão: $DATABASE_URL)")
+    ap.add_argument("--semente", type=int, default=42)
+    ap.add_argument("--anos", type=float, default=2)
+    ap.add_argument("--pessoas", type=int, default=30)
+    ap.add_argument("--servicos", type=int, default=40)
+    ap.add_argument("--indicacoes", type=int, default=30)
+    ap.add_argument("--clientes", type=int, default=400)
+    ap.add_argument("--obras", type=int, default=250)
+    ap.add_argument("--orcamentos-por-obra", type=int, default=3, help="máximo; o último é o aprovado")
+    ap.add_argument("--fases-por-orcamento", type=int, default=4)
+    ap.add_argument("--servicos-por-fase", type=int, default=6)
+    ap.add_argument("--presenca", type=float, default=0.8, help="chance de um profissional trabalhar num dia com obra")
+    ap.add_argument("--pendentes-dias", type=int, default=14, help="pagamentos mais novos que isso ficam pendentes")
+    ap.add_argument("--usuario", default="bench", help="usuário de login criado para o benchmark ('' = nenhum)")
+    ap.add_argument("--senha", default="bench")
+    ap.add_argument("--limpar", action="store_true", help="TRUNCATE nas tabelas antes de semear")
+    a = ap.parse_args(argv)
+
+    if not a.dsn:
+        ap.error("informe --dsn ou DATABASE_URL")
+    a.fases_por_orcamento = max(1, a.fases_por_orcamento)
+    conn = psycopg2.connect(a.dsn, sslmode=os.environ.get("DB_SSLMODE", "prefer"))
+    try:
+        cur = conn.cursor()
+        if a.limpar:
+            cur.execute("truncate " + ", ".join(f"public.{t}" for t in TABELAS) + " restart identity cascade;")
+        else:
+            cur.execute("select exists (select 1 from public.obras);")
+            if cur.fetchone()[0]:
+                print("banco já tem obras; use --limpar para recomeçar do zero", file=sys.stderr)
+                return 2
+        print(f"semeando (semente {a.semente}, {a.anos} ano(s))...")
+        semear(conn, a, random.Random(a.semente))
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())